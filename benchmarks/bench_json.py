@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Compares parsing the recorded response of test_objects (the global describe,
+about 140KB of JSON) the way _extract_response used to, with response.json()
+decoding it to text and parsing it with the standard library, with each
+installed JSON codec parsing the response bytes. Serializing is compared with
+anyjson, which request bodies used to go through. Run from the repository
+root:
+
+    python benchmarks/bench_json.py [iterations]
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import io
+import json
+import os
+import sys
+import timeit
+
+import anyjson
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from salesforce import codec  # noqa
+
+CASSETTE = os.path.join(os.path.dirname(__file__), os.pardir, 'tests',
+                        'cassettes', 'tests.rest.test_v29.test_objects.json')
+
+
+def load_payload():
+    with io.open(CASSETTE, encoding='utf-8') as f:
+        interaction = json.load(f)['http_interactions'][0]
+    return interaction['response']['body']['string'].encode('utf-8')
+
+
+def main(iterations=200):
+    content = load_payload()
+    data = json.loads(content.decode('utf-8'))
+    print('Payload: {0} bytes, {1} iterations'.format(len(content),
+                                                      iterations))
+
+    def report(label, func):
+        seconds = min(timeit.repeat(func, number=iterations, repeat=3))
+        print('{0:<28} {1:8.3f} ms'.format(label,
+                                           seconds / iterations * 1000))
+        return seconds
+
+    baseline = report('json loads(text)',
+                      lambda: json.loads(content.decode('utf-8')))
+    for name in codec.PREFERENCE:
+        try:
+            json_codec = codec.get_codec(name)
+        except ImportError:
+            print('{0:<28} not installed'.format(name))
+            continue
+        seconds = report('{0} codec loads'.format(name),
+                         lambda: json_codec.loads(content))
+        print('{0:<28} {1:8.2f}x'.format('', baseline / seconds))
+
+    report('anyjson dumps', lambda: anyjson.dumps(data))
+    for name in codec.PREFERENCE:
+        try:
+            json_codec = codec.get_codec(name)
+        except ImportError:
+            continue
+        report('{0} codec dumps'.format(name),
+               lambda: json_codec.dumps(data))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
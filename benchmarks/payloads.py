@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic responses larger than anything in the recorded cassettes: paged
+query results, the full description of an object with many fields and a
+long listMetadata reply. Contents are deterministic, so that runs can be
+compared with each other.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import json
+from xml.sax.saxutils import escape
+
+QUERY_PATH = '/services/data/v29.0/query'
+OBJECT_NAME = 'Benchmark__c'
+METADATA_NAMESPACE = 'http://soap.sforce.com/2006/04/metadata'
+
+
+def record_id(prefix, n):
+    return '{0}{1:015d}'.format(prefix, n)[:18]
+
+
+def query_pages(records, page_size):
+    """
+    Returns (path, body) pairs for the pages of a query returning the given
+    number of records. The first page is served at QUERY_PATH.
+    """
+    locator = record_id('01g', 1)[:15]
+    pages = []
+    for offset in range(0, records, page_size):
+        count = min(page_size, records - offset)
+        page = {
+            'totalSize': records,
+            'done': offset + count >= records,
+            'records': [{
+                'attributes': {
+                    'type': OBJECT_NAME,
+                    'url': '/services/data/v29.0/sobjects/{0}/{1}'.format(
+                        OBJECT_NAME, record_id('a1e', n)),
+                },
+                'Id': record_id('a1e', n),
+                'Name': 'Record {0} – ünïcode'.format(n),
+                'Amount__c': n * 1.5,
+                'Active__c': n % 2 == 0,
+                'CreatedDate': '2014-01-02T03:04:05.000+0000',
+                'Owner': {'attributes': {'type': 'User'}, 'Name': 'Owner'},
+            } for n in range(offset, offset + count)],
+        }
+        if not page['done']:
+            page['nextRecordsUrl'] = '{0}/{1}-{2}'.format(
+                QUERY_PATH, locator, offset + count)
+        path = QUERY_PATH if offset == 0 else '{0}/{1}-{2}'.format(
+            QUERY_PATH, locator, offset)
+        pages.append((path, json.dumps(page).encode('utf-8')))
+    return pages
+
+
+def field(n):
+    picklist = n % 10 == 0
+    return {
+        'name': 'Field{0}__c'.format(n),
+        'label': 'Field {0}'.format(n),
+        'type': 'picklist' if picklist else ('double' if n % 3 else 'string'),
+        'soapType': 'xsd:string' if picklist or not n % 3 else 'xsd:double',
+        'length': 0 if n % 3 else 255,
+        'precision': 18 if n % 3 else 0,
+        'scale': 2 if n % 3 else 0,
+        'createable': n % 7 != 0,
+        'updateable': n % 7 != 0,
+        'nillable': n % 5 != 0,
+        'defaultedOnCreate': False,
+        'custom': True,
+        'restrictedPicklist': picklist,
+        'picklistValues': [{'value': 'Value {0}'.format(v), 'active': True,
+                            'label': 'Value {0}'.format(v),
+                            'defaultValue': False, 'validFor': None}
+                           for v in range(20)] if picklist else [],
+        'referenceTo': [],
+        'relationshipName': None,
+        'externalId': False,
+        'unique': False,
+    }
+
+
+def description(fields):
+    "The full description of OBJECT_NAME with the given number of fields."
+    return {
+        'name': OBJECT_NAME,
+        'label': 'Benchmark',
+        'custom': True,
+        'createable': True,
+        'updateable': True,
+        'queryable': True,
+        'fields': [field(n) for n in range(fields)],
+        'childRelationships': [],
+        'recordTypeInfos': [],
+        'urls': {},
+    }
+
+
+def record(description):
+    "A valid new record for the fields of a description."
+    data = {}
+    for f in description['fields']:
+        if not f['createable']:
+            continue
+        if f['restrictedPicklist']:
+            data[f['name']] = f['picklistValues'][0]['value']
+        elif f['soapType'] == 'xsd:double':
+            data[f['name']] = 12.5
+        else:
+            data[f['name']] = 'Text'
+    return data
+
+
+def soap_envelope(body):
+    return ('<?xml version="1.0" encoding="UTF-8"?><soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns="{0}"><soapenv:Body>{1}</soapenv:Body>'
+            '</soapenv:Envelope>').format(METADATA_NAMESPACE,
+                                          body).encode('utf-8')
+
+
+def list_metadata(results):
+    "A listMetadata reply with the given number of FileProperties."
+    items = ''.join(
+        '<result><createdById>005D0000001{0:07d}</createdById>'
+        '<createdByName>Admin</createdByName>'
+        '<createdDate>2014-01-02T03:04:05.000Z</createdDate>'
+        '<fileName>objects/{1}.object</fileName><fullName>{1}</fullName>'
+        '<id>01ID0000000{0:07d}</id>'
+        '<lastModifiedById>005D0000001{0:07d}</lastModifiedById>'
+        '<lastModifiedByName>Admin</lastModifiedByName>'
+        '<lastModifiedDate>2014-01-02T03:04:05.000Z</lastModifiedDate>'
+        '<manageableState>unmanaged</manageableState>'
+        '<type>CustomObject</type></result>'.format(
+            n, escape('Object{0}__c'.format(n)))
+        for n in range(results))
+    return soap_envelope('<listMetadataResponse>{0}</listMetadataResponse>'
+                         .format(items))
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the clients against a local stub server (see stub.py) which
+replays the recorded cassettes and serves synthetic large payloads (see
+payloads.py), so that no Salesforce organization is needed.
+
+Each scenario runs in its own process, so that its peak RSS is its own, and
+reports its throughput, latency percentiles, peak RSS, the objects one
+operation leaves allocated and, where tracemalloc is available, the peak memory
+it allocates. Results are compared
+with benchmarks/baseline.json when it exists. Run from the repository root:
+
+    python benchmarks/run.py                      # run and compare
+    python benchmarks/run.py -s rest.query -n 500 # one scenario
+    python benchmarks/run.py --save-baseline      # record a new baseline
+
+The exit status is 1 if any scenario regressed by more than --tolerance.
+"""
+from __future__ import absolute_import, division, print_function, \
+    unicode_literals
+
+import argparse
+import collections
+import gc
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+import payloads  # noqa
+from stub import ACCESS_TOKEN, CUSTOM_OBJECT_NAME, CASSETTE_DIR, \
+    StubServer, mount  # noqa
+
+from salesforce.metadata import SalesforceMetadataClient  # noqa
+from salesforce.rest.v29 import SalesforceRestClient  # noqa
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+DEFAULT_TOLERANCE = 0.25
+
+# Metrics compared with the baseline, and whether higher values are better.
+# Tail latencies are reported but too noisy to compare.
+COMPARED = (
+    ('throughput', True),
+    ('p50_ms', False),
+    ('alloc_peak_kb', False),
+    ('alloc_objects', False),
+    ('peak_rss_kb', False),
+)
+
+Scenario = collections.namedtuple('Scenario', 'setup iterations')
+SCENARIOS = collections.OrderedDict()
+
+
+def scenario(name, iterations=200):
+    """
+    Registers a scenario. Its setup function is given the StubServer before
+    it starts, adds the routes it needs and returns the operation to measure.
+    """
+    def register(setup):
+        SCENARIOS[name] = Scenario(setup, iterations)
+        return setup
+    return register
+
+
+def rest_client(stub):
+    client = SalesforceRestClient('client_id', 'client_secret', 'domain',
+                                  access_token=ACCESS_TOKEN)
+    mount(client.session, stub)
+    return client
+
+
+def metadata_client(stub, **kwargs):
+    client = SalesforceMetadataClient('client_id', 'client_secret', 'domain',
+                                      ACCESS_TOKEN, **kwargs)
+    mount(client.client.options.transport.session, stub)
+    return client
+
+
+def recorded_body(cassette, index):
+    with io.open(os.path.join(CASSETTE_DIR, cassette + '.json'),
+                 encoding='utf-8') as f:
+        interaction = json.load(f)['http_interactions'][index]
+    return interaction['response']['body']['string']
+
+
+#### Scenarios ####
+
+
+@scenario('rest.query', iterations=500)
+def rest_query(stub):
+    stub.add_cassette('tests.rest.test_v29.test_query')
+    client = rest_client(stub)
+    soql = "SELECT Id FROM {0} WHERE Id = 'a1eG00000002d0pIAA'".format(
+        CUSTOM_OBJECT_NAME)
+    return lambda: client.query(soql)
+
+
+@scenario('rest.query_large', iterations=10)
+def rest_query_large(stub):
+    for path, body in payloads.query_pages(20000, 2000):
+        stub.add('GET', path, body)
+    client = rest_client(stub)
+    soql = 'SELECT Id, Name FROM {0}'.format(payloads.OBJECT_NAME)
+    return lambda: sum(1 for _ in client.query_iter(soql))
+
+
+@scenario('rest.object', iterations=500)
+def rest_object(stub):
+    stub.add_cassette('tests.rest.test_v29.test_object')
+    client = rest_client(stub)
+    return lambda: client.object(CUSTOM_OBJECT_NAME)
+
+
+@scenario('rest.object_large', iterations=50)
+def rest_object_large(stub):
+    stub.add('GET', '/services/data/v29.0/sobjects/{0}/describe'.format(
+        payloads.OBJECT_NAME),
+        json.dumps(payloads.description(800)).encode('utf-8'))
+    client = rest_client(stub)
+    return lambda: client.object(payloads.OBJECT_NAME, full_description=True)
+
+
+@scenario('rest.create', iterations=500)
+def rest_create(stub):
+    stub.add_cassette('tests.rest.test_v29.test_create')
+    client = rest_client(stub)
+    return lambda: client.create(CUSTOM_OBJECT_NAME,
+                                 {'Name': 'Test Create Name'})
+
+
+@scenario('validate_object', iterations=2000)
+def validate_object(stub):
+    description = json.loads(recorded_body(
+        'tests.rest.test_v29.test_object_full_description', 0))
+    data = {'Name': 'New object name'}
+    return lambda: SalesforceRestClient.validate_object(data, description)
+
+
+@scenario('validate_object_large', iterations=200)
+def validate_object_large(stub):
+    description = payloads.description(800)
+    data = payloads.record(description)
+    return lambda: SalesforceRestClient.validate_object(data, description)
+
+
+@scenario('soap.metadata_create', iterations=200)
+def soap_metadata_create(stub):
+    stub.add_cassette('tests.rest.test_v29.metadata')
+    client = metadata_client(stub)
+    custom_object = client.custom_object(CUSTOM_OBJECT_NAME, 'Custom object',
+                                         'Custom objects', 'Name__c',
+                                         'Custom object name')
+    return lambda: client.create(custom_object)
+
+
+@scenario('soap.metadata_list_large', iterations=10)
+def soap_metadata_list_large(stub, fast_results=False):
+    stub.add('POST', '/services/Soap/m/30.0/{0}'.format(
+        ACCESS_TOKEN.split('!', 1)[0]), payloads.list_metadata(2000),
+        content_type='text/xml', operation='listMetadata')
+    client = metadata_client(stub, fast_results=fast_results)
+    return lambda: client.list('CustomObject')
+
+
+@scenario('soap.metadata_list_large_fast', iterations=10)
+def soap_metadata_list_large_fast(stub):
+    return soap_metadata_list_large(stub, fast_results=True)
+
+
+#### Measurement ####
+
+
+def percentile(values, percent):
+    "Nearest-rank percentile of a sorted list."
+    rank = max(int(round(percent / 100 * len(values))), 1)
+    return values[rank - 1]
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / 1024 if sys.platform == 'darwin' else rss
+
+
+def alloc_peak_kb(operation):
+    """
+    Returns the peak memory allocated while operation runs once, or None
+    without tracemalloc (which Python 2 doesn't have).
+    """
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    tracemalloc.start()
+    try:
+        operation()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def alloc_objects(operation):
+    """
+    Returns how many more objects the garbage collector tracks after
+    operation runs once than before, counting its result. This works without
+    tracemalloc, so that Python 2 gets an allocation metric too: it counts
+    the containers (dicts, lists, instances...) an operation builds and keeps,
+    such as parsed records, but not those it frees on the way.
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        result = operation()
+        objects = len(gc.get_objects()) - before
+        del result
+        return objects
+    finally:
+        gc.enable()
+
+
+def measure(name, iterations=None, warmup=3):
+    stub = StubServer()
+    operation = SCENARIOS[name].setup(stub)
+    iterations = iterations or SCENARIOS[name].iterations
+    with stub:
+        for _ in range(warmup):
+            operation()
+        timer = timeit.default_timer
+        latencies = []
+        started = timer()
+        for _ in range(iterations):
+            start = timer()
+            operation()
+            latencies.append(timer() - start)
+        elapsed = timer() - started
+        alloc = alloc_peak_kb(operation)
+        objects = alloc_objects(operation)
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'throughput': iterations / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'alloc_peak_kb': alloc,
+        'alloc_objects': objects,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def run_isolated(name, iterations=None):
+    "Measures a scenario in a new process and returns its results."
+    command = [sys.executable, os.path.abspath(__file__), '--child', name]
+    if iterations:
+        command += ['--iterations', str(iterations)]
+    output = subprocess.check_output(command)
+    return json.loads(output.decode('utf-8'))
+
+
+#### Reporting ####
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of (scenario, metric, baseline value, value) regressions
+    of more than tolerance (e.g. 0.25 for 25%).
+    """
+    regressions = []
+    for name, metrics in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, higher_is_better in COMPARED:
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            ratio = new / old
+            if higher_is_better:
+                regressed = ratio < 1 / (1 + tolerance)
+            else:
+                regressed = ratio > 1 + tolerance
+            if regressed:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def report(results, baseline=None):
+    header = '{0:<30} {1:>10} {2:>9} {3:>9} {4:>9} {5:>10} {6:>10} {7:>10}'
+    print(header.format('scenario', 'ops/s', 'p50 ms', 'p90 ms', 'p99 ms',
+                        'alloc KB', 'objects', 'RSS KB'))
+    for name, m in results.items():
+        print('{0:<30} {1:>10.1f} {2:>9.2f} {3:>9.2f} {4:>9.2f} {5:>10} '
+              '{6:>10} {7:>10}'.format(
+                  name, m['throughput'], m['p50_ms'], m['p90_ms'],
+                  m['p99_ms'],
+                  '-' if m['alloc_peak_kb'] is None
+                  else '{0:.0f}'.format(m['alloc_peak_kb']),
+                  m['alloc_objects'], m['peak_rss_kb']))
+        base = (baseline or {}).get(name)
+        if base:
+            print('{0:<30} {1:>+9.0f}% {2:>+8.0f}%'.format(
+                '  vs baseline',
+                (m['throughput'] / base['throughput'] - 1) * 100,
+                (m['p50_ms'] / base['p50_ms'] - 1) * 100))
+
+
+def write_json(path, document):
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, separators=(',', ': '),
+                  sort_keys=True)
+        f.write('\n')
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-s', '--scenario', action='append',
+                        choices=list(SCENARIOS),
+                        help='scenario to run (default: all)')
+    parser.add_argument('-n', '--iterations', type=int,
+                        help="override each scenario's iterations")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed regression, e.g. 0.25 for 25%%')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--json', help='also write the results to a file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.iterations)))
+        return 0
+
+    results = collections.OrderedDict()
+    for name in args.scenario or SCENARIOS:
+        results[name] = run_isolated(name, args.iterations)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with io.open(args.baseline, encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored['environment'] != environment():
+            print('Warning: the baseline was recorded with {0}'.format(
+                stored['environment']))
+        baseline = stored['scenarios']
+
+    report(results, baseline)
+
+    document = {'environment': environment(), 'scenarios': results}
+    if args.json:
+        write_json(args.json, document)
+    if args.save_baseline:
+        write_json(args.baseline, document)
+        print('Saved the baseline to {0}'.format(args.baseline))
+        return 0
+
+    regressions = compare(results, baseline or {}, args.tolerance)
+    for name, metric, old, new in regressions:
+        print('REGRESSION {0} {1}: {2:.2f} -> {3:.2f}'.format(name, metric,
+                                                             old, new))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+A local HTTP server which answers the clients' requests with canned responses,
+either replayed from the Betamax cassettes in tests/cassettes or generated by
+benchmarks/payloads.py, so that the benchmarks measure the client rather than
+Salesforce.
+
+Clients keep their https:// URLs: StubAdapter, mounted on their sessions,
+sends every request to the stub over plain HTTP instead. Everything but TLS
+goes through requests and urllib3 as it would in production.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import base64
+import io
+import json
+import multiprocessing
+import os
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from requests.adapters import HTTPAdapter
+
+from salesforce.instrumentation import soap_operation
+
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.pardir, 'tests', 'cassettes')
+
+# Values the cassettes were recorded with, which clients should use so that
+# their request paths match
+CUSTOM_OBJECT_NAME = '__CUSTOM_OBJECT_NAME____c'
+ACCESS_TOKEN = '__ORG_ID__!__ACCESS_TOKEN__'
+
+
+class StubResponse(object):
+
+    def __init__(self, status_code, body, content_type='application/json'):
+        self.status_code = status_code
+        self.body = body
+        self.content_type = content_type
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = str('HTTP/1.1')
+    # Send each response in one write, without waiting on delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        response = self.server.stub.match(self.command, self.path, body)
+        if response is None:
+            response = StubResponse(404, b'[{"errorCode": "NOT_FOUND", '
+                                         b'"message": "No stub"}]')
+        self.send_response(response.status_code)
+        self.send_header(str('Content-Type'), str(response.content_type))
+        self.send_header(str('Content-Length'), str(len(response.body)))
+        self.end_headers()
+        self.wfile.write(response.body)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubServer(object):
+
+    """
+    Serves responses keyed by request method and path. SOAP responses are
+    also keyed by the operation in the request's envelope, and REST ones may
+    be keyed by query string.
+
+    The server's socket is bound as soon as it is created, so that clients
+    can be pointed at its url. Use it as a context manager to serve the
+    routes added so far from a separate process, which keeps the server's
+    CPU time and memory out of the measurements.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self._server = _Server(('127.0.0.1', 0), StubHandler)
+        self._server.stub = self
+        self._process = None
+
+    def add(self, method, path, body, status_code=200,
+            content_type='application/json', operation=None, query=None):
+        key = (method.upper(), path, operation or query)
+        self.routes.setdefault(key, StubResponse(status_code, body,
+                                                 content_type))
+
+    def add_cassette(self, name):
+        "Adds every interaction recorded in a cassette of tests/cassettes."
+        with io.open(os.path.join(CASSETTE_DIR, name + '.json'),
+                     encoding='utf-8') as f:
+            interactions = json.load(f)['http_interactions']
+        for interaction in interactions:
+            request = interaction['request']
+            response = interaction['response']
+            body = response['body']
+            if 'base64_string' in body:
+                content = base64.b64decode(body['base64_string'])
+            else:
+                content = body.get('string', '').encode('utf-8')
+            content_type = (response['headers'].get('Content-Type') or
+                            response['headers'].get('content-type') or
+                            ['application/json'])[0]
+            url = urlparse.urlsplit(request['uri'])
+            request_body = request['body'].get('string', '').encode('utf-8')
+            self.add(request['method'], url.path, content,
+                     status_code=response['status']['code'],
+                     content_type=content_type,
+                     operation=soap_operation(request_body),
+                     query=url.query or None)
+
+    def match(self, method, path, body):
+        url = urlparse.urlsplit(path)
+        for extra in (soap_operation(body), url.query or None, None):
+            response = self.routes.get((method, url.path, extra))
+            if response is not None:
+                return response
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(*self._server.server_address)
+
+    def __enter__(self):
+        self._process = multiprocessing.Process(
+            target=self._server.serve_forever)
+        self._process.daemon = True
+        self._process.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.join()
+        self._server.server_close()
+
+
+class StubAdapter(HTTPAdapter):
+
+    "Sends requests for any https:// URL to a StubServer instead."
+
+    def __init__(self, stub_url, **kwargs):
+        super(StubAdapter, self).__init__(**kwargs)
+        self.stub_url = stub_url
+
+    def send(self, request, **kwargs):
+        url = urlparse.urlsplit(request.url)
+        request.url = urlparse.urlunsplit(
+            urlparse.urlsplit(self.stub_url)[:2] + url[2:])
+        return super(StubAdapter, self).send(request, **kwargs)
+
+
+def mount(session, stub):
+    session.mount('https://', StubAdapter(stub.url))
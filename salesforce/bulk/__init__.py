@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from . import v47 as latest
+
+SalesforceBulkClient = latest.SalesforceBulkClient
+
+__all__ = ['latest', 'SalesforceBulkClient']
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+
+class SalesforceBulkException(Exception):
+
+    def __init__(self, job, message=None):
+        self.job = job
+        if message is None:
+            message = '{0}: {1}'.format(job.get('state'),
+                                        job.get('errorMessage'))
+        super(SalesforceBulkException, self).__init__(message)
+
+
+class JobTimeoutException(SalesforceBulkException):
+
+    def __init__(self, job):
+        super(JobTimeoutException, self).__init__(
+            job, 'Timed out waiting for job {0}'.format(job['id']))
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import csv
+import io
+import itertools
+import logging
+import time
+
+from ..rest.base import auth_required, SalesforceRestClientBase
+from .exceptions import SalesforceBulkException, JobTimeoutException
+
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
+logger = logging.getLogger(__name__)
+
+JOB_COMPLETE = 'JobComplete'
+JOB_FAILED = 'Failed'
+JOB_ABORTED = 'Aborted'
+FINISHED_STATES = (JOB_COMPLETE, JOB_FAILED, JOB_ABORTED)
+
+
+def _encode_value(value):
+    if value is None:
+        return b''
+    if isinstance(value, bool):
+        return b'true' if value else b'false'
+    if isinstance(value, bytes):
+        return value
+    if not isinstance(value, text_type):
+        value = '{0}'.format(value)
+    return value.encode('utf-8')
+
+
+class SalesforceBulkClient(SalesforceRestClientBase):
+
+    """
+    Bulk API 2.0 client. It shares the OAuth session handling of the REST
+    client, so expired access tokens are refreshed the same way.
+
+    https://developer.salesforce.com/docs/atlas.en-us.api_bulk_v2.meta/api_bulk_v2/
+    """
+    version = '47.0'
+
+    # Number of rows uploaded per ingest job. A Bulk API 2.0 job accepts a
+    # single upload of at most 150MB, so large inputs are split across jobs.
+    DEFAULT_CHUNK_SIZE = 100000
+    # Size of the CSV uploaded per ingest job. Salesforce recommends 100MB,
+    # as base64 encoding the data internally makes it up to 50% larger.
+    DEFAULT_MAX_UPLOAD_SIZE = 100 * 1024 * 1024
+    # Size of the reads used when streaming result CSVs
+    STREAM_BUFFER_SIZE = 64 * 1024
+
+    #### CSV helpers ####
+
+    @staticmethod
+    def _csv_lines(fields, rows):
+        """
+        Yields the CSV bytes of a header row made of the field names, then of
+        each row. Rows may be dictionaries keyed by field name or sequences in
+        field order.
+        """
+        output = io.BytesIO()
+        writer = csv.writer(output, lineterminator=b'\n')
+        for row in itertools.chain([fields], rows):
+            if hasattr(row, 'keys'):
+                row = [row.get(f) for f in fields]
+            writer.writerow([_encode_value(v) for v in row])
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+
+    @classmethod
+    def _encode_csv(cls, fields, rows):
+        """
+        Encodes an iterable of rows as CSV bytes, with a header row made of the
+        field names. Returns a 2-tuple (data, row_count).
+        """
+        lines = list(cls._csv_lines(fields, rows))
+        return b''.join(lines), len(lines) - 1
+
+    @classmethod
+    def _csv_chunks(cls, fields, rows, chunk_size, max_size):
+        """
+        Yields (data, row_count) tuples of CSV bytes, each with the header row
+        and at most chunk_size rows in at most max_size bytes. Raises
+        ValueError for a row which doesn't fit in max_size bytes on its own.
+        """
+        lines = cls._csv_lines(fields, rows)
+        header = next(lines)
+        chunk, size = [header], len(header)
+        for line in lines:
+            if len(header) + len(line) > max_size:
+                raise ValueError('A row of {0} bytes of CSV does not fit in '
+                                 '{1} bytes'.format(len(line), max_size))
+            if len(chunk) > chunk_size or size + len(line) > max_size:
+                yield b''.join(chunk), len(chunk) - 1
+                chunk, size = [header], len(header)
+            chunk.append(line)
+            size += len(line)
+        if len(chunk) > 1:
+            yield b''.join(chunk), len(chunk) - 1
+
+    def _iter_csv(self, response):
+        """
+        Yields the rows of a streamed CSV response as dictionaries keyed by the
+        header row, reading the body incrementally.
+        """
+        raw = response.raw
+        raw.decode_content = True
+        reader = csv.reader(io.BufferedReader(raw, self.STREAM_BUFFER_SIZE))
+        try:
+            header = [h.decode('utf-8') for h in next(reader)]
+        except StopIteration:
+            return
+        for row in reader:
+            if row:
+                yield dict(zip(header, [v.decode('utf-8') for v in row]))
+
+    def _stream(self, url):
+        return self._retrying(self._stream_once, url)
+
+    def _stream_once(self, url, method='get'):
+        response = self._request(url, method=method,
+                                 headers={'Accept': 'text/csv'}, stream=True)
+        if response.status_code != 200:
+            # Raises the appropriate exception for the error response
+            self._extract_response(response)
+        return response
+
+    def _post_json(self, path, data, method='post'):
+        body = self.json_codec.dumps(data)
+        headers = {'Content-Type': 'application/json'}
+        return self.call(path, method=method, headers=headers, body=body)
+
+    #### Jobs ####
+
+    @auth_required
+    def wait_for_job(self, job_id, query=False, timeout=None,
+                     poll_interval=1.0, max_poll_interval=30.0, backoff=1.5):
+        """
+        Polls a job until it has finished, backing off between polls, and
+        returns its final job info. Raises JobTimeoutException if timeout
+        seconds pass first.
+        """
+        get_job = self.query_job if query else self.ingest_job
+        started = time.time()
+        while True:
+            job = get_job(job_id)
+            if job['state'] in FINISHED_STATES:
+                return job
+            if timeout is not None and time.time() - started > timeout:
+                raise JobTimeoutException(job)
+            logger.debug('Job %s is %s, polling again in %.1fs', job_id,
+                         job['state'], poll_interval)
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * backoff, max_poll_interval)
+
+    #### Ingest jobs ####
+
+    @auth_required
+    def create_ingest_job(self, object_name, operation,
+                          external_id_field=None):
+        """
+        Creates an ingest job for the specified object. operation is one of
+        insert, update, upsert, delete or hardDelete.
+        """
+        data = {
+            'object': object_name,
+            'operation': operation,
+            'contentType': 'CSV',
+            'lineEnding': 'LF',
+        }
+        if external_id_field:
+            data['externalIdFieldName'] = external_id_field
+        return self._post_json('jobs/ingest', data)
+
+    @auth_required
+    def upload_job_data(self, job_id, data):
+        "Uploads CSV data to an open ingest job."
+        headers = {'Content-Type': 'text/csv'}
+        return self.call('jobs/ingest/{0}/batches'.format(job_id),
+                         method='put', headers=headers, body=data)
+
+    @auth_required
+    def close_ingest_job(self, job_id):
+        "Marks an ingest job's upload as complete so that it gets processed."
+        return self._post_json('jobs/ingest/{0}'.format(job_id),
+                               {'state': 'UploadComplete'}, method='patch')
+
+    @auth_required
+    def abort_ingest_job(self, job_id):
+        return self._post_json('jobs/ingest/{0}'.format(job_id),
+                               {'state': 'Aborted'}, method='patch')
+
+    @auth_required
+    def delete_ingest_job(self, job_id):
+        return self.call('jobs/ingest/{0}'.format(job_id), method='delete')
+
+    @auth_required
+    def ingest_job(self, job_id):
+        "Retrieves information about an ingest job, including its state."
+        return self.call('jobs/ingest/{0}'.format(job_id))
+
+    @auth_required
+    def ingest(self, object_name, operation, fields, rows,
+               external_id_field=None, chunk_size=DEFAULT_CHUNK_SIZE,
+               wait=True, timeout=None,
+               max_upload_size=DEFAULT_MAX_UPLOAD_SIZE):
+        """
+        Uploads rows from any iterable, consuming it a chunk at a time: at
+        most chunk_size rows, in at most max_upload_size bytes of CSV. Each
+        chunk is sent as its own ingest job. If wait is True, returns the
+        final info of every job once they have all finished, otherwise returns
+        their info as created.
+        """
+        jobs = []
+        for data, count in self._csv_chunks(fields, rows, chunk_size,
+                                            max_upload_size):
+            job = self.create_ingest_job(object_name, operation,
+                                         external_id_field=external_id_field)
+            logger.debug('Uploading %d rows to job %s', count, job['id'])
+            self.upload_job_data(job['id'], data)
+            jobs.append(self.close_ingest_job(job['id']))
+
+        if wait:
+            jobs = [self.wait_for_job(job['id'], timeout=timeout)
+                    for job in jobs]
+        return jobs
+
+    @auth_required
+    def successful_results(self, job_id):
+        "Yields the successfully processed rows of an ingest job."
+        url = self._url('jobs/ingest/{0}/successfulResults/'.format(job_id))
+        return self._iter_csv(self._stream(url))
+
+    @auth_required
+    def failed_results(self, job_id):
+        "Yields the rows of an ingest job that failed, with their errors."
+        url = self._url('jobs/ingest/{0}/failedResults/'.format(job_id))
+        return self._iter_csv(self._stream(url))
+
+    @auth_required
+    def unprocessed_records(self, job_id):
+        "Yields the rows of an ingest job that were not processed."
+        url = self._url('jobs/ingest/{0}/unprocessedrecords/'.format(job_id))
+        return self._iter_csv(self._stream(url))
+
+    #### Query jobs ####
+
+    @auth_required
+    def create_query_job(self, soql, include_all=False):
+        """
+        Creates a query job for the specified SOQL query. If include_all is
+        True, results can include deleted and archived records.
+        """
+        return self._post_json('jobs/query', {
+            'operation': 'queryAll' if include_all else 'query',
+            'query': soql,
+        })
+
+    @auth_required
+    def abort_query_job(self, job_id):
+        return self._post_json('jobs/query/{0}'.format(job_id),
+                               {'state': 'Aborted'}, method='patch')
+
+    @auth_required
+    def query_job(self, job_id):
+        "Retrieves information about a query job, including its state."
+        return self.call('jobs/query/{0}'.format(job_id))
+
+    @auth_required
+    def query_results(self, job_id, max_records=None):
+        """
+        Yields the result rows of a completed query job, following the result
+        locator to stream each subsequent set of results.
+        """
+        locator = None
+        while True:
+            params = {}
+            if max_records:
+                params['maxRecords'] = max_records
+            if locator:
+                params['locator'] = locator
+            url = self._url('jobs/query/{0}/results'.format(job_id),
+                            params=params)
+            response = self._stream(url)
+            for row in self._iter_csv(response):
+                yield row
+
+            locator = response.headers.get('Sforce-Locator')
+            if not locator or locator == 'null':
+                break
+
+    @auth_required
+    def query(self, soql, include_all=False, max_records=None, timeout=None):
+        """
+        Runs a query job, waits for it to finish and yields its result rows.
+        Raises SalesforceBulkException if the job does not complete.
+        """
+        job = self.create_query_job(soql, include_all=include_all)
+        job = self.wait_for_job(job['id'], query=True, timeout=timeout)
+        if job['state'] != JOB_COMPLETE:
+            raise SalesforceBulkException(job)
+        return self.query_results(job['id'], max_records=max_records)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# JSON libraries to use, in order of preference. ujson parses fastest (see
+# benchmarks/bench_json.py), but simplejson, about 40% slower and still twice
+# as fast as json, serializes request bodies exactly like json does, so that
+# installing it doesn't change what is sent. A comma-separated list in
+# SALESFORCE_JSON_CODEC overrides it, e.g. with ujson.
+PREFERENCE = ('simplejson', 'ujson', 'json')
+
+
+def _to_bytes(data):
+    if isinstance(data, unicode):
+        return data.encode('utf-8')
+    return data
+
+
+def _to_text(data):
+    if isinstance(data, bytes):
+        return data.decode('utf-8')
+    return data
+
+
+class JsonCodec(object):
+
+    """
+    A JSON library behind a common interface. loads parses a document from
+    UTF-8 bytes, such as a response's content, and returns unicode strings
+    whichever library does it, and dumps serializes an object to UTF-8 bytes
+    ready to be sent as a request body.
+    """
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self._loads = loads
+        self._dumps = dumps
+
+    def __repr__(self):
+        return 'JsonCodec({0!r})'.format(self.name)
+
+    def loads(self, data):
+        return self._loads(data)
+
+    def dumps(self, obj):
+        return _to_bytes(self._dumps(obj))
+
+
+def _ujson():
+    import ujson
+    return JsonCodec('ujson', ujson.loads, lambda obj: ujson.dumps(
+        obj, ensure_ascii=False, escape_forward_slashes=False))
+
+
+def _simplejson():
+    import simplejson
+    # simplejson returns str rather than unicode for ASCII strings parsed from
+    # bytes, while json and response.json() always return unicode
+    return JsonCodec('simplejson',
+                     lambda data: simplejson.loads(_to_text(data)),
+                     simplejson.dumps)
+
+
+def _json():
+    import json
+    # The standard library parses text faster than bytes on Python 2
+    return JsonCodec('json', lambda data: json.loads(_to_text(data)),
+                     json.dumps)
+
+
+FACTORIES = {
+    'ujson': _ujson,
+    'simplejson': _simplejson,
+    'json': _json,
+}
+
+_codecs = {}
+_default = None
+_lock = threading.Lock()
+
+
+def get_codec(name=None):
+    """
+    Returns the JsonCodec for the named library, or the default one, which is
+    the first installed library in PREFERENCE. Raises ImportError if the named
+    library isn't installed, and ValueError if it isn't supported. name may
+    also be a JsonCodec, which is returned as is.
+    """
+    if isinstance(name, JsonCodec):
+        return name
+    if name is None:
+        return get_default_codec()
+    if name not in FACTORIES:
+        raise ValueError('Unknown JSON codec {0!r}, use one of: {1}'.format(
+            name, ', '.join(sorted(FACTORIES))))
+    with _lock:
+        codec = _codecs.get(name)
+        if codec is None:
+            codec = _codecs[name] = FACTORIES[name]()
+    return codec
+
+
+def get_default_codec():
+    global _default
+    if _default is None:
+        names = os.environ.get('SALESFORCE_JSON_CODEC')
+        names = names.split(',') if names else PREFERENCE
+        for name in names:
+            try:
+                codec = get_codec(name.strip())
+            except (ImportError, ValueError) as e:
+                logger.warning('Cannot use %s for JSON: %s', name, e)
+                continue
+            logger.debug('Using %s for JSON', name)
+            _default = codec
+            break
+        else:
+            # The standard library is always there
+            _default = get_codec('json')
+    return _default
+
+
+def set_default_codec(name):
+    "Makes the named library (or a JsonCodec) the default codec."
+    global _default
+    _default = get_codec(name)
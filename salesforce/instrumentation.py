@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import bisect
+import collections
+import contextlib
+import logging
+import re
+import threading
+import time
+import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Record IDs (15 or 18 characters, with at least one digit) and query
+# locators (an ID followed by a batch offset) in REST paths
+ID_RE = re.compile(r'/(?=[A-Za-z]*[0-9])[A-Za-z0-9]{15}(?:[A-Za-z0-9]{3})?'
+                   r'(?:-[0-9]+)?(?=/|$)')
+# The first element in the Body of a SOAP envelope names its operation
+OPERATION_RE = re.compile(br'<(?:[\w.-]+:)?Body[^>]*>\s*<(?:[\w.-]+:)?([\w.-]+)')
+
+
+def rest_endpoint(url):
+    """
+    Returns the path of a REST URL with record IDs replaced by {id}, so that
+    requests for different records of the same resource are grouped.
+    """
+    return ID_RE.sub('/{id}', urlparse.urlparse(url).path)
+
+
+def soap_operation(message):
+    "Returns the name of the operation called by a SOAP envelope, if found."
+    if not isinstance(message, bytes):
+        return None
+    match = OPERATION_RE.search(message, 0, 4096)
+    return match.group(1).decode('ascii') if match else None
+
+
+def _size(data):
+    if data is None:
+        return 0
+    try:
+        return len(data)
+    except TypeError:
+        # e.g. a file object or a generator, whose size isn't known
+        return None
+
+
+def _error_code(error):
+    code = getattr(error, 'error_code', None)
+    if code is None:
+        # The fault of a suds WebFault
+        code = getattr(getattr(error, 'fault', None), 'faultcode', None)
+    return code or type(error).__name__
+
+
+class Call(object):
+
+    """
+    One API call as seen by hooks: api is 'rest' or 'soap', endpoint is the
+    REST path (with IDs replaced by {id}) or the SOAP operation. Retries of
+    the call are part of it, so duration covers every attempt, and bytes are
+    counted across attempts. SOAP calls whose replies are parsed as they are
+    read finish once the response's headers have arrived. Hooks can keep
+    their own state about the call in context.
+    """
+
+    def __init__(self, api, method, endpoint, url=None):
+        self.api = api
+        self.method = method.upper()
+        self.endpoint = endpoint
+        self.url = url
+        self.attempts = 1
+        self.refreshes = 0
+        self.status_code = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.error = None
+        self.error_code = None
+        self.started = time.time()
+        self.duration = None
+        self.context = {}
+
+    def __repr__(self):
+        return 'Call({0!r}, {1!r}, {2!r})'.format(self.api, self.method,
+                                                  self.endpoint)
+
+    @property
+    def failed(self):
+        return self.error is not None or (self.status_code or 0) >= 400
+
+    def record_request(self, body):
+        size = _size(body)
+        if size is not None and self.bytes_out is not None:
+            self.bytes_out += size
+        else:
+            self.bytes_out = None
+
+    def record_response(self, response, streamed=False):
+        """
+        Records the status and size of a response. The size of a streamed
+        response is only known from its Content-Length header.
+        """
+        self.status_code = response.status_code
+        size = response.headers.get('Content-Length')
+        if size is not None:
+            size = int(size)
+        elif not streamed:
+            size = len(response.content)
+        if size is not None and self.bytes_in is not None:
+            self.bytes_in += size
+        else:
+            self.bytes_in = None
+
+    def finish(self, error=None):
+        self.duration = time.time() - self.started
+        if error is not None:
+            self.error = error
+            self.error_code = _error_code(error)
+        elif (self.status_code or 0) >= 400:
+            self.error_code = 'HTTP {0}'.format(self.status_code)
+
+
+class Hook(object):
+
+    """
+    Base class for instrumentation hooks, whose methods do nothing. Hooks are
+    called on the thread making the call, so they must be thread-safe, and
+    should be quick. Errors they raise are logged and otherwise ignored.
+    """
+
+    def before_request(self, call):
+        "Called when a call starts."
+
+    def after_request(self, call):
+        "Called when a call has finished, whether it succeeded or not."
+
+    def on_retry(self, call, error):
+        """
+        Called before a call is attempted again. error is the exception the
+        last attempt failed with, or None if it failed with call.status_code.
+        """
+
+    def on_refresh(self, call):
+        "Called when the access token had expired and has been refreshed."
+
+
+class Instrumentation(object):
+
+    """
+    Sends the events of API calls to a list of hooks. It can be shared
+    between clients, e.g. to collect the metrics of every client in one
+    place.
+
+    Calls nest: a call made while another one is in progress on the same
+    thread (e.g. the HTTP request a SOAP operation makes) is part of it, and
+    fires no events of its own.
+    """
+
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or [])
+        self._local = threading.local()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _emit(self, name, *args):
+        for hook in self.hooks:
+            try:
+                getattr(hook, name)(*args)
+            except Exception:
+                logger.exception('Instrumentation hook %r failed in %s',
+                                 hook, name)
+
+    def current(self):
+        "Returns the call in progress on this thread, if any."
+        return getattr(self._local, 'call', None)
+
+    @contextlib.contextmanager
+    def request(self, api, method, endpoint, url=None):
+        """
+        Context manager around a call, which fires before_request and
+        after_request and returns its Call. Exceptions raised inside it are
+        recorded as the call's error.
+        """
+        current = self.current()
+        if current is not None:
+            yield current
+            return
+
+        call = self._local.call = Call(api, method, endpoint, url)
+        self._emit('before_request', call)
+        try:
+            yield call
+        except BaseException as e:
+            self._local.call = None
+            call.finish(error=e)
+            self._emit('after_request', call)
+            raise
+        self._local.call = None
+        call.finish()
+        self._emit('after_request', call)
+
+    def retry(self, call, error=None):
+        call.attempts += 1
+        self._emit('on_retry', call, error)
+
+    def refresh(self, call):
+        call.refreshes += 1
+        self._emit('on_refresh', call)
+
+
+#### Collectors ####
+
+
+class LatencyHistogram(Hook):
+
+    """
+    Counts the durations of calls in buckets, per (api, method, endpoint).
+    Buckets are upper bounds in seconds; slower calls fall into a last,
+    unbounded bucket.
+    """
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = {}
+        self.totals = collections.Counter()
+        self._lock = threading.Lock()
+
+    def after_request(self, call):
+        key = (call.api, call.method, call.endpoint)
+        index = bisect.bisect_left(self.buckets, call.duration)
+        with self._lock:
+            counts = self.counts.get(key)
+            if counts is None:
+                counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self.totals[key] += call.duration
+
+    def count(self, key):
+        return sum(self.counts.get(key, ()))
+
+    def mean(self, key):
+        count = self.count(key)
+        return self.totals[key] / count if count else None
+
+    def percentile(self, key, percent):
+        """
+        Returns the upper bound of the bucket holding the given percentile of
+        the durations of key's calls, or None if there are none (or it falls
+        into the unbounded bucket).
+        """
+        counts = self.counts.get(key)
+        if not counts:
+            return None
+        rank = percent / 100.0 * sum(counts)
+        seen = 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def hottest(self, n=10):
+        "Returns the n keys whose calls took the most time in total."
+        with self._lock:
+            return [key for key, _ in self.totals.most_common(n)]
+
+
+class ByteCounter(Hook):
+
+    """
+    Counts calls and the bytes they sent and received, per (api, method,
+    endpoint). Sizes that aren't known, e.g. of chunked responses, are left
+    out.
+    """
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.bytes_out = collections.Counter()
+        self.bytes_in = collections.Counter()
+        self._lock = threading.Lock()
+
+    def after_request(self, call):
+        key = (call.api, call.method, call.endpoint)
+        with self._lock:
+            self.calls[key] += 1
+            self.bytes_out[key] += call.bytes_out or 0
+            self.bytes_in[key] += call.bytes_in or 0
+
+
+class ErrorCounter(Hook):
+
+    """
+    Counts failed calls by error code: the Salesforce error code of REST
+    errors, the fault code of SOAP faults, the exception class of other
+    errors, or 'HTTP <status>'. Retries and token refreshes are counted per
+    (api, method, endpoint).
+    """
+
+    def __init__(self):
+        self.errors = collections.Counter()
+        self.endpoint_errors = collections.Counter()
+        self.retries = collections.Counter()
+        self.refreshes = collections.Counter()
+        self._lock = threading.Lock()
+
+    def after_request(self, call):
+        if not call.failed:
+            return
+        with self._lock:
+            self.errors[call.error_code] += 1
+            self.endpoint_errors[(call.api, call.method, call.endpoint,
+                                  call.error_code)] += 1
+
+    def on_retry(self, call, error):
+        with self._lock:
+            self.retries[(call.api, call.method, call.endpoint)] += 1
+
+    def on_refresh(self, call):
+        with self._lock:
+            self.refreshes[(call.api, call.method, call.endpoint)] += 1
+
+
+#### Tracing ####
+
+
+class SpanHook(Hook):
+
+    """
+    Records each call as a span of an OpenTelemetry-style tracer, e.g.
+    opentelemetry.trace.get_tracer(__name__). Any tracer works whose
+    start_span(name, attributes=...) returns spans with set_attribute,
+    add_event and end methods.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def before_request(self, call):
+        attributes = {
+            'salesforce.api': call.api,
+            'salesforce.endpoint': call.endpoint,
+            'http.method': call.method,
+        }
+        if call.url:
+            attributes['http.url'] = call.url
+        span = self.tracer.start_span(
+            '{0} {1}'.format(call.method, call.endpoint),
+            attributes=attributes)
+        call.context[self] = span
+
+    def on_retry(self, call, error):
+        span = call.context.get(self)
+        if span is not None:
+            span.add_event('retry', {'salesforce.attempt': call.attempts})
+
+    def on_refresh(self, call):
+        span = call.context.get(self)
+        if span is not None:
+            span.add_event('token_refresh')
+
+    def after_request(self, call):
+        span = call.context.pop(self, None)
+        if span is None:
+            return
+        attributes = {
+            'http.status_code': call.status_code,
+            'salesforce.attempts': call.attempts,
+            'salesforce.bytes_out': call.bytes_out,
+            'salesforce.bytes_in': call.bytes_in,
+            'salesforce.error_code': call.error_code,
+        }
+        for name, value in attributes.items():
+            if value is not None:
+                span.set_attribute(name, value)
+        if call.error is not None and hasattr(span, 'record_exception'):
+            span.record_exception(call.error)
+        span.end()
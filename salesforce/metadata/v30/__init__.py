@@ -1,18 +1,67 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 
+import io
 import logging
 import os
+import sys
+import threading
+import time
+import uuid
+import xml.sax
+
+from concurrent.futures import ThreadPoolExecutor
 
 from ...soap.base import SalesforceSoapClientBase
-from ...soap.exceptions import SalesforceSoapException
+from ...soap.exceptions import (AsyncTimeoutException,
+                                PartialResultsException,
+                                SalesforceSoapException)
+from ...soap.streams import Base64Body, Base64ElementFilter
+from .results import RESULT_TYPES
 
 logger = logging.getLogger(__name__)
 
 
 class SalesforceMetadataClient(SalesforceSoapClientBase):
     version = '30.0'
-    wsdl_path = os.path.join(os.path.dirname(__file__), 'metadata.wsdl')
+    wsdl_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                             'metadata.wsdl'))
+
+    # Maximum number of components accepted by each CRUD call
+    CHUNK_SIZE = 10
+    # Number of chunks of a *_many call sent concurrently by default
+    max_workers = 1
+    # Number of deploy_async and retrieve_async calls run concurrently
+    async_workers = 4
+    result_types = RESULT_TYPES
+
+    def __init__(self, *args, **kwargs):
+        super(SalesforceMetadataClient, self).__init__(*args, **kwargs)
+        # Created by the first *_async call, and shut down by close
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self, wait=True):
+        """
+        Shuts down the threads of deploy_async and retrieve_async calls,
+        waiting for the calls in progress unless wait is False.
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _submit(self, func, *args, **kwargs):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.async_workers)
+            return self._executor.submit(func, *args, **kwargs)
 
     ############# Factory Helpers ############
 
@@ -71,8 +120,80 @@ class SalesforceMetadataClient(SalesforceSoapClientBase):
 
     ############# CRUD Methods ############
 
-    def create_many(self, metadata_objects):
-        return self._call('createMetadata', args=[metadata_objects])
+    def _call_chunked(self, function_name, items, merge, args=None,
+                      max_workers=None):
+        """
+        Calls function_name with args followed by each chunk of at most
+        CHUNK_SIZE items, and returns merge(chunks, results), the results of
+        every chunk in input order. If max_workers is more than 1, chunks are
+        sent concurrently over a thread pool of that size.
+
+        Chunks are sent even if others fail, since Salesforce has already
+        applied the ones which succeeded. If only some fail, their results
+        are None and PartialResultsException is raised with the merged
+        results; if all do, the first error is raised.
+        """
+        args = args or []
+        items = list(items)
+        size = self.CHUNK_SIZE
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        chunks = chunks or [items]
+        max_workers = min(max_workers or self.max_workers, len(chunks))
+
+        def call(chunk):
+            try:
+                return self._call(function_name, args=args + [chunk]), None
+            except Exception:
+                logger.debug('%s failed for %d items', function_name,
+                             len(chunk))
+                return None, sys.exc_info()
+
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers) as executor:
+                outcomes = list(executor.map(call, chunks))
+        else:
+            outcomes = [call(chunk) for chunk in chunks]
+
+        failures = [(chunk, exc_info) for chunk, (_, exc_info)
+                    in zip(chunks, outcomes) if exc_info is not None]
+        if len(failures) == len(chunks):
+            exc_info = failures[0][1]
+            raise exc_info[0], exc_info[1], exc_info[2]
+        results = merge(chunks, [result for result, _ in outcomes])
+        if failures:
+            raise PartialResultsException(results, [
+                (chunk, exc_info[1]) for chunk, exc_info in failures])
+        return results
+
+    @staticmethod
+    def _concat(chunks, results):
+        "Merges per-item results, with a None for each item of failed chunks."
+        merged = []
+        for chunk, result in zip(chunks, results):
+            if result is None:
+                merged.extend([None] * len(chunk))
+            elif isinstance(result, list):
+                merged.extend(result)
+            else:
+                merged.append(result)
+        return merged
+
+    @staticmethod
+    def _concat_records(chunks, results):
+        "Merges ReadResults into the first one, without failed chunks."
+        results = [result for result in results if result is not None]
+        merged = results[0]
+        if len(chunks) > 1:
+            records = []
+            for result in results:
+                value = getattr(result, 'records', [])
+                records.extend(value if isinstance(value, list) else [value])
+            merged.records = records
+        return merged
+
+    def create_many(self, metadata_objects, max_workers=None):
+        return self._call_chunked('createMetadata', metadata_objects,
+                                  self._concat, max_workers=max_workers)
 
     def create(self, metadata_object):
         result = self.create_many([metadata_object])[0]
@@ -81,20 +202,25 @@ class SalesforceMetadataClient(SalesforceSoapClientBase):
 
         return result.fullName
 
-    def get_many(self, metadata_type, object_names):
-        return self._call('readMetadata', args=[metadata_type, object_names])
+    def get_many(self, metadata_type, object_names, max_workers=None):
+        return self._call_chunked('readMetadata', object_names,
+                                  self._concat_records, args=[metadata_type],
+                                  max_workers=max_workers)
 
     def get(self, metadata_type, object_name):
         return self.get_many(metadata_type, [object_name])
 
-    def update_many(self, metadata_objects):
-        return self._call('updateMetadata', args=[meatadata_objects])
+    def update_many(self, metadata_objects, max_workers=None):
+        return self._call_chunked('updateMetadata', metadata_objects,
+                                  self._concat, max_workers=max_workers)
 
     def update(self, metadata_object):
         return self.update_many([metadata_object])
 
-    def delete_many(self, metadata_type, object_names):
-        return self._call('deleteMetadata', args=[metadata_type, object_names])
+    def delete_many(self, metadata_type, object_names, max_workers=None):
+        return self._call_chunked('deleteMetadata', object_names,
+                                  self._concat, args=[metadata_type],
+                                  max_workers=max_workers)
 
     def delete(self, metadata_type, object_name):
         return self.delete_many(metadata_type, [object_name])
@@ -105,6 +231,198 @@ class SalesforceMetadataClient(SalesforceSoapClientBase):
                                                   new_object_name])
 
     def list(self, metadata_type):
+        return list(self.list_iter(metadata_type))
+
+    def list_iter(self, metadata_type):
+        "Yields the FileProperties of each component as they are parsed."
         query = self.client.factory.create('ListMetadataQuery')
         query.type = metadata_type
-        return self._call('listMetadata', args=[[query], self.version])
+        return self._call_iter('listMetadata', args=[[query], self.version])
+
+    ############# Deploy and Retrieve ############
+
+    @staticmethod
+    def _open(zip_file, mode):
+        if hasattr(zip_file, 'read' if mode == 'rb' else 'write'):
+            return zip_file, False
+        return io.open(zip_file, mode), True
+
+    def _poll(self, check, async_id, progress, timeout=None,
+              poll_interval=1.0, max_poll_interval=30.0, backoff=1.5):
+        """
+        Calls check(async_id) until the result is done and returns it. The
+        interval between polls grows by backoff while progress(result) stays
+        the same, and goes back to poll_interval whenever it changes. Raises
+        AsyncTimeoutException if timeout seconds pass first.
+        """
+        started = time.time()
+        interval = poll_interval
+        last_progress = None
+        while True:
+            result = check(async_id)
+            if result.done:
+                return result
+            if timeout is not None and time.time() - started > timeout:
+                raise AsyncTimeoutException(result)
+
+            current_progress = progress(result)
+            if current_progress != last_progress:
+                interval = poll_interval
+                last_progress = current_progress
+            else:
+                interval = min(interval * backoff, max_poll_interval)
+            logger.debug('Request %s is not done, polling again in %.1fs',
+                         async_id, interval)
+            time.sleep(interval)
+
+    def _send_deploy(self, zip_file, deploy_options, start=None):
+        # The zip file is base64-encoded straight into the request body, so
+        # the envelope is marshalled around a placeholder.
+        placeholder = uuid.uuid4().hex
+        request, context = self._prepare('deploy', args=[placeholder,
+                                                         deploy_options])
+        prefix, suffix = request.message.split(placeholder.encode('ascii'))
+        fileobj, close = self._open(zip_file, 'rb')
+        try:
+            # A retry after a session refresh reads the package again
+            if start is not None:
+                fileobj.seek(start)
+            body = Base64Body(fileobj, prefix, suffix)
+            response = self.client.options.transport.post(request, data=body)
+        finally:
+            if close:
+                fileobj.close()
+        return context.process_reply(response.content, response.status_code,
+                                     response.reason)
+
+    def start_deploy(self, zip_file, **options):
+        """
+        Starts deploying a zip package, given as a path or a binary file
+        object, and returns its AsyncResult. The package is streamed from
+        disk. Keyword arguments set DeployOptions, e.g. check_only=True or
+        rollback_on_error=True.
+        """
+        deploy_options = self.client.factory.create('DeployOptions')
+        for name, value in options.items():
+            head, _, tail = name.partition('_')
+            name = head + ''.join(w.capitalize() for w in tail.split('_'))
+            setattr(deploy_options, name, value)
+        # The package starts at the file object's current position
+        start = zip_file.tell() if hasattr(zip_file, 'read') else None
+        return self._with_session('deploy', self._send_deploy, zip_file,
+                                  deploy_options, start)
+
+    def check_deploy_status(self, async_id, include_details=False):
+        return self._call('checkDeployStatus', args=[async_id,
+                                                     include_details])
+
+    def wait_for_deploy(self, async_id, include_details=True, **kwargs):
+        """
+        Polls a deployment until it is done and returns its DeployResult.
+        Keyword arguments are passed on to _poll.
+        """
+        def progress(result):
+            return (result.status, result.numberComponentsDeployed,
+                    result.numberComponentErrors, result.numberTestsCompleted)
+
+        result = self._poll(self.check_deploy_status, async_id, progress,
+                            **kwargs)
+        if include_details:
+            result = self.check_deploy_status(async_id, include_details=True)
+        return result
+
+    def deploy(self, zip_file, timeout=None, **options):
+        """
+        Deploys a zip package and returns its DeployResult once it is done,
+        see start_deploy.
+        """
+        async_result = self.start_deploy(zip_file, **options)
+        return self.wait_for_deploy(async_result.id, timeout=timeout)
+
+    def deploy_async(self, zip_file, timeout=None, **options):
+        "Like deploy, but returns a Future of the DeployResult immediately."
+        return self._submit(self.deploy, zip_file, timeout=timeout, **options)
+
+    def start_retrieve(self, types=None, package_names=None,
+                       specific_files=None, single_package=True):
+        """
+        Starts retrieving a zip package and returns its AsyncResult. types is
+        a dictionary of the members to retrieve keyed by metadata type, e.g.
+        {'CustomObject': ['Account', 'Invoice__c']}.
+        """
+        retrieve_request = self.client.factory.create('RetrieveRequest')
+        retrieve_request.apiVersion = self.version
+        retrieve_request.singlePackage = single_package
+        retrieve_request.packageNames = package_names or []
+        retrieve_request.specificFiles = specific_files or []
+        if types:
+            package = self.client.factory.create('Package')
+            package.version = self.version
+            for type_name, members in sorted(types.items()):
+                type_members = self.client.factory.create(
+                    'PackageTypeMembers')
+                type_members.name = type_name
+                type_members.members = list(members)
+                package.types.append(type_members)
+            retrieve_request.unpackaged = package
+        return self._call('retrieve', args=[retrieve_request])
+
+    def check_status(self, async_id):
+        return self._call('checkStatus', args=[[async_id]])[0]
+
+    def _receive_retrieve(self, async_id, zip_file):
+        request, context = self._prepare('checkRetrieveStatus',
+                                         args=[async_id])
+        response = self.client.options.transport.post(request)
+        fileobj, close = self._open(zip_file, 'wb')
+        try:
+            reply = io.BytesIO()
+            parser = xml.sax.make_parser()
+            parser.setContentHandler(Base64ElementFilter(reply, 'zipFile',
+                                                         fileobj))
+            for chunk in response.iter_content(Base64Body.CHUNK_SIZE):
+                parser.feed(chunk)
+            parser.close()
+        finally:
+            response.close()
+            if close:
+                fileobj.close()
+        return context.process_reply(reply.getvalue(), response.status_code,
+                                     response.reason)
+
+    def check_retrieve_status(self, async_id, zip_file):
+        """
+        Fetches the RetrieveResult of a finished retrieval, writing its zip
+        package to zip_file (a path or a binary file object) as it is read
+        from the response instead of decoding it in memory. The zipFile of
+        the returned result is left empty.
+        """
+        return self._with_session('checkRetrieveStatus',
+                                  self._receive_retrieve, async_id, zip_file)
+
+    def wait_for_retrieve(self, async_id, zip_file, **kwargs):
+        """
+        Polls a retrieval until it is done, then writes its zip package to
+        zip_file and returns its RetrieveResult. Keyword arguments are passed
+        on to _poll.
+        """
+        result = self._poll(self.check_status, async_id,
+                            lambda result: result.state, **kwargs)
+        if result.state == 'Error':
+            raise SalesforceSoapException([{'statusCode': result.statusCode,
+                                            'message': result.message}])
+        return self.check_retrieve_status(async_id, zip_file)
+
+    def retrieve(self, zip_file, timeout=None, **kwargs):
+        """
+        Retrieves a zip package into zip_file and returns its RetrieveResult
+        once it is done, see start_retrieve.
+        """
+        async_result = self.start_retrieve(**kwargs)
+        return self.wait_for_retrieve(async_result.id, zip_file,
+                                      timeout=timeout)
+
+    def retrieve_async(self, zip_file, timeout=None, **kwargs):
+        "Like retrieve, but returns a Future of the RetrieveResult immediately."
+        return self._submit(self.retrieve, zip_file, timeout=timeout,
+                            **kwargs)
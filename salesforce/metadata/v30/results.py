@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+from ...soap.results import Record, boolean, datetime, slots, text
+
+
+class Error(Record):
+    _fields = (
+        ('fields', text, True),
+        ('message', text, False),
+        ('statusCode', text, False),
+    )
+    __slots__ = slots(_fields)
+
+
+class SaveResult(Record):
+    _fields = (
+        ('errors', Error, True),
+        ('fullName', text, False),
+        ('success', boolean, False),
+    )
+    __slots__ = slots(_fields)
+
+
+class DeleteResult(SaveResult):
+    __slots__ = ()
+
+
+class ReadResult(Record):
+    # Records are Metadata of any type, which are left to suds so that they
+    # can be passed back to updateMetadata.
+    _fields = (
+        ('records', None, True),
+    )
+    __slots__ = slots(_fields)
+
+
+class FileProperties(Record):
+    _fields = (
+        ('createdById', text, False),
+        ('createdByName', text, False),
+        ('createdDate', datetime, False),
+        ('fileName', text, False),
+        ('fullName', text, False),
+        ('id', text, False),
+        ('lastModifiedById', text, False),
+        ('lastModifiedByName', text, False),
+        ('lastModifiedDate', datetime, False),
+        ('manageableState', text, False),
+        ('namespacePrefix', text, False),
+        ('type', text, False),
+    )
+    __slots__ = slots(_fields)
+
+
+RESULT_TYPES = dict((record_type.__name__, record_type) for record_type in (
+    Error, SaveResult, DeleteResult, ReadResult, FileProperties))
@@ -3,6 +3,7 @@ from __future__ import absolute_import, unicode_literals
 
 import logging
 import os.path
+import threading
 import urllib
 import urlparse
 from xml.etree import ElementTree
@@ -10,14 +11,17 @@ from xml.etree import ElementTree
 import pytz
 import requests
 import wrapt
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE, DEFAULT_RETRIES
 from requests_oauthlib import OAuth2Session
 
+from .. import codec
+from ..instrumentation import Instrumentation, rest_endpoint
 from .exceptions import (
     SalesforceRestException,
     AuthenticationMissingException,
-    InvalidSessionException,
     get_exception,
 )
+from . import validation
 
 logger = logging.getLogger(__name__)
 
@@ -28,15 +32,44 @@ def auth_required(wrapped, instance, args, kwargs):
         raise AuthenticationMissingException()
     return wrapped(*args, **kwargs)
 
+_shared_adapters = {}
+_shared_adapters_lock = threading.Lock()
+
+
+def get_shared_adapter(domain, pool_connections=DEFAULT_POOLSIZE,
+                       pool_maxsize=DEFAULT_POOLSIZE,
+                       max_retries=DEFAULT_RETRIES):
+    """
+    Returns the process-wide HTTPAdapter for a domain and set of pool options,
+    creating it on first use. Sessions that mount the same adapter share its
+    connection pool, so they reuse each other's kept-alive TLS connections.
+    """
+    key = (domain, pool_connections, pool_maxsize, max_retries)
+    with _shared_adapters_lock:
+        adapter = _shared_adapters.get(key)
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=pool_connections,
+                                  pool_maxsize=pool_maxsize,
+                                  max_retries=max_retries)
+            _shared_adapters[key] = adapter
+    return adapter
+
 METHOD_STATUS_CODES = {
     'GET': (200, 300),
-    'POST': (201, 204),
-    'PATCH': (201, 204, 300),
+    'POST': (200, 201, 204),
+    'PATCH': (200, 201, 204, 300),
+    'PUT': (200, 201, 204),
     'DELETE': (200, 204),
 }
 
 
 class SalesforceRestClientBase(object):
+
+    """
+    Clients are safe to share between threads. When several threads find
+    that the access token has expired at the same time, only one of them
+    refreshes it and the others retry with the new token.
+    """
     RESPONSE_FORMAT_JSON = 'json'
     RESPONSE_FORMAT_XML = 'xml'
 
@@ -46,14 +79,53 @@ class SalesforceRestClientBase(object):
 
     def __init__(self, client_id, client_secret, domain, user_id=None,
                  access_token=None, refresh_token=None, token_updater=None,
-                 response_format=RESPONSE_FORMAT_JSON):
+                 response_format=RESPONSE_FORMAT_JSON, describe_cache=None,
+                 pool_connections=DEFAULT_POOLSIZE,
+                 pool_maxsize=DEFAULT_POOLSIZE, max_retries=DEFAULT_RETRIES,
+                 timeout=None, keep_alive=True, shared_transport=False,
+                 request_limiter=None, retry_policy=None, json_codec=None,
+                 instrumentation=None):
         '''
         domain: The domain name of the organization's Salesforce instance (e.g.
                 "na1.salesforce.com")
+        describe_cache: An optional DescribeCache (see salesforce.rest.cache)
+                        used to avoid downloading unchanged object
+                        descriptions again.
+        pool_connections, pool_maxsize, max_retries: Connection pool options
+                        of the session's HTTPAdapter. pool_maxsize should be
+                        at least the number of threads sharing the client.
+        timeout: Seconds to wait for each request, either a single number or
+                 a (connect timeout, read timeout) tuple.
+        keep_alive: If False, connections are closed after each request.
+        shared_transport: If True, the connection pool of the instance is
+                          shared with every other client for the same domain
+                          and pool options. Requests to other hosts, such as
+                          the login server, keep a pool of their own.
+        request_limiter: An optional RequestLimiter (see
+                         salesforce.rest.limits) which throttles requests to
+                         stay within the organization's API allocation.
+        retry_policy: An optional RetryPolicy (see salesforce.retry) used to
+                      retry transient errors of any request.
+        json_codec: The name of the JSON library used to parse responses and
+                    serialize request bodies (see salesforce.codec). Defaults
+                    to the first one installed in codec.PREFERENCE.
+        instrumentation: An optional Instrumentation (see
+                         salesforce.instrumentation) whose hooks are called
+                         before and after every request, and on retries and
+                         token refreshes.
         '''
         self.domain = domain
         self.user_id = user_id
         self.response_format = response_format
+        self.describe_cache = describe_cache
+        self.timeout = timeout
+        self.request_limiter = request_limiter
+        self.retry_policy = retry_policy
+        self.json_codec = codec.get_codec(json_codec)
+        self.instrumentation = instrumentation or Instrumentation()
+        self._refresh_lock = threading.Lock()
+        # Names of the fields get_many selects by default, by object name
+        self._queryable_fields_cache = {}
 
         if access_token:
             token = {
@@ -75,10 +147,20 @@ class SalesforceRestClientBase(object):
                                          auto_refresh_kwargs=auto_refresh_kwargs,
                                          token_updater=token_updater)
         else:
-            session = requests.Session()
+            self.session = requests.Session()
         self.session.headers['Accept'] = 'application/{0}'.format(
             response_format
         )
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+            max_retries=max_retries))
+        if shared_transport:
+            self.session.mount(self._instance_url('/'), get_shared_adapter(
+                domain, pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize, max_retries=max_retries))
 
     def _url(self, path, params=None, versioned=True):
         path_parts = ['services/data']
@@ -86,30 +168,38 @@ class SalesforceRestClientBase(object):
             path_parts.append('v{0}'.format(self.version))
         path_parts.append(path)
 
-        url = urlparse.urljoin('https://{0}'.format(self.domain),
-                               os.path.join(*path_parts))
+        url = self._instance_url(os.path.join(*path_parts))
 
         if params:
             url += '?{0}'.format(urllib.urlencode(params))
         return url
 
+    def _instance_url(self, path):
+        """
+        Builds an absolute URL on the organization's instance from a path, such
+        as the nextRecordsUrl returned by a query.
+        """
+        return urlparse.urljoin('https://{0}'.format(self.domain), path)
+
     def _extract_response(self, response):
         error_code = error_message = content = None
         if self.response_format == SalesforceRestClientBase.RESPONSE_FORMAT_JSON:
-            if response.text:
-                content = response.json()
+            # The codec decodes the bytes only if its library needs it
+            if response.content:
+                content = self.json_codec.loads(response.content)
 
             if 400 <= response.status_code < 500:
                 error = content[0]
                 error_code = error['errorCode']
                 error_message = error['message']
         elif self.response_format == SalesforceRestClientBase.RESPONSE_FORMAT_XML:
-            # TODO: create ElementTree that supports unicode!
-            content = ElementTree.fromstring(response.text.encode('utf-8'))
+            # Parse the raw bytes in the document's declared encoding
+            if response.content:
+                content = ElementTree.fromstring(response.content)
 
             if 400 <= response.status_code < 500:
-                error = content.getchildren()[0]
-                error_code, error_message = [e.text.decode('utf-8') for e in error]
+                error = list(content)[0]
+                error_code, error_message = [e.text for e in error]
 
         if response.status_code in METHOD_STATUS_CODES[response.request.method]:
             return content
@@ -126,35 +216,196 @@ class SalesforceRestClientBase(object):
     def _format_datetime(self, value):
         return value.astimezone(pytz.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
 
-    def _refresh_token(self):
-        if self.session.token.get('refresh_token'):
-            token = self.session.refresh_token(
-                self.session.auto_refresh_url,
-            )
-            if self.session.token_updater:
-                self.session.token_updater(token)
-            return token
+    def _access_token(self):
+        token = getattr(self.session, 'token', None) or {}
+        return token.get('access_token')
 
-    def _call(self, url, method='get', body=None, headers=None):
+    def _identity(self):
+        """
+        Returns the IDs of the session's organization and user, taken from
+        the identity URL of the OAuth token when it has one. Otherwise the
+        organization ID is the prefix of the access token, and the user ID
+        is user_id. Either is None if it can't be told.
+        """
+        token = getattr(self.session, 'token', None) or {}
+        if token.get('id'):
+            org_id, user_id = token['id'].rstrip('/').split('/')[-2:]
+            return org_id, user_id
+        access_token = token.get('access_token') or ''
+        org_id = access_token.split('!')[0] if '!' in access_token else None
+        return org_id, self.user_id
+
+    def _refresh_token(self, expired_access_token=None):
+        """
+        Refreshes the access token and returns the new token. Only one refresh
+        runs at a time. If expired_access_token is given and another thread
+        has already replaced it, the current token is returned without
+        refreshing again.
+        """
+        with self._refresh_lock:
+            token = getattr(self.session, 'token', None) or {}
+            if (expired_access_token is not None and
+                    token.get('access_token') != expired_access_token):
+                return token
+
+            if token.get('refresh_token'):
+                token = self.session.refresh_token(
+                    self.session.auto_refresh_url,
+                )
+                if self.session.token_updater:
+                    self.session.token_updater(token)
+                return token
+
+    def _send(self, url, method='get', body=None, headers=None, **kwargs):
         logger.debug(url)
-        response = getattr(self.session, method)(url, data=body,
-                                                 headers=headers)
-        try:
-            return self._extract_response(response)
-        except InvalidSessionException as e:
-            if self._refresh_token():
+        kwargs.setdefault('timeout', self.timeout)
+        return getattr(self.session, method)(url, data=body, headers=headers,
+                                             **kwargs)
+
+    def _throttle(self):
+        limiter = self.request_limiter
+        if limiter.should_refresh():
+            try:
+                limits = self._extract_response(self._send(self._url('limits')))
+            except SalesforceRestException as e:
+                # The limits resource isn't enabled for every organization;
+                # usage is still tracked from response headers.
+                logger.warning('Could not fetch API limits: %s', e)
+            else:
+                limiter.update_from_limits(limits)
+        limiter.acquire()
+
+    def _request(self, url, method='get', body=None, headers=None, **kwargs):
+        """
+        Sends a request and returns the raw response. If the session has
+        expired and the access token can be refreshed, the request is sent
+        again with the new token. Extra keyword arguments (e.g. stream) are
+        passed through to the underlying session.
+        """
+        with self.instrumentation.request('rest', method, rest_endpoint(url),
+                                          url) as call:
+            if self.request_limiter is not None:
+                self._throttle()
+            access_token = self._access_token()
+            call.record_request(body)
+            response = self._send(url, method=method, body=body,
+                                  headers=headers, **kwargs)
+            if (response.status_code == 401 and
+                    self._refresh_token(expired_access_token=access_token)):
                 # Try again with the refreshed access token
-                response = getattr(self.session, method)(url, data=body,
-                                                         headers=headers)
-                return self._extract_response(response)
+                self.instrumentation.refresh(call)
+                response.close()
+                call.record_request(body)
+                response = self._send(url, method=method, body=body,
+                                      headers=headers, **kwargs)
+            call.record_response(response, streamed=kwargs.get('stream'))
+            if self.request_limiter is not None:
+                self.request_limiter.update_from_response(response)
+            return response
 
-            raise
+    def _should_retry(self, attempt, method, error):
+        if self.retry_policy is None:
+            return False
+        if isinstance(error, requests.RequestException):
+            return self.retry_policy.should_retry(attempt, method,
+                                                  exception=error)
+        return self.retry_policy.should_retry(
+            attempt, method, status_code=error.status_code,
+            error_code=getattr(error, 'error_code', None))
+
+    def _call(self, url, method='get', body=None, headers=None):
+        return self._retrying(self._call_once, url, method=method, body=body,
+                              headers=headers)
+
+    def _call_once(self, url, method='get', body=None, headers=None):
+        response = self._request(url, method=method, body=body,
+                                 headers=headers)
+        return self._extract_response(response)
+
+    def _open(self, url):
+        """
+        GETs url and returns the response without reading its body, which can
+        be read from response.raw as it arrives. Error responses are raised,
+        and retried, as they are by _call.
+        """
+        return self._retrying(self._open_once, url)
+
+    def _open_once(self, url, method='get'):
+        response = self._request(url, method=method, stream=True)
+        if response.status_code not in METHOD_STATUS_CODES[method.upper()]:
+            # Error responses are small, read them in full to raise them
+            self._extract_response(response)
+        # Undo any Content-Encoding (e.g. gzip) while the body is read
+        response.raw.decode_content = True
+        return response
+
+    def _retrying(self, func, url, method='get', **kwargs):
+        """
+        Calls func(url, method, **kwargs), which sends a request, again for as
+        long as the retry policy allows if it fails.
+        """
+        attempt = 1
+        with self.instrumentation.request('rest', method, rest_endpoint(url),
+                                          url) as call:
+            while True:
+                try:
+                    return func(url, method=method, **kwargs)
+                except (SalesforceRestException,
+                        requests.RequestException) as e:
+                    if not self._should_retry(attempt, method, e):
+                        raise
+                    logger.info('Retrying %s %s after error: %s',
+                                method.upper(), url, e)
+                    self.instrumentation.retry(call, e)
+                    self.retry_policy.sleep(attempt)
+                    attempt += 1
 
     def call(self, path, method='get', params=None, body=None, headers=None,
              versioned=True):
         url = self._url(path, params=params, versioned=versioned)
         return self._call(url, method=method, body=body, headers=headers)
 
+    def _describe(self, path):
+        """
+        Calls a describe resource through the describe cache, if one is
+        configured. Fresh cached descriptions are returned without a request,
+        and stale ones are revalidated with an If-Modified-Since request.
+
+        Descriptions depend on the organization and on the user's field-level
+        security, so they are cached per organization and user. Sessions
+        whose organization can't be identified don't use the cache.
+        """
+        cache = self.describe_cache
+        org_id, user_id = self._identity()
+        if (cache is None or org_id is None or
+                self.response_format != SalesforceRestClientBase.RESPONSE_FORMAT_JSON):
+            return self.call(path)
+
+        key = (self.domain, self.version, org_id, user_id, path)
+        entry = cache.get(key)
+        if entry is not None and cache.is_fresh(entry):
+            return entry.content
+
+        headers = {}
+        if entry is not None and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        response, content = self._retrying(self._describe_once,
+                                           self._url(path), headers=headers)
+        if entry is not None and response.status_code == 304:
+            cache.set(key, entry.content, entry.last_modified)
+            return entry.content
+
+        last_modified = (response.headers.get('Last-Modified') or
+                         response.headers.get('Date'))
+        cache.set(key, content, last_modified)
+        return content
+
+    def _describe_once(self, url, method='get', headers=None):
+        response = self._request(url, method=method, headers=headers)
+        if response.status_code == 304:
+            return response, None
+        return response, self._extract_response(response)
+
     def versions(self):
         """
         Lists summary information about each Salesforce version currently
@@ -174,22 +425,30 @@ class SalesforceRestClientBase(object):
 
         if new_record:
             if not field['createable'] and value is not None:
-                errors.append('Cannot create this field')
+                errors.append(validation.CANNOT_CREATE)
         else:
             if not field['updateable'] and value is not None:
-                errors.append('Cannot update this field')
+                errors.append(validation.CANNOT_UPDATE)
 
         if value is not None and field.get('restrictedPicklist'):
             values = [i['value']
                       for i in field['picklistValues'] if i['active']]
             if value not in values:
-                errors.append('Bad value for restricted picklist field')
+                errors.append(validation.BAD_PICKLIST_VALUE)
 
         if (new_record and value is None and not field['nillable'] and
                 not field['defaultedOnCreate'] and field['type'] != 'boolean'):
-            errors.append('This field is required')
+            errors.append(validation.REQUIRED)
         return errors
 
+    @staticmethod
+    def compile_validator(object_description):
+        """
+        Returns a CompiledValidator for an object's full description
+        dictionary. Reuse it to validate many records against the same object.
+        """
+        return validation.compile_validator(object_description)
+
     @staticmethod
     def validate_object(data, object_description, new_record=True):
         """
@@ -197,14 +456,5 @@ class SalesforceRestClientBase(object):
         description dictionary. Returns a 2-tuple (is_valid, errors) where
         errors is a dictionary keyed by field name.
         """
-        errors = {}
-        field_map = {f['name']: f for f in object_description['fields']}
-        for field_name, field in field_map.items():
-            field_errors = SalesforceRestClientBase.validate_field(
-                data.get(field_name), field, new_record=new_record)
-            if field_errors:
-                errors[field_name] = field_errors
-
-        for field_name in set(data.keys()) - set(field_map.keys()):
-            errors[field_name] = ['Field name not found']
-        return not errors, errors
+        validator = validation.compile_validator(object_description)
+        return validator.validate(data, new_record=new_record)
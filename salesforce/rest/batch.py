@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+
+from .exceptions import get_exception
+
+logger = logging.getLogger(__name__)
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+UPSERT = 'upsert'
+
+
+class SalesforceBatch(object):
+
+    """
+    Collects sObject operations and sends them to Salesforce in as few requests
+    as possible. Creates, updates and deletes go through the sObject
+    Collections resource, and external ID upserts through the composite batch
+    resource. Both are newer than the REST client they are attached to, so
+    requests are made against this class's own API version.
+
+    https://developer.salesforce.com/docs/atlas.en-us.api_rest.meta/api_rest/resources_composite_sobjects_collections.htm
+    https://developer.salesforce.com/docs/atlas.en-us.api_rest.meta/api_rest/resources_composite_batch.htm
+    """
+    version = '42.0'
+
+    # Maximum number of records per sObject Collections request
+    COLLECTION_SIZE = 200
+    # Maximum number of subrequests per composite batch request
+    BATCH_SIZE = 25
+
+    def __init__(self, client, all_or_none=False):
+        self.client = client
+        self.all_or_none = all_or_none
+        self.operations = []
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+    def _add(self, kind, object_name, object_id=None, data=None,
+             external_id_field=None):
+        self.operations.append((kind, object_name, object_id, data,
+                                external_id_field))
+        return len(self.operations) - 1
+
+    def create(self, object_name, data):
+        """
+        Queues the creation of a new record. Returns the index of its result in
+        the list returned by execute.
+        """
+        return self._add(CREATE, object_name, data=data)
+
+    def update(self, object_name, object_id, data):
+        "Queues an update of the record with the specified object_id."
+        return self._add(UPDATE, object_name, object_id=object_id, data=data)
+
+    def delete(self, object_name, object_id):
+        "Queues the deletion of the record with the specified object_id."
+        return self._add(DELETE, object_name, object_id=object_id)
+
+    def upsert_external(self, object_name, external_id_field, external_id,
+                        data):
+        "Queues an upsert based on the value of a specified external ID field."
+        return self._add(UPSERT, object_name, object_id=external_id, data=data,
+                         external_id_field=external_id_field)
+
+    def _chunks(self):
+        """
+        Splits the queued operations into runs of the same kind, preserving
+        their order, then splits each run to the maximum request size.
+        """
+        run = []
+        for index, operation in enumerate(self.operations):
+            if run and run[-1][1][0] != operation[0]:
+                for chunk in self._split(run):
+                    yield chunk
+                run = []
+            run.append((index, operation))
+        if run:
+            for chunk in self._split(run):
+                yield chunk
+
+    def _split(self, run):
+        kind = run[0][1][0]
+        size = self.BATCH_SIZE if kind == UPSERT else self.COLLECTION_SIZE
+        for i in range(0, len(run), size):
+            yield kind, run[i:i + size]
+
+    def _url(self, path, params=None):
+        return self.client._url('v{0}/{1}'.format(self.version, path),
+                                params=params, versioned=False)
+
+    def _send_collection(self, kind, operations):
+        headers = {'Content-Type': 'application/json'}
+        if kind == DELETE:
+            params = {
+                'ids': ','.join(o[2] for o in operations),
+                'allOrNone': 'true' if self.all_or_none else 'false',
+            }
+            return self.client._call(self._url('composite/sobjects', params),
+                                     method='delete')
+
+        records = []
+        for _, object_name, object_id, data, _ in operations:
+            record = dict(data)
+            record['attributes'] = {'type': object_name}
+            if object_id is not None:
+                record['id'] = object_id
+            records.append(record)
+        body = self.client.json_codec.dumps({'allOrNone': self.all_or_none,
+                                             'records': records})
+        method = 'post' if kind == CREATE else 'patch'
+        return self.client._call(self._url('composite/sobjects'),
+                                 method=method, body=body, headers=headers)
+
+    def _send_batch(self, operations):
+        batch_requests = []
+        for _, object_name, external_id, data, external_id_field in operations:
+            batch_requests.append({
+                'method': 'PATCH',
+                'url': 'v{0}/sobjects/{1}/{2}/{3}'.format(
+                    self.version, object_name, external_id_field,
+                    external_id),
+                'richInput': data,
+            })
+        body = self.client.json_codec.dumps({
+            'haltOnError': self.all_or_none,
+            'batchRequests': batch_requests,
+        })
+        headers = {'Content-Type': 'application/json'}
+        response = self.client._call(self._url('composite/batch'),
+                                     method='post', body=body, headers=headers)
+        return response['results']
+
+    @staticmethod
+    def _collection_result(result):
+        if result['success']:
+            return result
+        error = result['errors'][0]
+        return get_exception(400, error['statusCode'], error['message'])
+
+    @staticmethod
+    def _batch_result(result):
+        status_code = result['statusCode']
+        if status_code < 400:
+            return result['result']
+        error = result['result'][0]
+        return get_exception(status_code, error['errorCode'],
+                             error['message'])
+
+    def execute(self):
+        """
+        Sends all queued operations and returns a list with one entry per
+        operation, in the order they were queued. Successful operations are
+        represented by their result dictionary and failed ones by the
+        exception describing the failure.
+        """
+        results = [None] * len(self.operations)
+        for kind, chunk in self._chunks():
+            indexes = [index for index, _ in chunk]
+            operations = [operation for _, operation in chunk]
+            logger.debug('Sending %d %s operations', len(operations), kind)
+            if kind == UPSERT:
+                responses = map(self._batch_result,
+                                self._send_batch(operations))
+            else:
+                responses = map(self._collection_result,
+                                self._send_collection(kind, operations))
+            for index, response in zip(indexes, responses):
+                results[index] = response
+
+        self.operations = []
+        self.results = results
+        return results
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple, OrderedDict
+
+from .. import codec
+
+logger = logging.getLogger(__name__)
+
+CacheEntry = namedtuple('CacheEntry', ['content', 'last_modified',
+                                       'timestamp'])
+
+
+class DescribeCache(object):
+
+    """
+    In-memory LRU cache of describe responses, keyed by (domain, version,
+    organization ID, user ID, path). Clients which don't know their user ID
+    (from the identity URL of their token or their user_id) share the entries
+    of their organization, so such clients should only share a cache with
+    clients of the same user. Entries older than ttl seconds are still returned by get, so that
+    the client can revalidate them with an If-Modified-Since request instead
+    of downloading the whole description again.
+
+    Cached descriptions are shared between callers and must not be modified.
+    """
+    DEFAULT_MAX_SIZE = 256
+    DEFAULT_TTL = 15 * 60
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_fresh(self, entry):
+        return time.time() - entry.timestamp < self.ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+        return entry
+
+    def set(self, key, content, last_modified=None):
+        entry = CacheEntry(content, last_modified, time.time())
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileDescribeCache(DescribeCache):
+
+    """
+    Describe cache which also persists entries on disk, in one directory per
+    domain, API version, organization and user, so that they survive process
+    restarts. The
+    in-memory LRU sits in front of the files.
+    """
+
+    def __init__(self, directory, max_size=DescribeCache.DEFAULT_MAX_SIZE,
+                 ttl=DescribeCache.DEFAULT_TTL):
+        super(FileDescribeCache, self).__init__(max_size=max_size, ttl=ttl)
+        self.directory = directory
+
+    def _path(self, key):
+        domain, version, org_id, user_id, path = key
+        filename = hashlib.sha1(path.encode('utf-8')).hexdigest() + '.json'
+        return os.path.join(self.directory, domain, version, org_id,
+                            user_id or '_', filename)
+
+    def get(self, key):
+        entry = super(FileDescribeCache, self).get(key)
+        if entry is not None:
+            return entry
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = codec.get_codec().loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+
+        entry = CacheEntry(data['content'], data['last_modified'],
+                           data['timestamp'])
+        with self._lock:
+            self._entries.setdefault(key, entry)
+        return entry
+
+    def set(self, key, content, last_modified=None):
+        entry = super(FileDescribeCache, self).set(key, content,
+                                                   last_modified)
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            # Write to a temporary file first so that concurrent readers never
+            # see a partially written entry.
+            fd, temp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(codec.get_codec().dumps(entry._asdict()))
+            os.rename(temp_path, path)
+        except (IOError, OSError) as e:
+            logger.warning('Could not write describe cache entry %s: %s',
+                           path, e)
+        return entry
+
+    def clear(self):
+        super(FileDescribeCache, self).clear()
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith('.json'):
+                    os.remove(os.path.join(root, filename))
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import datetime
+import re
+
+from .replication import parse_datetime
+
+BOOLEAN = 'boolean'
+INTEGER = 'integer'
+FLOAT = 'float'
+DATE = 'date'
+TIMESTAMP = 'timestamp'
+STRING = 'string'
+
+# Column types of Salesforce field types, anything else is a string
+FIELD_TYPES = {
+    'boolean': BOOLEAN,
+    'int': INTEGER,
+    'long': INTEGER,
+    'double': FLOAT,
+    'currency': FLOAT,
+    'percent': FLOAT,
+    'date': DATE,
+    'datetime': TIMESTAMP,
+}
+
+NUMPY_DTYPES = {
+    BOOLEAN: '?',
+    INTEGER: 'i8',
+    FLOAT: 'f8',
+    DATE: 'datetime64[D]',
+    TIMESTAMP: 'datetime64[ms]',
+    STRING: 'O',
+}
+
+# Values stored under the mask of missing NumPy values
+NUMPY_PLACEHOLDERS = {
+    BOOLEAN: False,
+    INTEGER: 0,
+    FLOAT: float('nan'),
+    DATE: 'NaT',
+    TIMESTAMP: 'NaT',
+    STRING: None,
+}
+
+DEFAULT_BATCH_SIZE = 10000
+
+SELECT_RE = re.compile(
+    r'^\s*SELECT\s+(?P<fields>.+?)\s+FROM\s+(?P<object>\w+)',
+    re.IGNORECASE | re.DOTALL)
+
+Column = collections.namedtuple('Column', ['name', 'path', 'type'])
+
+
+def _convert(value, column_type):
+    if value is None:
+        return None
+    if column_type == DATE:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    if column_type == TIMESTAMP:
+        # Arrow and NumPy both take naive datetimes as UTC
+        return parse_datetime(value).replace(tzinfo=None)
+    if column_type == INTEGER:
+        return int(value)
+    if column_type == FLOAT:
+        return float(value)
+    return value
+
+
+def _find(description, key, name):
+    name = name.lower()
+    for field in description['fields']:
+        if (field.get(key) or '').lower() == name:
+            return field
+
+
+def _column(name, description, describe):
+    """
+    Returns the Column of a selected field, following its relationships
+    from one description to the next with describe(object_name). Records
+    have the canonical names of fields, whatever case the query used.
+    """
+    path = []
+    parts = name.split('.')
+    for part in parts[:-1]:
+        field = description and _find(description, 'relationshipName', part)
+        path.append(field['relationshipName'] if field else part)
+        # Polymorphic relationships can point to any of several objects
+        if field and len(field.get('referenceTo') or ()) == 1:
+            description = describe(field['referenceTo'][0])
+        else:
+            description = None
+    field = description and _find(description, 'name', parts[-1])
+    if field is None:
+        return Column(name, tuple(path + [parts[-1]]), STRING)
+    return Column(name, tuple(path + [field['name']]),
+                  FIELD_TYPES.get(field['type'], STRING))
+
+
+class Schema(object):
+
+    """
+    The typed columns of a query's results: one per selected field, named
+    after it, with fields of related records (such as Owner.Name) flattened
+    into columns of their own. Records are converted into columns batch by
+    batch, which can be turned into Arrow record batches or NumPy masked
+    structured arrays and written to Parquet or Feather files as they are
+    produced, e.g.:
+
+        soql = 'SELECT Id, Amount, Owner.Name FROM Opportunity'
+        schema = Schema.from_query(client, soql)
+        with ParquetWriter('opportunities.parquet', schema) as writer:
+            export(client, soql, schema, writer)
+
+    Arrow batches and files need pyarrow, and NumPy arrays numpy (see the
+    columnar extra).
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+    def __repr__(self):
+        return 'Schema({0!r})'.format(self.columns)
+
+    @property
+    def names(self):
+        return [column.name for column in self.columns]
+
+    @classmethod
+    def from_description(cls, description, fields, related=None):
+        """
+        Builds a schema from an object's full description and the names of
+        its selected fields. related maps object names to the full
+        descriptions of the objects relationship fields point to, so that
+        their fields get a type too; fields of other objects are strings.
+        """
+        related = related or {}
+        return cls(_column(name, description, related.get)
+                   for name in fields)
+
+    @classmethod
+    def from_query(cls, client, soql):
+        """
+        Builds the schema of a query's results from the descriptions of the
+        queried object and of the objects its relationship fields point to.
+        Queries must select plain fields, without subqueries or functions.
+        """
+        match = SELECT_RE.match(soql)
+        if match is None or '(' in match.group('fields'):
+            raise ValueError('Cannot infer the columns of: {0}'.format(soql))
+        fields = [f.strip() for f in match.group('fields').split(',')]
+        descriptions = {}
+
+        def describe(object_name):
+            if object_name not in descriptions:
+                descriptions[object_name] = client.object(
+                    object_name, full_description=True)
+            return descriptions[object_name]
+
+        description = describe(match.group('object'))
+        return cls(_column(name, description, describe) for name in fields)
+
+    def batches(self, records, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Yields the values of records in batches of at most batch_size rows,
+        as lists of values, one per column.
+        """
+        columns = [[] for _ in self.columns]
+        for record in records:
+            for column, values in zip(self.columns, columns):
+                value = record
+                for key in column.path:
+                    value = value.get(key) if value is not None else None
+                values.append(_convert(value, column.type))
+            if len(columns[0]) >= batch_size:
+                yield columns
+                columns = [[] for _ in self.columns]
+        if columns and columns[0]:
+            yield columns
+
+    #### Arrow ####
+
+    def arrow_schema(self):
+        import pyarrow
+        types = {
+            BOOLEAN: pyarrow.bool_(),
+            INTEGER: pyarrow.int64(),
+            FLOAT: pyarrow.float64(),
+            DATE: pyarrow.date32(),
+            TIMESTAMP: pyarrow.timestamp('ms', tz='UTC'),
+            STRING: pyarrow.string(),
+        }
+        return pyarrow.schema([pyarrow.field(column.name, types[column.type])
+                               for column in self.columns])
+
+    def to_arrow(self, columns):
+        "Converts a batch of column values into an Arrow RecordBatch."
+        import pyarrow
+        schema = self.arrow_schema()
+        arrays = [pyarrow.array(values, type=field.type)
+                  for values, field in zip(columns, schema)]
+        return pyarrow.RecordBatch.from_arrays(arrays, schema.names)
+
+    #### NumPy ####
+
+    def numpy_dtype(self):
+        import numpy
+        return numpy.dtype([(str(column.name), NUMPY_DTYPES[column.type])
+                            for column in self.columns])
+
+    def to_numpy(self, columns):
+        """
+        Converts a batch of column values into a NumPy structured array,
+        masked where values are missing.
+        """
+        import numpy
+        placeholders = [NUMPY_PLACEHOLDERS[column.type]
+                        for column in self.columns]
+        rows = list(zip(*columns))
+        data = [tuple(placeholder if value is None else value
+                      for value, placeholder in zip(row, placeholders))
+                for row in rows]
+        mask = [tuple(value is None for value in row) for row in rows]
+        return numpy.ma.array(data, mask=mask, dtype=self.numpy_dtype())
+
+
+class ParquetWriter(object):
+
+    "Writes batches to a Parquet file, one row group per batch."
+
+    def __init__(self, path, schema, **kwargs):
+        import pyarrow.parquet
+        self.schema = schema
+        self._writer = pyarrow.parquet.ParquetWriter(
+            path, schema.arrow_schema(), **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, columns):
+        import pyarrow
+        batch = self.schema.to_arrow(columns)
+        self._writer.write_table(pyarrow.Table.from_batches([batch]))
+
+    def close(self):
+        self._writer.close()
+
+
+class FeatherWriter(object):
+
+    "Writes batches to a Feather (Arrow IPC) file."
+
+    def __init__(self, path, schema):
+        import pyarrow
+        self.schema = schema
+        self._sink = pyarrow.OSFile(path, 'wb')
+        self._writer = pyarrow.RecordBatchFileWriter(self._sink,
+                                                     schema.arrow_schema())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, columns):
+        self._writer.write_batch(self.schema.to_arrow(columns))
+
+    def close(self):
+        self._writer.close()
+        self._sink.close()
+
+
+def export(client, soql, schema, writer, batch_size=DEFAULT_BATCH_SIZE,
+           include_all=False):
+    """
+    Streams a query's records into a writer, batch_size at a time, and
+    returns the number of records written.
+    """
+    count = 0
+    records = client.query_iter(soql, include_all=include_all, prefetch=True)
+    for columns in schema.batches(records, batch_size):
+        writer.write(columns)
+        count += len(columns[0])
+    return count
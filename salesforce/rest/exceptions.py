@@ -36,9 +36,14 @@ class NotFoundException(InvalidCallException):
     pass
 
 
+class RequestLimitExceededException(InvalidCallException):
+    pass
+
+
 def get_exception(status_code, error_code, error_message):
     error_code_map = {
         (401, 'INVALID_SESSION_ID'): InvalidSessionException,
+        (403, 'REQUEST_LIMIT_EXCEEDED'): RequestLimitExceededException,
         (404, 'NOT_FOUND'): NotFoundException,
     }
     klass = error_code_map.get((status_code, error_code), InvalidCallException)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import copy
+import functools
+import inspect
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+def size_connection_pool(client, size):
+    """
+    Returns client if its pool keeps at least size connections to its
+    instance, so that as many concurrent requests don't discard connections
+    from a smaller pool, or otherwise a copy of it with a pool of its own
+    which does. The copy shares everything else with client, including its
+    access token, and client is left as it is.
+    """
+    prefix = client._instance_url('/')
+    adapter = client.session.get_adapter(prefix)
+    if getattr(adapter, '_pool_maxsize', 0) >= size:
+        return client
+    # Session.__getstate__ would drop the attributes of OAuth2Session
+    session = object.__new__(type(client.session))
+    session.__dict__.update(client.session.__dict__)
+    session.adapters = collections.OrderedDict(client.session.adapters)
+    session.mount(prefix, HTTPAdapter(pool_maxsize=size,
+                                      max_retries=adapter.max_retries))
+    client = copy.copy(client)
+    client.session = session
+    return client
+
+
+class ConcurrentSalesforceRestClient(object):
+
+    """
+    Wraps a REST client so that every one of its API methods is run on a
+    bounded thread pool and returns a concurrent.futures.Future instead of
+    blocking, e.g.:
+
+        client = ConcurrentSalesforceRestClient(SalesforceRestClient(...))
+        futures = [client.get('Account', i) for i in account_ids]
+
+    Requests go through the wrapped client's methods, so responses are
+    extracted and expired sessions refreshed exactly as they would be when
+    calling it directly. At most max_workers requests are in flight at once,
+    and submitting blocks once max_pending calls are waiting. If the client's
+    connection pool is smaller than max_workers, requests go through a copy
+    of it with a larger pool of its own.
+
+    Methods which return iterators, such as query_iter, fetch their results
+    as they are consumed, so they are called directly rather than on the
+    thread pool.
+    """
+    DEFAULT_MAX_WORKERS = 32
+    SYNCHRONOUS_METHODS = frozenset(['query_iter', 'query_all_iter'])
+
+    def __init__(self, client, max_workers=DEFAULT_MAX_WORKERS,
+                 max_pending=None):
+        self.client = size_connection_pool(client, max_workers)
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._pending = threading.BoundedSemaphore(max_pending or
+                                                   max_workers * 2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if (name.startswith('_') or not callable(attr) or
+                name in self.SYNCHRONOUS_METHODS or
+                inspect.isgeneratorfunction(attr)):
+            return attr
+
+        @functools.wraps(attr)
+        def submit(*args, **kwargs):
+            return self.submit(attr, *args, **kwargs)
+        return submit
+
+    def _release(self, future):
+        self._pending.release()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Schedules func(*args, **kwargs) on the thread pool and returns a
+        Future for its result, blocking while too many calls are pending.
+        """
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def map(self, method_name, arguments):
+        """
+        Calls the named client method once for every tuple of positional
+        arguments, concurrently, and yields the results in the same order.
+        """
+        func = getattr(self.client, method_name)
+        futures = [self.submit(func, *args) for args in arguments]
+        for future in futures:
+            yield future.result()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
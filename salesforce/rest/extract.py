@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, unicode_literals
+
+import datetime
+import logging
+import re
+import sys
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .executor import size_connection_pool
+from .replication import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# Top-level clauses which can't be split across partitions
+UNSUPPORTED_CLAUSES = ('ORDER BY', 'GROUP BY', 'HAVING', 'LIMIT', 'OFFSET',
+                       'WITH', 'FOR')
+SOQL_TOKEN_RE = re.compile(
+    r"'(?:[^'\\]|\\.)*'|[()]|\b(FROM|WHERE|ORDER\s+BY|GROUP\s+BY|HAVING|"
+    r"LIMIT|OFFSET|WITH|FOR)\b", re.IGNORECASE)
+
+# Salesforce IDs sort like base 62 numbers with these digits
+ID_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+ID_LENGTH = 15
+
+_DONE = object()
+
+
+class _Failure(object):
+
+    "The exception raised by a partition, with its traceback."
+    __slots__ = ('exc_info',)
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+def split_soql(soql):
+    """
+    Splits a query into its SELECT clause, object name and WHERE condition
+    (None without one). Raises ValueError for queries which can't be
+    partitioned.
+    """
+    depth = 0
+    clauses = {}
+    for match in SOQL_TOKEN_RE.finditer(soql):
+        token = match.group(0)
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif match.group(1) and depth == 0:
+            keyword = ' '.join(token.upper().split())
+            clauses.setdefault(keyword, match)
+
+    unsupported = [c for c in UNSUPPORTED_CLAUSES if c in clauses]
+    if unsupported or 'FROM' not in clauses:
+        raise ValueError('Cannot partition query: {0}'.format(soql))
+    select = soql[:clauses['FROM'].start()].strip()
+    where = clauses.get('WHERE')
+    if where is None:
+        return select, soql[clauses['FROM'].end():].strip(), None
+    return (select, soql[clauses['FROM'].end():where.start()].strip(),
+            soql[where.end():].strip())
+
+
+def _id_to_number(record_id):
+    number = 0
+    for digit in record_id[:ID_LENGTH]:
+        number = number * len(ID_DIGITS) + ID_DIGITS.index(digit)
+    return number
+
+
+def _number_to_id(number):
+    digits = []
+    for _ in range(ID_LENGTH):
+        number, digit = divmod(number, len(ID_DIGITS))
+        digits.append(ID_DIGITS[digit])
+    return ''.join(reversed(digits))
+
+
+def id_boundaries(first, last, partitions):
+    """
+    Returns the boundaries of at most the given number of equal ranges of IDs
+    covering first to last, inclusive, as 15 character IDs.
+    """
+    low = _id_to_number(first)
+    high = _id_to_number(last) + 1
+    numbers = sorted(set(low + (high - low) * i // partitions
+                         for i in range(partitions + 1)))
+    return [_number_to_id(n) for n in numbers]
+
+
+def date_boundaries(first, last, partitions):
+    """
+    Returns the boundaries of at most the given number of equal ranges of
+    whole seconds covering first to last, inclusive, or of whole days if they
+    are dates rather than datetimes.
+    """
+    if isinstance(first, datetime.datetime):
+        step = datetime.timedelta(seconds=1)
+        low = first.replace(microsecond=0)
+        high = last.replace(microsecond=0) + step
+    else:
+        step = datetime.timedelta(days=1)
+        low, high = first, last + step
+    steps = int((high - low).total_seconds() // step.total_seconds())
+    offsets = sorted(set(steps * i // partitions
+                         for i in range(partitions + 1)))
+    return [low + step * n for n in offsets]
+
+
+def _parse_date(value):
+    "Parses the value of a date or datetime field."
+    if len(value) == len('YYYY-MM-DD'):
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    return parse_datetime(value)
+
+
+def _soql_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return value.isoformat()
+
+
+class PartitionedQuery(object):
+
+    """
+    Runs a query as several queries over disjoint ranges of record IDs or of
+    a date or datetime field, concurrently, and merges their records into one
+    stream, e.g.:
+
+        extract = PartitionedQuery(client, max_workers=8)
+        for record in extract.by_id('SELECT Id, Name FROM Account', 32):
+            ...
+
+    The ranges are computed from the query's smallest and largest values and
+    are of equal size, so they hold similar numbers of records when values
+    are spread evenly. Records are yielded in no particular order, as soon
+    as any partition has fetched them; at most buffer_size of them are held
+    at once, and partitions stop fetching when the buffer is full.
+
+    Queries can have a WHERE condition but no ORDER BY, GROUP BY, LIMIT or
+    OFFSET clause.
+    """
+    DEFAULT_MAX_WORKERS = 8
+    DEFAULT_BUFFER_SIZE = 10000
+
+    def __init__(self, client, max_workers=DEFAULT_MAX_WORKERS,
+                 buffer_size=DEFAULT_BUFFER_SIZE, prefetch=True):
+        self.client = size_connection_pool(client, max_workers *
+                                           (2 if prefetch else 1))
+        self.max_workers = max_workers
+        self.buffer_size = buffer_size
+        self.prefetch = prefetch
+
+    def _bounds(self, soql, field, include_all):
+        "Returns the smallest and largest values of field, or None if empty."
+        select, object_name, where = split_soql(soql)
+        bounds = []
+        for direction in ('ASC', 'DESC'):
+            bound_soql = 'SELECT {0} FROM {1}{2} ORDER BY {0} {3} ' \
+                'NULLS LAST LIMIT 1'.format(
+                    field, object_name,
+                    ' WHERE {0}'.format(where) if where else '', direction)
+            records = self.client.query(bound_soql,
+                                        include_all=include_all)['records']
+            if not records or records[0][field] is None:
+                return None
+            bounds.append(records[0][field])
+        return bounds
+
+    def _partition(self, soql, field, boundaries, quote, nullable=False):
+        select, object_name, where = split_soql(soql)
+        conditions = ['{0} >= {1} AND {0} < {2}'.format(field, quote(low),
+                                                       quote(high))
+                      for low, high in zip(boundaries, boundaries[1:])]
+        if nullable:
+            # Records without a value are in none of the ranges
+            conditions.append('{0} = null'.format(field))
+        queries = []
+        for condition in conditions:
+            if where:
+                condition = '{0} AND ({1})'.format(condition, where)
+            queries.append('{0} FROM {1} WHERE {2}'.format(
+                select, object_name, condition))
+        return queries
+
+    def partition_by_id(self, soql, partitions, include_all=False):
+        "Splits a query into queries over disjoint ranges of record IDs."
+        bounds = self._bounds(soql, 'Id', include_all)
+        if bounds is None:
+            return []
+        return self._partition(soql, 'Id', id_boundaries(bounds[0], bounds[1],
+                                                         partitions),
+                               lambda value: "'{0}'".format(value))
+
+    def partition_by_date(self, soql, partitions, field='CreatedDate',
+                          include_all=False):
+        """
+        Splits a query into queries over disjoint ranges of a date or datetime
+        field, plus one for the records where it is null.
+        """
+        bounds = self._bounds(soql, field, include_all)
+        boundaries = [] if bounds is None else date_boundaries(
+            _parse_date(bounds[0]), _parse_date(bounds[1]), partitions)
+        return self._partition(soql, field, boundaries, _soql_date,
+                               nullable=True)
+
+    def by_id(self, soql, partitions, include_all=False):
+        "Yields the records of a query partitioned by record ID."
+        return self.run(self.partition_by_id(soql, partitions, include_all),
+                        include_all)
+
+    def by_date(self, soql, partitions, field='CreatedDate',
+                include_all=False):
+        "Yields the records of a query partitioned by a date or datetime."
+        return self.run(self.partition_by_date(soql, partitions, field,
+                                               include_all), include_all)
+
+    def _put(self, records, item, stopped):
+        "Waits for room in the buffer, unless the stream has been closed."
+        while not stopped.is_set():
+            try:
+                records.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _drain(self, soql, include_all, records, stopped):
+        try:
+            for record in self.client.query_iter(soql, include_all=include_all,
+                                                 prefetch=self.prefetch):
+                if not self._put(records, record, stopped):
+                    return
+        except Exception:
+            logger.debug('Partition failed: %s', soql)
+            self._put(records, _Failure(sys.exc_info()), stopped)
+        else:
+            self._put(records, _DONE, stopped)
+
+    def run(self, queries, include_all=False):
+        """
+        Runs queries concurrently and yields their records as they arrive. The
+        first error raised by any of them is raised once the records fetched
+        before it have been yielded, and the remaining queries are
+        abandoned.
+        """
+        if not queries:
+            return
+        records = queue.Queue(self.buffer_size)
+        stopped = threading.Event()
+        executor = ThreadPoolExecutor(self.max_workers)
+        try:
+            for soql in queries:
+                executor.submit(self._drain, soql, include_all, records,
+                                stopped)
+            remaining = len(queries)
+            while remaining:
+                record = records.get()
+                if record is _DONE:
+                    remaining -= 1
+                elif isinstance(record, _Failure):
+                    raise record.exc_info[0], record.exc_info[1], \
+                        record.exc_info[2]
+                else:
+                    yield record
+        finally:
+            stopped.set()
+            executor.shutdown(wait=False)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import re
+import threading
+import time
+
+from .exceptions import RequestLimitExceededException
+
+logger = logging.getLogger(__name__)
+
+LIMIT_INFO_HEADER = 'Sforce-Limit-Info'
+API_USAGE_RE = re.compile(r'api-usage=(\d+)/(\d+)')
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class RequestLimiter(object):
+
+    """
+    Throttles API requests to one organization so that they stay within its
+    daily request allocation. Share a single limiter between every client
+    that talks to the same organization.
+
+    The organization's usage is tracked from the Sforce-Limit-Info header of
+    every response, and from the limits resource every refresh_interval
+    seconds. If daily_budget is given, requests are also spread out with a
+    token bucket which refills at daily_budget requests per day and holds up
+    to burst requests.
+
+    Once no more than reserve requests are left in the allocation, or if a
+    request would have to wait longer than max_wait seconds (or at all, when
+    block is False), RequestLimitExceededException is raised instead.
+    """
+    DEFAULT_BURST = 10
+    DEFAULT_REFRESH_INTERVAL = 5 * 60
+
+    def __init__(self, daily_budget=None, reserve=0, burst=DEFAULT_BURST,
+                 block=True, max_wait=None,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.daily_budget = daily_budget
+        self.reserve = reserve
+        self.burst = burst
+        self.block = block
+        self.max_wait = max_wait
+        self.refresh_interval = refresh_interval
+
+        self.used = None
+        self.max = None
+        self._tokens = float(burst)
+        self._filled_at = time.time()
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        "Requests per second allowed by the budget, or None if unlimited."
+        if not self.daily_budget:
+            return None
+        return float(self.daily_budget) / SECONDS_PER_DAY
+
+    @property
+    def remaining(self):
+        if self.used is None or self.max is None:
+            return None
+        return self.max - self.used
+
+    def _exceeded(self, message):
+        return RequestLimitExceededException(None, 'REQUEST_LIMIT_EXCEEDED',
+                                             message)
+
+    def _wait_time(self):
+        remaining = self.remaining
+        if remaining is not None and remaining <= self.reserve:
+            raise self._exceeded(
+                'Only {0} of {1} daily API requests are left'.format(
+                    remaining, self.max))
+
+        rate = self.rate
+        if rate is None:
+            if self.used is not None:
+                self.used += 1
+            return 0
+
+        now = time.time()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._filled_at) * rate)
+        self._filled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            if self.used is not None:
+                self.used += 1
+            return 0
+        return (1 - self._tokens) / rate
+
+    def acquire(self):
+        """
+        Takes one request from the budget, blocking until one is available.
+        """
+        while True:
+            with self._lock:
+                wait = self._wait_time()
+            if not wait:
+                return
+            if not self.block or (self.max_wait is not None and
+                                  wait > self.max_wait):
+                raise self._exceeded(
+                    'API request budget exhausted, next request allowed in '
+                    '{0:.1f}s'.format(wait))
+            logger.debug('Throttling API request for %.1fs', wait)
+            time.sleep(wait)
+
+    def should_refresh(self):
+        """
+        Returns True if the caller should fetch the limits resource and pass
+        it to update_from_limits. Only one caller is told to per interval.
+        """
+        with self._lock:
+            now = time.time()
+            if (self._refreshed_at is not None and
+                    now - self._refreshed_at < self.refresh_interval):
+                return False
+            self._refreshed_at = now
+            return True
+
+    def update(self, used, maximum):
+        with self._lock:
+            self.used = used
+            self.max = maximum
+
+    def update_from_response(self, response):
+        "Updates usage from a response's Sforce-Limit-Info header, if any."
+        match = API_USAGE_RE.search(response.headers.get(LIMIT_INFO_HEADER,
+                                                         ''))
+        if match:
+            self.update(int(match.group(1)), int(match.group(2)))
+
+    def update_from_limits(self, limits):
+        "Updates usage from the response of the limits resource."
+        daily = limits.get('DailyApiRequests')
+        if daily:
+            self.update(daily['Max'] - daily['Remaining'], daily['Max'])
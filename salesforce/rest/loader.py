@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import threading
+
+from concurrent.futures import Future
+
+from .exceptions import NotFoundException
+from .v29 import ID_RE
+
+logger = logging.getLogger(__name__)
+
+
+class RecordLoader(object):
+
+    """
+    Collects the records requested within a short delay of each other and
+    retrieves them with a single get_many call per object and list of
+    fields, e.g.:
+
+        with RecordLoader(client) as loader:
+            futures = [loader.load('Account', i) for i in account_ids]
+        accounts = [f.result() for f in futures]
+
+    load returns a concurrent.futures.Future which is resolved with the
+    record, or with a NotFoundException if it doesn't exist, once its batch
+    has been retrieved. A batch is sent delay seconds after its first
+    request, or as soon as it holds max_batch_size IDs.
+    """
+    DEFAULT_DELAY = 0.005
+    DEFAULT_MAX_BATCH_SIZE = 2000
+
+    def __init__(self, client, delay=DEFAULT_DELAY,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        self.client = client
+        self.delay = delay
+        self.max_batch_size = max_batch_size
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def load(self, object_name, object_id, fields=None):
+        """
+        Requests a record based on the specified object_id, optionally with
+        only the fields specified, and returns a Future for it. The Future of
+        a malformed ID fails with a ValueError right away, without affecting
+        the rest of its batch.
+        """
+        key = (object_name, tuple(fields) if fields else None)
+        future = Future()
+        if not ID_RE.match(object_id):
+            future.set_exception(ValueError('Invalid ID: {0}'.format(
+                object_id)))
+            return future
+        with self._lock:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = {}
+                timer = threading.Timer(self.delay, self._send, (key, batch))
+                timer.daemon = True
+                timer.start()
+            batch.setdefault(object_id, []).append(future)
+            full = len(batch) >= self.max_batch_size
+        if full:
+            self._send(key, batch)
+        return future
+
+    def get(self, object_name, object_id, fields=None):
+        "Retrieves a record along with any others requested meanwhile."
+        return self.load(object_name, object_id, fields).result()
+
+    def flush(self):
+        "Sends every batch still waiting for its delay right away."
+        with self._lock:
+            batches = list(self._batches.items())
+        for key, batch in batches:
+            self._send(key, batch)
+
+    def _send(self, key, batch):
+        with self._lock:
+            # The batch may have been sent already, by flush or because it
+            # was full before its timer went off.
+            if self._batches.get(key) is not batch:
+                return
+            del self._batches[key]
+
+        object_name, fields = key
+        try:
+            records = self.client.get_many(object_name, list(batch), fields)
+        except Exception as e:
+            logger.debug('Failed to load %d %s records', len(batch),
+                         object_name)
+            for futures in batch.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+
+        for object_id, futures in batch.items():
+            record = records.get(object_id)
+            for future in futures:
+                if record is None:
+                    future.set_exception(NotFoundException(
+                        404, 'NOT_FOUND', 'The requested resource does not '
+                        'exist'))
+                else:
+                    future.set_result(record)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import threading
+
+
+class _Missing(object):
+
+    """
+    Marks the fields a record doesn't have, e.g. when the schema grew after
+    it was packed. Copies and unpickled instances are the same singleton.
+    """
+
+    def __repr__(self):
+        return '<missing>'
+
+    def __reduce__(self):
+        return str('_MISSING')
+
+
+_MISSING = _Missing()
+
+
+class RecordSchema(object):
+
+    """
+    The field names shared by the records of a query, each with its position
+    in the records' tuples of values. Fields are added as records which have
+    them are packed, so a schema can be built from the records themselves.
+
+    Records don't keep their attributes (type and URL) unless
+    keep_attributes is True, in which case attributes is one more field.
+
+    A schema can be shared by several queries, including concurrent ones:
+    fields are only ever appended, under a lock.
+    """
+
+    def __init__(self, keep_attributes=False):
+        self.keep_attributes = keep_attributes
+        self.fields = []
+        self.positions = {}
+        # Schemas of the related records nested in these ones, by field
+        self.relationships = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'RecordSchema({0!r})'.format(self.fields)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _position(self, name):
+        position = self.positions.get(name)
+        if position is None:
+            with self._lock:
+                position = self.positions.get(name)
+                if position is None:
+                    # Readers look positions up without the lock, so the
+                    # field is listed before its position is published
+                    self.fields.append(name)
+                    position = self.positions[name] = len(self.fields) - 1
+        return position
+
+    def _relationship(self, name):
+        schema = self.relationships.get(name)
+        if schema is None:
+            with self._lock:
+                schema = self.relationships.get(name)
+                if schema is None:
+                    schema = self.relationships[name] = RecordSchema(
+                        self.keep_attributes)
+        return schema
+
+    def _pack(self, data):
+        values = [_MISSING] * len(self.fields)
+        for name, value in data.items():
+            if name == 'attributes' and not self.keep_attributes:
+                continue
+            if isinstance(value, dict) and 'attributes' in value:
+                # Related records stay packed until they are accessed
+                value = self._relationship(name)._pack(value)
+            elif isinstance(value, dict) and 'records' in value:
+                # Results of a subquery on a child relationship
+                schema = self._relationship(name)
+                value = dict(value, records=[schema.record(record)
+                                             for record in value['records']])
+            position = self._position(name)
+            if position >= len(values):
+                values.extend([_MISSING] * (position + 1 - len(values)))
+            values[position] = value
+        return tuple(values)
+
+    def record(self, data):
+        "Converts a record dictionary, as returned by the API, to a Record."
+        return Record(self, self._pack(data))
+
+
+class Record(object):
+
+    """
+    A read-only mapping of a record's fields to their values, which takes a
+    fraction of the memory of a dictionary: field names are kept once by the
+    RecordSchema shared with other records, and values in a tuple. Related
+    records are Records too, created whenever they are accessed.
+    """
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, schema, values):
+        self._schema = schema
+        self._values = values
+
+    def __getitem__(self, name):
+        position = self._schema.positions.get(name)
+        if position is None or position >= len(self._values):
+            raise KeyError(name)
+        value = self._values[position]
+        if value is _MISSING:
+            raise KeyError(name)
+        # Values parsed from JSON are never tuples
+        if type(value) is tuple:
+            return Record(self._schema.relationships[name], value)
+        return value
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for name, value in zip(self._schema.fields, self._values):
+            if value is not _MISSING:
+                yield name
+
+    def __len__(self):
+        return sum(1 for value in self._values if value is not _MISSING)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[name] for name in self]
+
+    def items(self):
+        return [(name, self[name]) for name in self]
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.Mapping):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return Record, (self._schema, self._values)
+
+    def __repr__(self):
+        return 'Record({0!r})'.format(self.to_dict())
+
+    def to_dict(self):
+        "Returns the record as a dictionary, e.g. to serialize it."
+        return dict((name, _to_dict(value)) for name, value in self.items())
+
+
+def _to_dict(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, dict) and 'records' in value:
+        return dict(value, records=[_to_dict(record)
+                                    for record in value['records']])
+    return value
+
+
+collections.Mapping.register(Record)
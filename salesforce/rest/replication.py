@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import datetime
+import logging
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+import pytz
+
+from .. import codec
+from .exceptions import InvalidCallException
+
+logger = logging.getLogger(__name__)
+
+# A record was created or updated, record is its current data
+Upsert = namedtuple('Upsert', ['object_name', 'id', 'record'])
+# A record was deleted
+Delete = namedtuple('Delete', ['object_name', 'id', 'deleted_date'])
+
+# get_updated and get_deleted only cover the last 30 days, at the minute
+MAX_WINDOW = datetime.timedelta(days=30)
+MIN_WINDOW = datetime.timedelta(minutes=1)
+DEFAULT_WINDOW = datetime.timedelta(days=1)
+# Error code of windows with more than 600,000 changed records
+EXCEEDED_ID_LIMIT = 'EXCEEDED_ID_LIMIT'
+# Number of changed records fetched and held in memory at once
+DEFAULT_CHUNK_SIZE = 2000
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def parse_datetime(value):
+    "Parses a datetime such as 2014-06-04T23:54:00.000+0000 as UTC."
+    parsed = datetime.datetime.strptime(value[:19], DATETIME_FORMAT)
+    offset = value[19:].lstrip('.0123456789').replace(':', '')
+    if offset and offset not in ('Z', '+0000'):
+        sign = -1 if offset[0] == '-' else 1
+        parsed -= sign * datetime.timedelta(hours=int(offset[1:3]),
+                                            minutes=int(offset[3:5]))
+    return parsed.replace(tzinfo=pytz.utc)
+
+
+def _format(value):
+    return value.astimezone(pytz.utc).strftime(DATETIME_FORMAT) + 'Z'
+
+
+def _minute(value):
+    return value.replace(second=0, microsecond=0)
+
+
+class StaleHighWaterMarkException(Exception):
+
+    """
+    Raised when an object's high-water mark is older than the changes
+    Salesforce keeps track of, so that changes may have been missed and the
+    object needs a full resync.
+    """
+
+    def __init__(self, object_name, mark):
+        self.object_name = object_name
+        self.mark = mark
+        super(StaleHighWaterMarkException, self).__init__(
+            'The high-water mark of {0} ({1}) is more than {2} days old'
+            .format(object_name, _format(mark), MAX_WINDOW.days))
+
+
+class HighWaterMarks(object):
+
+    """
+    In-memory high-water marks: for each object, the time up to which its
+    changes have been replicated.
+    """
+
+    def __init__(self, marks=None):
+        self._marks = dict(marks or {})
+        self._lock = threading.Lock()
+
+    def get(self, object_name):
+        with self._lock:
+            return self._marks.get(object_name)
+
+    def set(self, object_name, mark):
+        with self._lock:
+            self._marks[object_name] = mark
+
+    def items(self):
+        with self._lock:
+            return sorted(self._marks.items())
+
+
+class FileHighWaterMarks(HighWaterMarks):
+
+    "High-water marks which are also saved to a JSON file on every change."
+
+    def __init__(self, path):
+        marks = {}
+        try:
+            with open(path, 'rb') as f:
+                data = codec.get_codec().loads(f.read())
+        except (IOError, OSError):
+            pass
+        else:
+            marks = dict((name, parse_datetime(value))
+                         for name, value in data.items())
+        super(FileHighWaterMarks, self).__init__(marks)
+        self.path = path
+
+    def set(self, object_name, mark):
+        super(FileHighWaterMarks, self).set(object_name, mark)
+        data = dict((name, _format(value)) for name, value in self.items())
+        # Write to a temporary file first so that a crash never leaves a
+        # partially written file behind.
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.path)))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(codec.get_codec().dumps(data))
+        os.rename(temp_path, self.path)
+
+
+class Replicator(object):
+
+    """
+    Replicates the changes made to objects since their high-water marks as a
+    stream of Upsert and Delete events, e.g.:
+
+        replicator = Replicator(client, FileHighWaterMarks('marks.json'))
+        for event in replicator.replicate(['Account', 'Contact']):
+            ...
+
+    Changes are found with get_updated and get_deleted, one window of at most
+    window at a time. Windows with more changed records than Salesforce
+    returns at once are split in half until they fit. The records that
+    changed are then fetched with get_many, chunk_size at a time.
+
+    An object's high-water mark is only moved once all the events of a
+    window have been consumed, and never past the latestDateCovered of
+    either response, so stopping the stream early replays events rather than
+    losing them. Objects without a mark start from as far back as
+    Salesforce allows.
+
+    fields is a dictionary of the fields to fetch for each object name. All
+    of an object's fields are fetched when it has no entry.
+    """
+
+    def __init__(self, client, marks=None, fields=None,
+                 window=DEFAULT_WINDOW, chunk_size=DEFAULT_CHUNK_SIZE):
+        if not MIN_WINDOW <= window <= MAX_WINDOW:
+            raise ValueError('window must be between 1 minute and 30 days')
+        self.client = client
+        self.marks = marks if marks is not None else HighWaterMarks()
+        self.fields = dict(fields or {})
+        self.window = window
+        self.chunk_size = chunk_size
+
+    def _now(self):
+        return datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
+
+    def _changes(self, method, key, object_name, start, end):
+        """
+        Calls get_updated or get_deleted for a window and returns a 2-tuple
+        of the changes listed under key and the time they are covered up to,
+        splitting the window if it has too many changes.
+        """
+        try:
+            response = method(object_name, start, end)
+        except InvalidCallException as e:
+            if e.error_code != EXCEEDED_ID_LIMIT or end - start <= MIN_WINDOW:
+                raise
+            middle = _minute(start + (end - start) // 2)
+            logger.debug('Splitting %s window %s - %s', object_name,
+                         _format(start), _format(end))
+            first, first_covered = self._changes(method, key, object_name,
+                                                 start, middle)
+            second, second_covered = self._changes(method, key, object_name,
+                                                   middle, end)
+            if first_covered < middle:
+                return first + second, first_covered
+            return first + second, second_covered
+
+        covered = min(end, parse_datetime(response['latestDateCovered']))
+        earliest = response.get('earliestDateAvailable')
+        if earliest and parse_datetime(earliest) > start:
+            logger.warning('Deleted %s records are only available since %s, '
+                           'some deletions may have been missed', object_name,
+                           earliest)
+        return response[key], covered
+
+    def fetch(self, object_name, ids):
+        "Yields the current data of the records with the given IDs."
+        fields = self.fields.get(object_name)
+        for i in range(0, len(ids), self.chunk_size):
+            chunk = ids[i:i + self.chunk_size]
+            records = self.client.get_many(object_name, chunk, fields)
+            for record_id in chunk:
+                if record_id in records:
+                    yield records[record_id]
+
+    def changes(self, object_name, end=None):
+        """
+        Yields the Upsert and Delete events of the changes made to an object
+        since its high-water mark and up to end (by default, now), moving the
+        mark along.
+        """
+        now = self._now()
+        end = _minute(min(end or now, now))
+        start = self.marks.get(object_name)
+        if start is None:
+            start = _minute(now - MAX_WINDOW) + MIN_WINDOW
+        elif start < now - MAX_WINDOW:
+            raise StaleHighWaterMarkException(object_name, start)
+
+        while start < end:
+            window_end = min(start + self.window, end)
+            updated_ids, updated_covered = self._changes(
+                self.client.get_updated, 'ids', object_name, start,
+                window_end)
+            deleted, deleted_covered = self._changes(
+                self.client.get_deleted, 'deletedRecords', object_name, start,
+                window_end)
+            covered = min(updated_covered, deleted_covered)
+
+            # A record updated and then deleted isn't returned by the query,
+            # and its Delete comes last either way.
+            updated_ids = sorted(set(updated_ids))
+            logger.info('Replicating %d updated and %d deleted %s records',
+                        len(updated_ids), len(deleted), object_name)
+            for record in self.fetch(object_name, updated_ids):
+                yield Upsert(object_name, record['Id'], record)
+            for deleted_record in deleted:
+                yield Delete(object_name, deleted_record['id'],
+                             parse_datetime(deleted_record['deletedDate']))
+
+            if covered > start:
+                self.marks.set(object_name, covered)
+            if covered < window_end:
+                # Salesforce hasn't caught up with later changes yet
+                break
+            start = covered
+
+    def replicate(self, object_names, end=None):
+        "Yields the events of the changes made to each object in turn."
+        for object_name in object_names:
+            for event in self.changes(object_name, end=end):
+                yield event
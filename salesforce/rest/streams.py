@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+# cElementTree only accepts native strings as event names
+EVENTS = (str('start'), str('end'))
+
+
+def iter_records(fileobj, page):
+    """
+    Parses an XML query result from a file-like object as it is read, and
+    yields each of its records elements as soon as it is complete. The text
+    of the result's other elements (done, totalSize and nextRecordsUrl) is
+    stored in page as they are parsed.
+
+    Elements are dropped from the tree once they have been yielded, so only
+    the record being parsed is held in memory. Text is parsed straight from
+    the bytes of the document, in its declared encoding.
+    """
+    root = None
+    depth = 0
+    for event, element in ElementTree.iterparse(fileobj, events=EVENTS):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth != 1:
+            continue
+        if element.tag == 'records':
+            yield element
+        else:
+            page[element.tag] = element.text
+        root.remove(element)
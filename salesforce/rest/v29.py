@@ -2,12 +2,70 @@
 from __future__ import absolute_import, unicode_literals
 
 import logging
-import anyjson as json
+import re
+import sys
+import threading
+import urllib
 
 from .base import auth_required, SalesforceRestClientBase
+from .batch import SalesforceBatch
+from .records import RecordSchema
+from . import streams
 
 logger = logging.getLogger(__name__)
 
+ID_RE = re.compile(r'^[a-zA-Z0-9]{15}(?:[a-zA-Z0-9]{3})?\Z')
+# Compound fields, which can't be queried before API version 30.0
+COMPOUND_FIELD_TYPES = frozenset(['address', 'location'])
+
+
+class _Prefetch(threading.Thread):
+
+    """
+    Calls a function on a background thread so that its result is ready by the
+    time the caller asks for it.
+    """
+
+    def __init__(self, func, *args):
+        super(_Prefetch, self).__init__()
+        self.daemon = True
+        self._func = func
+        self._args = args
+        self._result = None
+        self._exc_info = None
+        self._cleanup = None
+        self._lock = threading.Lock()
+        self.start()
+
+    def run(self):
+        try:
+            result = self._func(*self._args)
+        except Exception:
+            self._exc_info = sys.exc_info()
+            return
+        with self._lock:
+            self._result = result
+            cleanup = self._cleanup
+        if cleanup is not None:
+            cleanup(result)
+
+    def result(self):
+        self.join()
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def discard(self, cleanup):
+        """
+        Calls cleanup(result) as soon as the result is ready, without waiting
+        for it, since nobody will ask for it.
+        """
+        with self._lock:
+            self._cleanup = cleanup
+            result = self._result
+        if result is not None:
+            cleanup(result)
+
 
 class SalesforceRestClient(SalesforceRestClientBase):
 
@@ -16,6 +74,10 @@ class SalesforceRestClient(SalesforceRestClientBase):
     """
     version = '29.0'
 
+    # Longest request URI and SOQL statement Salesforce accepts
+    MAX_URL_LENGTH = 16384
+    MAX_SOQL_LENGTH = 100000
+
     ### Organization attributes ####
 
     @auth_required
@@ -39,7 +101,7 @@ class SalesforceRestClient(SalesforceRestClientBase):
         Lists the available objects and their metadata for your organization's
         data.
         """
-        return self.call('sobjects')
+        return self._describe('sobjects')
 
     @auth_required
     def object(self, object_name, full_description=False):
@@ -51,7 +113,7 @@ class SalesforceRestClient(SalesforceRestClientBase):
         path = 'sobjects/{0}'.format(object_name)
         if full_description:
             path += '/describe'
-        obj = self.call(path)
+        obj = self._describe(path)
         if not full_description:
             obj = obj['objectDescribe']
         return obj
@@ -98,14 +160,83 @@ class SalesforceRestClient(SalesforceRestClientBase):
     #### Basic CRUD ####
 
     @auth_required
-    def get(self, object_name, object_id, fields=None):
+    def get(self, object_name, object_id, fields=None, compact=False):
         """
         Retrieves a record based on the specified object_id. Optionally returns
-        only the fields specified.
+        only the fields specified. If compact is True, or a RecordSchema, the
+        record is returned as a Record (see salesforce.rest.records).
         """
+        schema = self._record_schema(compact)
         params = {'fields': ','.join(fields)} if fields else None
-        return self.call('sobjects/{0}/{1}'.format(object_name, object_id),
-                         params=params)
+        record = self.call('sobjects/{0}/{1}'.format(object_name, object_id),
+                           params=params)
+        return schema.record(record) if schema is not None else record
+
+    @auth_required
+    def get_many(self, object_name, object_ids, fields=None):
+        """
+        Retrieves the records with the specified object_ids, in as few
+        queries as the URL and SOQL length limits allow, and returns them in a
+        dictionary keyed by those IDs. IDs of records that don't exist are
+        left out. Optionally returns only the fields specified, otherwise all
+        of the object's queryable fields, which are described once per client.
+        """
+        # Records come back with 18 character IDs, which start with the 15
+        # character ones.
+        requested = {}
+        for object_id in object_ids:
+            if not ID_RE.match(object_id):
+                raise ValueError('Invalid ID: {0}'.format(object_id))
+            requested.setdefault(object_id[:15], set()).add(object_id)
+        if not requested:
+            return {}
+
+        fields = list(fields or self._queryable_fields(object_name))
+        if 'id' not in [field.lower() for field in fields]:
+            fields.insert(0, 'Id')
+
+        select = 'SELECT {0} FROM {1} WHERE Id IN ('.format(', '.join(fields),
+                                                            object_name)
+        records = {}
+        object_ids = sorted(set().union(*requested.values()))
+        for chunk in self._id_chunks(select, object_ids):
+            soql = '{0}{1})'.format(select, ', '.join(
+                "'{0}'".format(object_id) for object_id in chunk))
+            for record in self.query_iter(soql):
+                for object_id in requested.get(record['Id'][:15], ()):
+                    records[object_id] = record
+        return records
+
+    def _queryable_fields(self, object_name):
+        fields = self._queryable_fields_cache.get(object_name)
+        if fields is None:
+            description = self.object(object_name, full_description=True)
+            fields = self._queryable_fields_cache[object_name] = [
+                field['name'] for field in description['fields']
+                if field['type'] not in COMPOUND_FIELD_TYPES]
+        return fields
+
+    def _id_chunks(self, select, object_ids):
+        """
+        Splits IDs into chunks small enough for the query URL and SOQL
+        statement listing them to stay within Salesforce's limits.
+        """
+        base_url_length = len(self._url('query', params={'q': select + ')'}))
+        chunk = []
+        url_length, soql_length = base_url_length, len(select) + 1
+        for object_id in object_ids:
+            literal = "'{0}', ".format(object_id)
+            encoded_length = len(urllib.quote_plus(literal))
+            if chunk and (url_length + encoded_length > self.MAX_URL_LENGTH or
+                          soql_length + len(literal) > self.MAX_SOQL_LENGTH):
+                yield chunk
+                chunk = []
+                url_length, soql_length = base_url_length, len(select) + 1
+            chunk.append(object_id)
+            url_length += encoded_length
+            soql_length += len(literal)
+        if chunk:
+            yield chunk
 
     @auth_required
     def get_blob(self, object_name, object_id, blob_field):
@@ -121,7 +252,7 @@ class SalesforceRestClient(SalesforceRestClientBase):
     @auth_required
     def create(self, object_name, data):
         "Creates a new record of the specified type given a dictionary of data."
-        body = json.dumps(data)
+        body = self.json_codec.dumps(data)
         headers = {'Content-Type': 'application/json'}
         return self.call('sobjects/{0}'.format(object_name), method='post',
                          headers=headers, body=body)
@@ -132,11 +263,19 @@ class SalesforceRestClient(SalesforceRestClientBase):
         Updates a record based on the specified object_id with a dictionary of
         data.
         """
-        body = json.dumps(data)
+        body = self.json_codec.dumps(data)
         headers = {'Content-Type': 'application/json'}
         return self.call('sobjects/{0}/{1}'.format(object_name, object_id),
                          method='patch', headers=headers, body=body)
 
+    def batch(self, all_or_none=False):
+        """
+        Returns a SalesforceBatch which collects create, update, delete and
+        upsert_external operations and sends them in chunks. Used as a context
+        manager, the batch is executed on exit.
+        """
+        return SalesforceBatch(self, all_or_none=all_or_none)
+
     #### External ID CRUD ####
 
     @auth_required
@@ -172,7 +311,7 @@ class SalesforceRestClient(SalesforceRestClientBase):
         * If the value is not unique, the REST API returns a 300 response with
           the list of matching records.
         """
-        body = json.dumps(data)
+        body = self.json_codec.dumps(data)
         headers = {'Content-Type': 'application/json'}
         path = 'sobjects/{0}/{1}/{2}'.format(object_name, external_id_field,
                                              external_id)
@@ -253,7 +392,7 @@ class SalesforceRestClient(SalesforceRestClientBase):
             raise ValueError('user_id must be given or set on the instance')
 
         path = 'sobjects/User/{0}/password'.format(user_id)
-        body = json.dumps({'NewPassword': password})
+        body = self.json_codec.dumps({'NewPassword': password})
         headers = {'Content-Type': 'application/json'}
         return self.call(path, method='post', headers=headers, body=body)
 
@@ -290,13 +429,109 @@ class SalesforceRestClient(SalesforceRestClientBase):
     #### Queries ####
 
     @auth_required
-    def query(self, soql, include_all=False):
+    def query(self, soql, include_all=False, compact=False):
         """
         Executes the specified SOQL query. If include_all is True, results can
-        include deleted, merged and archived records.
+        include deleted, merged and archived records. If compact is True, or a
+        RecordSchema, records are returned as Records sharing one schema.
+        """
+        schema = self._record_schema(compact)
+        path = 'queryAll' if include_all else 'query'
+        result = self.call(path, params={'q': soql})
+        if schema is not None:
+            result['records'] = [schema.record(record)
+                                 for record in result['records']]
+        return result
+
+    @auth_required
+    def query_iter(self, soql, include_all=False, prefetch=False,
+                   compact=False):
+        """
+        Executes the specified SOQL query and yields its records one at a time,
+        lazily following nextRecordsUrl to fetch each subsequent batch. If
+        prefetch is True, the next batch is fetched on a background thread
+        while the current one is being consumed. If compact is True, or a
+        RecordSchema, records are yielded as Records sharing one schema.
+
+        With the XML response format, each batch is parsed incrementally as it
+        is downloaded, and each records element is yielded as soon as it has
+        been parsed.
         """
+        schema = self._record_schema(compact)
         path = 'queryAll' if include_all else 'query'
-        return self.call(path, params={'q': soql})
+        url = self._url(path, params={'q': soql})
+        if self.response_format == SalesforceRestClientBase.RESPONSE_FORMAT_XML:
+            return self._query_iter_xml(url, prefetch)
+        records = self._query_iter(url, prefetch)
+        if schema is not None:
+            return (schema.record(record) for record in records)
+        return records
+
+    def _record_schema(self, compact):
+        "Returns the RecordSchema records are packed with, if any."
+        if not compact:
+            return None
+        if self.response_format != SalesforceRestClientBase.RESPONSE_FORMAT_JSON:
+            raise ValueError('Compact records need the JSON response format')
+        return compact if isinstance(compact, RecordSchema) else RecordSchema()
+
+    def _query_iter(self, url, prefetch):
+        page = self._call(url)
+        while True:
+            next_url = page.get('nextRecordsUrl')
+            pending = None
+            if next_url and prefetch:
+                pending = _Prefetch(self._call, self._instance_url(next_url))
+
+            for record in page['records']:
+                yield record
+
+            if not next_url:
+                break
+            if pending is not None:
+                page = pending.result()
+            else:
+                page = self._call(self._instance_url(next_url))
+
+    def _query_iter_xml(self, url, prefetch):
+        response = self._open(url)
+        while True:
+            page = {}
+            pending = None
+            try:
+                for record in streams.iter_records(response.raw, page):
+                    # nextRecordsUrl precedes the records, so the next batch
+                    # can be requested while this one is still being read
+                    if (prefetch and pending is None and
+                            page.get('nextRecordsUrl')):
+                        pending = _Prefetch(
+                            self._open,
+                            self._instance_url(page['nextRecordsUrl']))
+                    yield record
+            except BaseException:
+                # Including GeneratorExit when the iterator is dropped: the
+                # next page's response won't be read, so it must be closed
+                if pending is not None:
+                    pending.discard(lambda r: r.close())
+                raise
+            finally:
+                response.close()
+
+            next_url = page.get('nextRecordsUrl')
+            if not next_url:
+                break
+            if pending is not None:
+                response = pending.result()
+            else:
+                response = self._open(self._instance_url(next_url))
+
+    def query_all_iter(self, soql, prefetch=False, compact=False):
+        """
+        Same as query_iter, but results can include deleted, merged and archived
+        records.
+        """
+        return self.query_iter(soql, include_all=True, prefetch=prefetch,
+                               compact=compact)
 
     #### Search ####
 
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+CANNOT_CREATE = 'Cannot create this field'
+CANNOT_UPDATE = 'Cannot update this field'
+BAD_PICKLIST_VALUE = 'Bad value for restricted picklist field'
+REQUIRED = 'This field is required'
+NOT_FOUND = 'Field name not found'
+
+
+class CompiledValidator(object):
+
+    """
+    Validates object data against an object's full description. Everything
+    that depends only on the description (field names, read-only fields,
+    restricted picklist values and required fields) is computed once, so
+    validating each record only looks at the fields it actually contains.
+    Validation rules are the same as SalesforceRestClientBase.validate_field.
+    """
+
+    def __init__(self, object_description):
+        fields = object_description['fields']
+        self.field_names = frozenset(f['name'] for f in fields)
+        self.not_createable = frozenset(f['name'] for f in fields
+                                        if not f['createable'])
+        self.not_updateable = frozenset(f['name'] for f in fields
+                                        if not f['updateable'])
+        self.picklists = {
+            f['name']: frozenset(i['value'] for i in f['picklistValues']
+                                 if i['active'])
+            for f in fields if f.get('restrictedPicklist')
+        }
+        self.required = frozenset(
+            f['name'] for f in fields
+            if (not f['nillable'] and not f['defaultedOnCreate'] and
+                f['type'] != 'boolean')
+        )
+
+    def validate(self, data, new_record=True):
+        """
+        Validates a dictionary of object data. Returns a 2-tuple (is_valid,
+        errors) where errors is a dictionary keyed by field name.
+        """
+        errors = {}
+        if new_record:
+            read_only, read_only_error = self.not_createable, CANNOT_CREATE
+        else:
+            read_only, read_only_error = self.not_updateable, CANNOT_UPDATE
+
+        for field_name, value in data.items():
+            if field_name not in self.field_names:
+                errors[field_name] = [NOT_FOUND]
+                continue
+            if value is None:
+                continue
+
+            field_errors = []
+            if field_name in read_only:
+                field_errors.append(read_only_error)
+            values = self.picklists.get(field_name)
+            if values is not None:
+                try:
+                    valid = value in values
+                except TypeError:
+                    # Unhashable values can't be picklist values
+                    valid = False
+                if not valid:
+                    field_errors.append(BAD_PICKLIST_VALUE)
+            if field_errors:
+                errors[field_name] = field_errors
+
+        if new_record:
+            for field_name in self.required:
+                if data.get(field_name) is None:
+                    errors[field_name] = [REQUIRED]
+        return not errors, errors
+
+    def validate_many(self, records, new_record=True):
+        """
+        Validates each dictionary of object data in records, returning a list
+        of (is_valid, errors) 2-tuples in the same order.
+        """
+        validate = self.validate
+        return [validate(data, new_record=new_record) for data in records]
+
+
+def compile_validator(object_description):
+    "Returns a CompiledValidator for an object's full description dictionary."
+    return CompiledValidator(object_description)
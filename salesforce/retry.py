@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import random
+import time
+
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy(object):
+
+    """
+    Decides which failed requests to retry and how long to wait before each
+    attempt, using exponential backoff with full jitter. It is used by both
+    the REST clients and the SOAP transport.
+
+    Connection errors, timeouts, 5xx responses and the error codes in
+    retryable_error_codes are retryable. Requests with a method outside
+    idempotent_methods (e.g. the POST of a REST create, or any SOAP call) are
+    only retried when the failure shows that Salesforce did not process them:
+    connect timeouts, responses with a status code in unprocessed_status_codes
+    (503 by default) and the error codes in unprocessed_error_codes.
+
+    REST clients apply the policy to every request they send, including the
+    streamed pages of queries, Bulk API results and the revalidation of
+    cached descriptions. The SOAP transport applies it to every POST it
+    sends. Requests resent with a refreshed access token don't count as
+    attempts.
+    """
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'PATCH',
+                                    'DELETE'])
+    RETRYABLE_STATUS_CODES = frozenset([500, 502, 503, 504])
+    RETRYABLE_ERROR_CODES = frozenset(['UNABLE_TO_LOCK_ROW',
+                                       'SERVER_UNAVAILABLE'])
+    UNPROCESSED_STATUS_CODES = frozenset([503])
+    UNPROCESSED_ERROR_CODES = frozenset(['UNABLE_TO_LOCK_ROW'])
+
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30,
+                 idempotent_methods=IDEMPOTENT_METHODS,
+                 retryable_status_codes=RETRYABLE_STATUS_CODES,
+                 retryable_error_codes=RETRYABLE_ERROR_CODES,
+                 unprocessed_status_codes=UNPROCESSED_STATUS_CODES,
+                 unprocessed_error_codes=UNPROCESSED_ERROR_CODES):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.idempotent_methods = frozenset(m.upper()
+                                            for m in idempotent_methods)
+        self.retryable_status_codes = frozenset(retryable_status_codes)
+        self.retryable_error_codes = frozenset(retryable_error_codes)
+        self.unprocessed_status_codes = frozenset(unprocessed_status_codes)
+        self.unprocessed_error_codes = frozenset(unprocessed_error_codes)
+
+    def is_retryable(self, method, status_code=None, error_code=None,
+                     exception=None):
+        """
+        Returns True if a request made with method which failed with the given
+        status code, error code or requests exception may be sent again.
+        """
+        if exception is not None:
+            retryable = isinstance(exception, (ConnectionError, Timeout))
+            unprocessed = isinstance(exception, ConnectTimeout)
+        else:
+            retryable = (status_code in self.retryable_status_codes or
+                         error_code in self.retryable_error_codes)
+            unprocessed = (status_code in self.unprocessed_status_codes or
+                           error_code in self.unprocessed_error_codes)
+
+        if not retryable:
+            return False
+        return unprocessed or method.upper() in self.idempotent_methods
+
+    def should_retry(self, attempt, method, **kwargs):
+        """
+        Returns True if the given attempt (counting from 1) failed in a way
+        that is retryable and there are attempts left.
+        """
+        return (attempt < self.max_attempts and
+                self.is_retryable(method, **kwargs))
+
+    def delay(self, attempt):
+        "Returns a random delay for the attempt that follows the given one."
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    def sleep(self, attempt):
+        delay = self.delay(attempt)
+        logger.debug('Retrying after attempt %d in %.2fs', attempt, delay)
+        time.sleep(delay)
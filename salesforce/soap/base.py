@@ -14,15 +14,22 @@ except ImportError:
     logger.error("The metadata API requires suds-jurko >= 0.6")
     exit()
 
-from requests import Session
+from requests import RequestException, Session
 from requests.adapters import BaseAdapter
 from requests.auth import HTTPBasicAuth
 from requests.models import Response
 from suds import WebFault
-from suds.client import Client
+from suds.client import SoapClient
+from suds.options import Options
 from suds.plugin import MessagePlugin
 from suds.properties import Unskin
-from suds.transport import Transport, TransportError, Reply
+from suds.sax.element import Element
+from suds.transport import Request, Transport, TransportError, Reply
+
+from ..instrumentation import Instrumentation, soap_operation
+from .cache import clone_client, shared_client
+from .results import to_records
+from .streams import build_reply, iter_reply
 
 
 class FileAdapter(BaseAdapter):
@@ -50,14 +57,17 @@ class FileAdapter(BaseAdapter):
 
 class RequestsHttpTransport(Transport):
 
-    def __init__(self, session=None, **kwargs):
+    def __init__(self, session=None, retry_policy=None, instrumentation=None,
+                 **kwargs):
         Transport.__init__(self)
         Unskin(self.options).update(kwargs)
         self.session = session or Session()
+        self.retry_policy = retry_policy
+        self.instrumentation = instrumentation or Instrumentation()
         # Suds expects support for local files URIs.
         self.session.mount('file://', FileAdapter())
 
-    def _call(self, request, method):
+    def _call(self, request, method, data=None):
         headers = dict(self.options.headers)
         headers.update(request.headers)
         if self.options.username and self.options.password:
@@ -65,9 +75,11 @@ class RequestsHttpTransport(Transport):
         else:
             auth = None
 
+        if data is None:
+            data = request.message
         response = getattr(self.session, method)(request.url,
                                                  auth=auth,
-                                                 data=request.message,
+                                                 data=data,
                                                  headers=headers,
                                                  timeout=self.options.timeout,
                                                  proxies=self.options.proxy,
@@ -78,12 +90,86 @@ class RequestsHttpTransport(Transport):
     def open(self, request):
         return self._call(request, 'get').raw
 
+    def post(self, request, data=None):
+        """
+        POSTs a request, retrying it as far as the retry policy allows, and
+        returns the requests Response without reading its content. data, if
+        given, is sent instead of the request's message; it must be seekable
+        for the request to be retried.
+        """
+        attempt = 1
+        policy = self.retry_policy
+        with self.instrumentation.request('soap', 'post',
+                                          soap_operation(request.message),
+                                          request.url) as call:
+            while True:
+                error = None
+                call.record_request(request.message if data is None
+                                    else data)
+                try:
+                    response = self._call(request, 'post', data=data)
+                except RequestException as e:
+                    if policy is None or not policy.should_retry(
+                            attempt, 'post', exception=e):
+                        raise
+                    error = e
+                else:
+                    call.record_response(response, streamed=True)
+                    if policy is None or not policy.should_retry(
+                            attempt, 'post', status_code=response.status_code):
+                        return response
+                    response.close()
+                logger.info('Retrying SOAP request to %s', request.url)
+                self.instrumentation.retry(call, error)
+                policy.sleep(attempt)
+                attempt += 1
+                if hasattr(data, 'seek'):
+                    data.seek(0)
+
     def send(self, request):
-        response = self._call(request, 'post')
+        response = self.post(request)
         return Reply(response.status_code, response.headers, response.content)
 
 
+class PrunePlugin(MessagePlugin):
+
+    """
+    This plugin is needed in order to keep empty complex objects from getting
+    sent in the soap paylaod.
+    """
+
+    def marshalled(self, context):
+        context.envelope[1].prune()
+
+
+class SessionHeaderPlugin(MessagePlugin):
+
+    """
+    Adds a SessionHeader with the client's access token to every outgoing
+    message. Clients share their parsed WSDL, which is where suds reads the
+    soapheaders option from, so the header can't be set through it.
+    """
+
+    def __init__(self, namespace, access_token=None):
+        self.namespace = namespace
+        self.access_token = access_token
+
+    def marshalled(self, context):
+        ns = ('tns', self.namespace)
+        session_header = Element('SessionHeader', ns=ns)
+        session_header.append(
+            Element('sessionId', ns=ns).setText(self.access_token))
+        context.envelope.getChild('Header').append(session_header)
+        # Declare the namespace on the envelope, as suds does for the headers
+        # it marshals itself.
+        context.envelope.promotePrefixes()
+
+
 class SalesforceSoapClientBase(object):
+    # Size of the chunks SOAP replies are read and parsed in
+    REPLY_CHUNK_SIZE = 64 * 1024
+    # Record classes which results are converted to, keyed by type name
+    result_types = {}
 
     @property
     def version(self):
@@ -94,17 +180,19 @@ class SalesforceSoapClientBase(object):
         raise NotImplementedError('Subclasses must specify a wsdl path.')
 
     def __init__(self, client_id, client_secret, domain, access_token,
-                 refresh_token=None, token_updater=None):
-        # This plugin is needed in order to keep empty complex objects from
-        # getting sent in the soap paylaod.
-        class PrunePlugin(MessagePlugin):
-
-            def marshalled(self, context):
-                context.envelope[1].prune()
-
-        wsdl = 'file://{0}'.format(self.wsdl_path)
-        self.client = Client(wsdl, transport=RequestsHttpTransport(),
-                             plugins=[PrunePlugin()])
+                 refresh_token=None, token_updater=None, retry_policy=None,
+                 fast_results=False, instrumentation=None):
+        # Whether results of the types in result_types are built straight
+        # from the XML of the reply, skipping suds' unmarshalling
+        self.fast_results = fast_results
+        self.instrumentation = instrumentation or Instrumentation()
+        transport = RequestsHttpTransport(
+            retry_policy=retry_policy, instrumentation=self.instrumentation)
+        namespace = shared_client(self.wsdl_path).wsdl.tns[1]
+        self._session_header = SessionHeaderPlugin(namespace)
+        self.client = clone_client(self.wsdl_path, transport=transport,
+                                   plugins=[PrunePlugin(),
+                                            self._session_header])
 
         self._set_session_header(access_token)
 
@@ -121,13 +209,15 @@ class SalesforceSoapClientBase(object):
                                                     domain,
                                                     access_token=access_token,
                                                     refresh_token=refresh_token,
-                                                    token_updater=token_updater)
+                                                    token_updater=token_updater,
+                                                    retry_policy=retry_policy,
+                                                    instrumentation=self.instrumentation)
         else:
             self.rest_client = None
 
     @staticmethod
     def login(wsdl_path, username, password, token):
-        client = Client('file://{0}'.format(wsdl_path))
+        client = clone_client(wsdl_path)
         response = client.service.login(username, password + token)
         return (
             response.sessionId,
@@ -135,28 +225,100 @@ class SalesforceSoapClientBase(object):
         )
 
     def _set_session_header(self, access_token):
-        session_header = self.client.factory.create('SessionHeader')
-        session_header.sessionId = access_token
-        headers = {
-            'SessionHeader': session_header
-        }
-        self.client.set_options(soapheaders=headers)
+        self.access_token = access_token
+        self._session_header.access_token = access_token
 
     def _call(self, function_name, args=None, kwargs=None):
-        args = args or []
-        kwargs = kwargs or {}
-        func = getattr(self.client.service, function_name)
-        # TODO: parse response, return something actually useful
-        try:
-            return func(*args, **kwargs)
-        except WebFault as e:
-            # Detect whether the failure is due to an invalid session, and if
-            # possible, try to refresh the access token.
-            if (hasattr(e, 'fault') and
-                    e.fault.faultcode == 'sf:INVALID_SESSION_ID' and
-                    self.rest_client):
-                token = self.rest_client._refresh_token()
-                if token:
-                    self._set_session_header(token['access_token'])
-                    return func(*args, **kwargs)
-            raise
+        method, events = self._with_session(function_name, self._send,
+                                            function_name, args, kwargs)
+        return to_records(build_reply(events, method), self.result_types)
+
+    def _call_iter(self, function_name, args=None, kwargs=None):
+        """
+        Makes a call and yields its results as they are parsed from the
+        reply: each result of a call which returns a list, or otherwise the
+        values of the result's children (e.g. each record of a ReadResult).
+        """
+        method, events = self._with_session(function_name, self._send,
+                                            function_name, args, kwargs)
+        for name, value, repeated in events:
+            if name is not None:
+                yield to_records(value, self.result_types)
+
+    def _send(self, function_name, args=None, kwargs=None):
+        """
+        Sends a call and returns a 2-tuple of its suds method and a generator
+        of the events of its reply, which is parsed incrementally from the
+        response as the generator is consumed rather than read in full.
+        """
+        request, context = self._prepare(function_name, args, kwargs)
+        response = self.client.options.transport.post(request)
+        method = context.client.method
+        parsers = None
+        if self.fast_results:
+            parsers = dict((name, record_type.from_node) for name, record_type
+                           in self.result_types.items())
+        if response.status_code != 200:
+            # suds raises the fault, which is small, or any other error
+            try:
+                context.process_reply(response.content, response.status_code,
+                                      response.reason)
+            finally:
+                response.close()
+            return method, iter([])
+
+        def events():
+            try:
+                for event in iter_reply(
+                        response.iter_content(self.REPLY_CHUNK_SIZE), method,
+                        parsers=parsers):
+                    yield event
+            finally:
+                response.close()
+        return method, events()
+
+    def _with_session(self, operation, func, *args, **kwargs):
+        """
+        Calls func, which sends a request for the given SOAP operation, and
+        calls it again with a refreshed access token if it failed because the
+        session expired.
+        """
+        access_token = self.access_token
+        with self.instrumentation.request('soap', 'post', operation,
+                                          self.client.options.location) as call:
+            try:
+                return func(*args, **kwargs)
+            except WebFault as e:
+                # Detect whether the failure is due to an invalid session, and
+                # if possible, try to refresh the access token. The REST client
+                # makes sure that only one thread refreshes an expired token.
+                if (hasattr(e, 'fault') and
+                        e.fault.faultcode == 'sf:INVALID_SESSION_ID' and
+                        self.rest_client):
+                    token = self.rest_client._refresh_token(
+                        expired_access_token=access_token)
+                    if token:
+                        self._set_session_header(token['access_token'])
+                        self.instrumentation.refresh(call)
+                        return func(*args, **kwargs)
+                raise
+
+    def _prepare(self, function_name, args=None, kwargs=None):
+        """
+        Marshals a call without sending it, for calls whose request or reply
+        is too large to go through suds. Returns a 2-tuple of a transport
+        Request holding the envelope and a suds RequestContext, whose
+        process_reply method unmarshals the reply's content.
+        """
+        method = getattr(self.client.service, function_name).method
+        soap_client = SoapClient(self.client, method)
+        request = Request(soap_client.location())
+        request.headers = soap_client.headers()
+        # suds returns the marshalled envelope instead of sending it when
+        # nosend is set. Only these options apply until the reply is parsed.
+        soap_client.options = Options(nosend=True,
+                                      plugins=self.client.options.plugins,
+                                      prettyxml=self.client.options.prettyxml)
+        context = soap_client.invoke(args or [], kwargs or {})
+        request.message = context.envelope
+        return request, context
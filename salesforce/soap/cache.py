@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import gc
+import hashlib
+import logging
+import os
+import stat
+import threading
+
+import suds
+from suds.cache import ObjectCache
+from suds.client import Client
+
+logger = logging.getLogger(__name__)
+
+# Per user, since cached models are unpickled
+DEFAULT_LOCATION = os.environ.get(
+    'SALESFORCE_WSDL_CACHE',
+    os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                 os.path.join(os.path.expanduser('~'), '.cache'),
+                 'salesforce-wsdl'),
+)
+
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
+
+class WsdlCache(ObjectCache):
+
+    """
+    Persistent cache of the parsed model of a WSDL. Entries are stored in a
+    directory named after the suds version and the SHA-1 of the WSDL's
+    contents, so an edited WSDL or a suds upgrade never loads a stale model,
+    and they never expire. Clients must use cachingpolicy=1 so that suds
+    caches its whole Definitions object instead of the raw XML documents.
+
+    Since loading an entry unpickles it, directories are created private to
+    the current user, and entries are only loaded from files and directories
+    which the current user owns and nobody else can write to.
+    """
+
+    def __init__(self, wsdl_path, location=None):
+        with open(wsdl_path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.root = location or DEFAULT_LOCATION
+        location = os.path.join(self.root, suds.__version__, digest)
+        ObjectCache.__init__(self, location)
+
+    def mktmp(self):
+        try:
+            if not os.path.isdir(self.location):
+                os.makedirs(self.location, 0o700)
+        except OSError:
+            logger.debug('Could not create %s', self.location, exc_info=True)
+        return self
+
+    def open(self, fn, *args):
+        f = ObjectCache.open(self, fn, *args)
+        if args and 'w' in args[0]:
+            os.chmod(fn, 0o600)
+        return f
+
+    def _is_private(self, path):
+        if not hasattr(os, 'getuid'):
+            # Windows keeps the cache in the user's profile
+            return True
+        try:
+            info = os.stat(path)
+        except OSError:
+            return False
+        return (info.st_uid == os.getuid() and
+                not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+    def getf(self, id):
+        fn = self._FileCache__fn(id)
+        if not os.path.exists(fn):
+            return None
+        paths = [fn, self.location, os.path.dirname(self.location),
+                 self.root]
+        unsafe = [path for path in paths if not self._is_private(path)]
+        if unsafe:
+            logger.warning('Ignoring the WSDL cache in %s, which is not '
+                           'private to the current user', unsafe[0])
+            return None
+        return ObjectCache.getf(self, id)
+
+    def get(self, id):
+        # The cyclic garbage collector keeps rescanning the large object graph
+        # while it is unpickled, which roughly triples the load time.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return ObjectCache.get(self, id)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+
+def create_client(wsdl_path, location=None, **kwargs):
+    """
+    Creates a suds Client for a local WSDL file, loading its parsed model from
+    the WSDL cache (and storing it there on a miss).
+    """
+    return Client('file://{0}'.format(wsdl_path),
+                  cache=WsdlCache(wsdl_path, location=location),
+                  cachingpolicy=1, **kwargs)
+
+
+def shared_client(wsdl_path):
+    """
+    Returns the process-wide client for a WSDL, creating it on first use. It
+    holds the only copy of the parsed WSDL, schema and type factory, which
+    must be treated as immutable; use clone_client to make calls.
+    """
+    with _shared_clients_lock:
+        client = _shared_clients.get(wsdl_path)
+        if client is None:
+            client = create_client(wsdl_path)
+            _shared_clients[wsdl_path] = client
+    return client
+
+
+def clone_client(wsdl_path, **options):
+    """
+    Returns a client which shares the parsed WSDL of the process-wide client
+    for wsdl_path but has its own options (transport, plugins, location...),
+    so it only costs a few KB.
+
+    suds reads some options, including soapheaders, from the shared WSDL
+    rather than from the client, so per-client SOAP headers must be added by
+    a plugin instead.
+    """
+    client = shared_client(wsdl_path).clone()
+    client.set_options(**options)
+    return client
+
+
+def build(location=None):
+    """
+    Parses the WSDLs bundled with this package into the cache, e.g. at install
+    or image build time with `python -m salesforce.soap.cache`.
+    """
+    from ..metadata import SalesforceMetadataClient
+    from . import SalesforceSoapClient
+
+    for wsdl_path in (SalesforceSoapClient.wsdl_path,
+                      SalesforceMetadataClient.wsdl_path):
+        logger.info('Caching %s', wsdl_path)
+        create_client(wsdl_path, location=location)
+
+
+if __name__ == '__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    build(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -9,3 +9,28 @@ class SalesforceSoapException(Exception):
         message = ', '.join(['{0}: {1}'.format(e['statusCode'],
                                                e['message']) for e in errors])
         super(SalesforceSoapException, self).__init__(message)
+
+
+class PartialResultsException(Exception):
+
+    """
+    Raised by a call which was split into several requests when some of them
+    failed and others succeeded. results holds what the call would have
+    returned, with None in place of the results of the failed requests'
+    items, and errors a list of (items, exception) for each failed request.
+    """
+
+    def __init__(self, results, errors):
+        self.results = results
+        self.errors = errors
+        super(PartialResultsException, self).__init__(
+            '{0} of the requests failed, first with: {1}'.format(
+                len(errors), errors[0][1]))
+
+
+class AsyncTimeoutException(Exception):
+
+    def __init__(self, result):
+        self.result = result
+        super(AsyncTimeoutException, self).__init__(
+            'Timed out waiting for asynchronous request {0}'.format(result.id))
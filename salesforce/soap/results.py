@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+from suds.sudsobject import Object
+from suds.xsd.sxbuiltin import XBoolean, XDateTime, XInteger
+
+# Parsers for the text of simple elements, with the same results as suds
+text = unicode
+boolean = XBoolean.translate
+integer = XInteger.translate
+datetime = XDateTime.translate
+
+
+class Record(object):
+
+    """
+    Compact replacement for the suds object of a SOAP result type. Subclasses
+    list their elements in _fields as (name, parse, repeated) tuples, where
+    parse converts the text of an element, is a Record subclass for complex
+    elements, or is None for elements left to suds, and set __slots__ to
+    their names.
+
+    Records can be built from a suds object, or straight from the parsed XML
+    of a result without unmarshalling it at all. Fields can also be read as
+    items, as they can on suds objects.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, **kwargs):
+        for name, parse, repeated in self._fields:
+            setattr(self, name, kwargs.pop(name, [] if repeated else None))
+        if kwargs:
+            raise TypeError('Unexpected fields for {0}: {1}'.format(
+                type(self).__name__, ', '.join(sorted(kwargs))))
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                all(self[f[0]] == other[f[0]] for f in self._fields))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, ', '.join(
+            '{0}={1!r}'.format(f[0], self[f[0]]) for f in self._fields))
+
+    @staticmethod
+    def _is_record(parse):
+        return isinstance(parse, type) and issubclass(parse, Record)
+
+    @classmethod
+    def from_object(cls, obj):
+        "Converts a suds object."
+        kwargs = {}
+        for name, parse, repeated in cls._fields:
+            value = getattr(obj, name, None)
+            if repeated:
+                value = value or []
+            if cls._is_record(parse) and value is not None:
+                if repeated:
+                    value = [parse.from_object(v) for v in value]
+                else:
+                    value = parse.from_object(value)
+            kwargs[name] = value
+        return cls(**kwargs)
+
+    @classmethod
+    def from_node(cls, node):
+        "Builds a record from the suds XML element of a result."
+        record = cls()
+        fields = dict((f[0], f) for f in cls._fields)
+        for child in node.getChildren():
+            name, parse, repeated = fields.get(child.name, (None, None, None))
+            if parse is None:
+                continue
+            if cls._is_record(parse):
+                value = parse.from_node(child)
+            elif child.isnil():
+                value = None
+            else:
+                value = parse(child.getText(''))
+            if repeated:
+                record[name].append(value)
+            else:
+                setattr(record, name, value)
+        return record
+
+
+def slots(fields):
+    return tuple(f[0] for f in fields)
+
+
+def to_records(value, record_types):
+    """
+    Converts a suds result, or each of a list of them, to the Record subclass
+    named after its type in record_types, if any.
+    """
+    if isinstance(value, list):
+        return [to_records(v, record_types) for v in value]
+    if isinstance(value, Object):
+        record_type = record_types.get(value.__class__.__name__)
+        if record_type is not None:
+            return record_type.from_object(value)
+    return value
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import base64
+import collections
+import os
+from xml.sax import make_parser
+from xml.sax.handler import feature_external_ges
+from xml.sax.saxutils import XMLGenerator
+
+from suds import WebFault
+from suds.bindings.binding import envns
+from suds.sax.parser import Handler
+from suds.sudsobject import Factory
+from suds.umx.basic import Basic as UmxBasic
+
+
+class Base64Body(object):
+
+    """
+    File-like request body which base64-encodes the contents of a binary file
+    between a prefix and a suffix as it is read, so that the file never has to
+    be held in memory. Its length is known up front, so requests sends it with
+    a Content-Length header instead of chunked encoding.
+    """
+    # A multiple of 3, so that separately encoded chunks can be concatenated
+    CHUNK_SIZE = 3 * 2 ** 16
+
+    def __init__(self, fileobj, prefix, suffix):
+        self.fileobj = fileobj
+        self.prefix = prefix
+        self.suffix = suffix
+        self._start = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell() - self._start
+        self.len = len(prefix) + 4 * ((size + 2) // 3) + len(suffix)
+        self.seek(0)
+
+    def __len__(self):
+        return self.len
+
+    def __iter__(self):
+        return self._chunks()
+
+    def _chunks(self):
+        yield self.prefix
+        leftover = b''
+        while True:
+            data = self.fileobj.read(self.CHUNK_SIZE)
+            if not data:
+                break
+            data = leftover + data
+            cut = len(data) - len(data) % 3
+            leftover = data[cut:]
+            yield base64.b64encode(data[:cut])
+        if leftover:
+            yield base64.b64encode(leftover)
+        yield self.suffix
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if (offset, whence) != (0, os.SEEK_SET):
+            raise IOError('Base64Body can only be rewound')
+        self.fileobj.seek(self._start)
+        self._iter = self._chunks()
+        self._buffer = b''
+        self._position = 0
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            chunk = next(self._iter, None)
+            if chunk is None:
+                break
+            parts.append(chunk)
+            length += len(chunk)
+        data = b''.join(parts)
+        if size >= 0:
+            data, self._buffer = data[:size], data[size:]
+        else:
+            self._buffer = b''
+        self._position += len(data)
+        return data
+
+
+class Base64ElementFilter(XMLGenerator):
+
+    """
+    SAX handler which copies the document it parses to out, except that the
+    text of every element named element_name is base64-decoded into sink
+    instead, leaving the element empty. Feeding a reply through it with an
+    incremental parser keeps large binary payloads out of memory.
+    """
+
+    def __init__(self, out, element_name, sink):
+        XMLGenerator.__init__(self, out, 'utf-8')
+        self.element_name = element_name
+        self.sink = sink
+        self._inside = False
+        self._pending = ''
+
+    def startElement(self, name, attrs):
+        XMLGenerator.startElement(self, name, attrs)
+        if name.rpartition(':')[2] == self.element_name:
+            self._inside = True
+
+    def endElement(self, name):
+        if self._inside:
+            self._decode(final=True)
+            self._inside = False
+        XMLGenerator.endElement(self, name)
+
+    def characters(self, content):
+        if not self._inside:
+            XMLGenerator.characters(self, content)
+            return
+        self._pending += ''.join(content.split())
+        self._decode()
+
+    def _decode(self, final=False):
+        data = self._pending
+        cut = len(data) if final else len(data) - len(data) % 4
+        if cut:
+            self.sink.write(base64.b64decode(data[:cut].encode('ascii')))
+        self._pending = data[cut:]
+
+
+class ReplyHandler(Handler):
+
+    """
+    suds SAX handler which unmarshals each result of a SOAP reply as soon as
+    it has been parsed, then drops its nodes. When the call returns a single
+    result, the result's children are unmarshalled one by one instead, so
+    that e.g. the records of a ReadResult are never all held as nodes at
+    once. Values are queued on events as (name, value, repeated) tuples; the
+    name of the single result itself, which comes last, is None.
+
+    Elements whose type has a function in parsers are passed to it instead of
+    being unmarshalled.
+    """
+    # The document, Envelope, Body and response nodes enclose every result
+    RESULT_DEPTH = 4
+
+    def __init__(self, method, parsers=None):
+        Handler.__init__(self)
+        # Functions building values straight from the nodes of elements of
+        # the types they are keyed by, instead of unmarshalling them
+        self.parsers = parsers or {}
+        self.binding = method.binding.output
+        rtypes = self.binding.returned_types(method)
+        self.rtype = rtypes[0] if rtypes else None
+        self.unmarshaller = self.binding.unmarshaller()
+        self.events = collections.deque()
+        self._children = 0
+
+    @property
+    def repeated(self):
+        return self.rtype is not None and self.rtype.multi_occurrence()
+
+    def endElement(self, name):
+        node = self.top()
+        Handler.endElement(self, name)
+        depth = len(self.nodes)
+        if (self.rtype is None or depth < self.RESULT_DEPTH or
+                depth > self.RESULT_DEPTH + 1 or
+                self.nodes[2].name != 'Body' or
+                self.nodes[3].name == 'Fault'):
+            return
+
+        resolved = self.rtype.resolve(nobuiltin=True)
+        if depth == self.RESULT_DEPTH:
+            value = self._unmarshal(node, resolved)
+            if self.repeated:
+                self.events.append((node.name, value, True))
+            else:
+                if self._children and not value:
+                    # Results emptied of all their children unmarshal to ''
+                    value = Factory.object(resolved.name)
+                self._children = 0
+                self.events.append((None, value, False))
+        elif self.repeated:
+            return
+        else:
+            child = resolved.get_child(node.name)[0]
+            if child is None:
+                return
+            self.events.append((node.name, self._unmarshal(node, child),
+                                child.multi_occurrence()))
+            self._children += 1
+        self.top().remove(node)
+
+    def _unmarshal(self, node, schema_object):
+        parse = self.parsers.get(schema_object.resolve().name)
+        if parse is not None:
+            return parse(node)
+        return self.unmarshaller.process(node, schema_object)
+
+    def fault(self):
+        "Returns the unmarshalled Fault of the reply, if any."
+        node = self.nodes[0]
+        for name in ('Envelope', 'Body', 'Fault'):
+            node = node.getChild(name, envns)
+            if node is None:
+                return None
+        return UmxBasic().process(node)
+
+
+def iter_reply(chunks, method, parsers=None):
+    """
+    Parses a SOAP reply to method from an iterable of byte strings as they
+    come, and yields the events of its ReplyHandler. Raises WebFault if the
+    reply is a SOAP Fault.
+    """
+    parser = make_parser()
+    parser.setFeature(feature_external_ges, 0)
+    handler = ReplyHandler(method, parsers=parsers)
+    parser.setContentHandler(handler)
+    for chunk in chunks:
+        parser.feed(chunk)
+        while handler.events:
+            yield handler.events.popleft()
+    parser.close()
+    while handler.events:
+        yield handler.events.popleft()
+
+    fault = handler.fault()
+    if fault is not None:
+        raise WebFault(fault, handler.nodes[0])
+
+
+def build_reply(events, method):
+    """
+    Assembles the events of a reply into the value suds would have returned
+    for it: a list of results, a single result or None.
+    """
+    rtypes = method.binding.output.returned_types(method)
+    if rtypes and rtypes[0].multi_occurrence():
+        return [value for _, value, _ in events]
+
+    children = []
+    for name, value, repeated in events:
+        if name is not None:
+            children.append((name, value, repeated))
+            continue
+        for child_name, child_value, child_repeated in children:
+            if child_repeated:
+                if not isinstance(getattr(value, child_name, None), list):
+                    setattr(value, child_name, [])
+                getattr(value, child_name).append(child_value)
+            else:
+                setattr(value, child_name, child_value)
+        return value
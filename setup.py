@@ -16,6 +16,7 @@ if sys.argv[-1] == 'publish':
 
 packages = [
     'salesforce',
+    'salesforce.bulk',
     'salesforce.metadata',
     'salesforce.metadata.v30',
     'salesforce.rest',
@@ -24,7 +25,7 @@ packages = [
 ]
 
 requires = [
-    'anyjson>=0.3.3',
+    'futures>=2.1.6',
     'requests>=2.3.0',
     'pytz>=2014.3',
     'suds-jurko>=0.6',
@@ -49,6 +50,12 @@ setup(
     package_dir={'salesforce': 'salesforce'},
     include_package_data=True,
     install_requires=requires,
+    extras_require={
+        # Faster JSON parsing, see salesforce.codec
+        'speedups': ['simplejson>=3.0'],
+        # Columnar query exports, see salesforce.rest.columnar
+        'columnar': ['numpy', 'pyarrow'],
+    },
     license=license,
     zip_safe=False,
     classifiers=(
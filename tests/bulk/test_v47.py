@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+
+import pytest
+from requests.models import Response
+from requests.packages.urllib3.response import HTTPResponse
+
+from salesforce.bulk import SalesforceBulkClient
+from salesforce.bulk.exceptions import JobTimeoutException
+
+
+def csv_response(data, locator=None):
+    response = Response()
+    response.status_code = 200
+    response.raw = HTTPResponse(body=io.BytesIO(data), preload_content=False)
+    if locator:
+        response.headers['Sforce-Locator'] = locator
+    return response
+
+
+class FakeBulkClient(SalesforceBulkClient):
+
+    def __init__(self, *args, **kwargs):
+        super(FakeBulkClient, self).__init__(*args, **kwargs)
+        self.calls = []
+        self.states = ['InProgress', 'JobComplete']
+        self.results = {}
+
+    def call(self, path, method='get', params=None, body=None, headers=None,
+             versioned=True):
+        self.calls.append((method, path, body))
+        if method == 'post':
+            return {'id': 'job{0}'.format(len(self.calls)), 'state': 'Open'}
+        if method == 'get':
+            return {'id': path.rsplit('/', 1)[-1],
+                    'state': self.states.pop(0)}
+        return {'id': path.rsplit('/', 1)[-1], 'state': 'UploadComplete'}
+
+    def _stream(self, url):
+        query = url.split('?', 1)[1] if '?' in url else ''
+        return self.results[query]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    return FakeBulkClient('client_id', 'client_secret', 'domain',
+                          access_token='access_token')
+
+
+def test_encode_csv():
+    data, count = SalesforceBulkClient._encode_csv(
+        ['Name', 'Active__c', 'Notes__c'],
+        [{'Name': 'Caf\xe9', 'Active__c': True, 'Notes__c': None},
+         ['Quoted, "name"', False, 'Line\nbreak']],
+    )
+    assert count == 2
+    assert data == (b'Name,Active__c,Notes__c\n'
+                    b'Caf\xc3\xa9,true,\n'
+                    b'"Quoted, ""name""",false,"Line\nbreak"\n')
+
+
+def test_ingest_chunks_rows(client):
+    rows = ({'Name': 'Account {0}'.format(i)} for i in range(5))
+    client.states = ['JobComplete'] * 3
+    jobs = client.ingest('Account', 'insert', ['Name'], rows, chunk_size=2)
+
+    uploads = [c[2] for c in client.calls if c[0] == 'put']
+    assert uploads == [
+        b'Name\nAccount 0\nAccount 1\n',
+        b'Name\nAccount 2\nAccount 3\n',
+        b'Name\nAccount 4\n',
+    ]
+    assert [j['state'] for j in jobs] == ['JobComplete'] * 3
+
+
+def test_ingest_chunks_bytes(client):
+    rows = [{'Name': 'Account {0}'.format(i)} for i in range(5)]
+    rows[3]['Name'] = '\xe9' * 10
+    client.states = ['JobComplete'] * 4
+    client.ingest('Account', 'insert', ['Name'], rows, max_upload_size=30)
+
+    uploads = [c[2] for c in client.calls if c[0] == 'put']
+    assert uploads == [
+        b'Name\nAccount 0\nAccount 1\n',
+        b'Name\nAccount 2\n',
+        b'Name\n' + b'\xc3\xa9' * 10 + b'\n',
+        b'Name\nAccount 4\n',
+    ]
+    assert all(len(upload) <= 30 for upload in uploads)
+
+    with pytest.raises(ValueError):
+        client.ingest('Account', 'insert', ['Name'], [{'Name': 'x' * 30}],
+                      max_upload_size=30)
+
+
+def test_wait_for_job_timeout(client):
+    client.states = ['InProgress'] * 10
+    with pytest.raises(JobTimeoutException):
+        client.wait_for_job('job1', timeout=-1)
+
+
+def test_query_results_follow_locator(client):
+    client.results = {
+        '': csv_response(b'Id,Name\r\n1,"Multi\r\nline"\r\n', locator='abc'),
+        'locator=abc': csv_response(b'Id,Name\r\n2,Caf\xc3\xa9\r\n',
+                                    locator='null'),
+    }
+    rows = list(client.query('SELECT Id, Name FROM Account'))
+    assert rows == [
+        {'Id': '1', 'Name': 'Multi\r\nline'},
+        {'Id': '2', 'Name': 'Caf\xe9'},
+    ]
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+import threading
+import time
+
+import pytest
+from suds.sudsobject import Object
+
+from salesforce.metadata import SalesforceMetadataClient
+from salesforce.metadata.v30.results import (Error, FileProperties,
+                                             ReadResult, SaveResult)
+from salesforce.soap.exceptions import (PartialResultsException,
+                                       SalesforceSoapException)
+
+
+class FakeMetadataClient(SalesforceMetadataClient):
+
+    def __init__(self, *args, **kwargs):
+        super(FakeMetadataClient, self).__init__(*args, **kwargs)
+        self.chunks = []
+        self.lock = threading.Lock()
+
+    def _call(self, function_name, args=None, kwargs=None):
+        chunk = args[-1]
+        with self.lock:
+            self.chunks.append(chunk)
+        if 'Broken__c' in chunk:
+            raise SalesforceSoapException([{'statusCode': 'UNKNOWN_EXCEPTION',
+                                            'message': 'Broken'}])
+        # The last, shorter chunk finishes first, results must keep their order
+        time.sleep(0.002 * len(chunk))
+        if function_name == 'readMetadata':
+            result = Object()
+            result.records = ['record {0}'.format(n) for n in chunk]
+            return result
+        return ['result {0}'.format(n) for n in chunk]
+
+
+@pytest.fixture
+def client():
+    return FakeMetadataClient('client_id', 'client_secret', 'domain',
+                              '00D!access_token')
+
+
+@pytest.mark.parametrize('max_workers', [None, 4])
+def test_delete_many_chunks(client, max_workers):
+    names = ['Object{0}__c'.format(i) for i in range(23)]
+    results = client.delete_many('CustomObject', names,
+                                 max_workers=max_workers)
+    assert sorted(len(c) for c in client.chunks) == [3, 10, 10]
+    assert results == ['result {0}'.format(n) for n in names]
+
+
+def test_get_many_merges_records(client):
+    names = ['Object{0}__c'.format(i) for i in range(12)]
+    result = client.get_many('CustomObject', names, max_workers=2)
+    assert result.records == ['record {0}'.format(n) for n in names]
+
+
+@pytest.mark.parametrize('max_workers', [None, 4])
+def test_failed_chunks_keep_partial_results(client, max_workers):
+    names = ['Object{0}__c'.format(i) for i in range(23)]
+    names[12] = 'Broken__c'
+    with pytest.raises(PartialResultsException) as excinfo:
+        client.delete_many('CustomObject', names, max_workers=max_workers)
+    # Chunks after the failed one are still sent
+    assert len(client.chunks) == 3
+    results = excinfo.value.results
+    assert results[:10] == ['result {0}'.format(n) for n in names[:10]]
+    assert results[10:20] == [None] * 10
+    assert results[20:] == ['result {0}'.format(n) for n in names[20:]]
+    [(items, error)] = excinfo.value.errors
+    assert items == names[10:20]
+    assert isinstance(error, SalesforceSoapException)
+
+    with pytest.raises(PartialResultsException) as excinfo:
+        client.get_many('CustomObject', names, max_workers=max_workers)
+    assert excinfo.value.results.records == \
+        ['record {0}'.format(n) for n in names[:10] + names[20:]]
+
+    # Without any partial results, the error itself is raised
+    with pytest.raises(SalesforceSoapException):
+        client.delete_many('CustomObject', ['Broken__c'])
+
+
+def test_create_single(client):
+    assert client.create_many(['object']) == ['result object']
+    assert client.chunks == [['object']]
+
+
+class FakeResponse(object):
+
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+        self.reason = 'OK'
+        self.headers = {}
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), 10):
+            yield self.content[i:i + 10]
+
+    def close(self):
+        pass
+
+
+def soap_response(body):
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns="http://soap.sforce.com/2006/04/metadata">'
+            '<soapenv:Body>{0}</soapenv:Body></soapenv:Envelope>'
+            ).format(body).encode('utf-8')
+
+
+@pytest.fixture
+def metadata_client(monkeypatch):
+    client = SalesforceMetadataClient('client_id', 'client_secret', 'domain',
+                                      '00D!access_token')
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    return client
+
+
+def test_deploy_streams_package(metadata_client, monkeypatch, tmpdir):
+    zip_path = tmpdir.join('package.zip')
+    zip_path.write_binary(b'PK\x03\x04 package contents')
+    requests = []
+
+    def post(request, data=None):
+        requests.append(data.read())
+        return FakeResponse(soap_response(
+            '<deployResponse><result><done>false</done><id>0Af</id>'
+            '<state>Queued</state></result></deployResponse>'))
+
+    statuses = iter(['Pending', 'InProgress', 'InProgress', 'Succeeded'])
+
+    def check_deploy_status(async_id, include_details=False):
+        result = Object()
+        result.id = async_id
+        result.status = next(statuses, 'Succeeded')
+        result.done = result.status == 'Succeeded'
+        result.numberComponentsDeployed = 0
+        result.numberComponentErrors = 0
+        result.numberTestsCompleted = 0
+        result.details = include_details
+        return result
+
+    monkeypatch.setattr(metadata_client.client.options.transport, 'post',
+                        post)
+    monkeypatch.setattr(metadata_client, 'check_deploy_status',
+                        check_deploy_status)
+
+    result = metadata_client.deploy(str(zip_path), rollback_on_error=True)
+    assert result.id == '0Af'
+    assert result.details is True
+
+    body, = requests
+    assert b'<ns0:ZipFile>UEsDBCBwYWNrYWdlIGNvbnRlbnRz</ns0:ZipFile>' in body
+    assert b'<ns0:rollbackOnError>true</ns0:rollbackOnError>' in body
+
+
+def test_deploy_resends_package_after_refresh(monkeypatch):
+    client = SalesforceMetadataClient('client_id', 'client_secret', 'domain',
+                                      '00D!access_token',
+                                      refresh_token='refresh_token')
+    monkeypatch.setattr(client.rest_client, '_refresh_token',
+                        lambda expired_access_token=None:
+                        {'access_token': '00D!access_token2'})
+    replies = [
+        FakeResponse(soap_response(
+            '<soapenv:Fault><faultcode>sf:INVALID_SESSION_ID</faultcode>'
+            '<faultstring>INVALID_SESSION_ID</faultstring></soapenv:Fault>'),
+            status_code=500),
+        FakeResponse(soap_response(
+            '<deployResponse><result><done>false</done><id>0Af</id>'
+            '<state>Queued</state></result></deployResponse>')),
+    ]
+    bodies = []
+
+    def post(request, data=None):
+        bodies.append(data.read())
+        return replies.pop(0)
+
+    monkeypatch.setattr(client.client.options.transport, 'post', post)
+    package = io.BytesIO(b'header PK\x03\x04 package contents')
+    package.seek(len(b'header '))
+
+    result = client.start_deploy(package)
+
+    assert result.id == '0Af'
+    assert len(bodies) == 2
+    for body in bodies:
+        assert b'<ns0:ZipFile>UEsDBCBwYWNrYWdlIGNvbnRlbnRz</ns0:ZipFile>' \
+            in body
+    assert b'access_token2' in bodies[1]
+
+
+def test_retrieve_async_streams_package(metadata_client, monkeypatch, tmpdir):
+    zip_path = tmpdir.join('package.zip')
+    states = iter(['Queued', 'InProgress', 'Completed'])
+
+    def post(request, data=None):
+        if b'<ns0:retrieve>' in request.message:
+            body = ('<retrieveResponse><result><done>false</done>'
+                    '<id>09S</id><state>Queued</state></result>'
+                    '</retrieveResponse>')
+        elif b'checkStatus' in request.message:
+            state = next(states)
+            body = ('<checkStatusResponse><result><done>{0}</done>'
+                    '<id>09S</id><state>{1}</state></result>'
+                    '</checkStatusResponse>').format(
+                        'true' if state == 'Completed' else 'false', state)
+        else:
+            body = ('<checkRetrieveStatusResponse><result>'
+                    '<fileProperties><fileName>objects/Account.object'
+                    '</fileName><fullName>Account</fullName>'
+                    '<type>CustomObject</type></fileProperties>'
+                    '<id>09S</id><zipFile>UEsDBCBwYWNr\nYWdlIGNvbnRlbnRz'
+                    '</zipFile></result></checkRetrieveStatusResponse>')
+        return FakeResponse(soap_response(body))
+
+    # suds sends the calls it makes itself through post too
+    monkeypatch.setattr(metadata_client.client.options.transport, 'post',
+                        post)
+
+    # Threads are only started for async calls, and stopped on close
+    assert metadata_client._executor is None
+    with metadata_client:
+        future = metadata_client.retrieve_async(
+            str(zip_path), types={'CustomObject': ['Account']})
+        result = future.result(timeout=5)
+        executor = metadata_client._executor
+    assert executor._shutdown
+    assert metadata_client._executor is None
+    assert result.fileProperties[0].fullName == 'Account'
+    assert zip_path.read_binary() == b'PK\x03\x04 package contents'
+
+
+@pytest.mark.parametrize('fast_results', [False, True])
+def test_result_records(monkeypatch, fast_results):
+    client = SalesforceMetadataClient('client_id', 'client_secret', 'domain',
+                                      '00D!access_token',
+                                      fast_results=fast_results)
+    replies = {
+        'createMetadata':
+            '<createMetadataResponse><result><fullName>A__c</fullName>'
+            '<success>true</success></result><result><errors>'
+            '<fields>Label</fields><message>Bad label</message>'
+            '<statusCode>FIELD_INTEGRITY_EXCEPTION</statusCode></errors>'
+            '<fullName>B__c</fullName><success>false</success></result>'
+            '</createMetadataResponse>',
+        'listMetadata':
+            '<listMetadataResponse><result><createdDate>'
+            '2014-01-02T03:04:05.000Z</createdDate><fullName>A__c</fullName>'
+            '<type>CustomObject</type></result></listMetadataResponse>',
+        'readMetadata':
+            '<readMetadataResponse><result><records '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xsi:type="CustomObject"><fullName>A__c</fullName></records>'
+            '</result></readMetadataResponse>',
+    }
+
+    def post(request, data=None):
+        for function_name, reply in replies.items():
+            if '<ns0:{0}>'.format(function_name).encode() in request.message:
+                return FakeResponse(soap_response(reply))
+
+    monkeypatch.setattr(client.client.options.transport, 'post', post)
+
+    created = client.create_many(['A__c', 'B__c'])
+    assert created == [
+        SaveResult(fullName='A__c', success=True),
+        SaveResult(fullName='B__c', success=False, errors=[
+            Error(fields=['Label'], message='Bad label',
+                  statusCode='FIELD_INTEGRITY_EXCEPTION')]),
+    ]
+    assert str(SalesforceSoapException(created[1].errors)) == \
+        'FIELD_INTEGRITY_EXCEPTION: Bad label'
+
+    properties, = client.list('CustomObject')
+    assert isinstance(properties, FileProperties)
+    assert properties.fullName == 'A__c'
+    assert properties.createdDate.year == 2014
+
+    result = client.get('CustomObject', 'A__c')
+    assert isinstance(result, ReadResult)
+    assert result.records[0].fullName == 'A__c'
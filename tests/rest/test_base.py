@@ -1,6 +1,15 @@
+import io
 import operator
+import threading
+import time
+
+import pytest
 from betamax import Betamax
+from requests import Request
+from requests.models import Response
 from salesforce.rest.base import SalesforceRestClientBase
+from salesforce.rest.exceptions import InvalidCallException
+from salesforce.rest.executor import size_connection_pool
 
 cassette_name = 'rest.base'
 client_class = SalesforceRestClientBase
@@ -12,3 +21,97 @@ def test_versions(client):
 
     keys = reduce(operator.or_, [set(v.keys()) for v in versions])
     assert keys == {'label', 'url', 'version'}
+
+
+def test_shared_transport():
+    clients = [
+        SalesforceRestClientBase('client_id', 'client_secret', 'domain',
+                                 access_token='access_token', pool_maxsize=20,
+                                 shared_transport=True)
+        for _ in range(2)
+    ]
+    adapters = [c.session.get_adapter('https://domain/') for c in clients]
+    assert adapters[0] is adapters[1]
+    assert adapters[0]._pool_maxsize == 20
+    # Only the instance's connections are shared
+    login = 'https://login.salesforce.com/services/oauth2/token'
+    assert clients[0].session.get_adapter(login) is not adapters[0]
+    assert clients[0].session.get_adapter(login) is not \
+        clients[1].session.get_adapter(login)
+
+    other = SalesforceRestClientBase('client_id', 'client_secret', 'domain',
+                                     access_token='access_token')
+    assert other.session.get_adapter('https://domain/') is not adapters[0]
+
+    # A larger pool goes to a copy of the client
+    sized = size_connection_pool(clients[0], 40)
+    assert sized.session.get_adapter('https://domain/')._pool_maxsize == 40
+    assert clients[0].session.get_adapter('https://domain/') is adapters[0]
+    assert size_connection_pool(clients[0], 20) is clients[0]
+
+
+def test_session_options():
+    client = SalesforceRestClientBase('client_id', 'client_secret', 'domain',
+                                      timeout=(3.05, 27), keep_alive=False)
+    assert client.timeout == (3.05, 27)
+    assert client.session.headers['Connection'] == 'close'
+
+
+class ExpiringClient(SalesforceRestClientBase):
+    version = '29.0'
+
+    def __init__(self, *args, **kwargs):
+        super(ExpiringClient, self).__init__(*args, **kwargs)
+        self.refreshes = 0
+        self.session.refresh_token = self.fake_refresh
+
+    def fake_refresh(self, url):
+        time.sleep(0.05)
+        self.refreshes += 1
+        self.session.token = dict(self.session.token,
+                                  access_token='token{0}'.format(
+                                      self.refreshes))
+        return self.session.token
+
+    def _send(self, url, method='get', body=None, headers=None, **kwargs):
+        response = Response()
+        expired = self.session.token['access_token'] == 'access_token'
+        response.status_code = 401 if expired else 200
+        response.raw = io.BytesIO()
+        return response
+
+
+def test_single_flight_refresh():
+    client = ExpiringClient('client_id', 'client_secret', 'domain',
+                            access_token='access_token',
+                            refresh_token='refresh_token')
+    statuses = []
+
+    def request():
+        statuses.append(client._request('https://domain/').status_code)
+
+    threads = [threading.Thread(target=request) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.refreshes == 1
+    assert statuses == [200] * 16
+
+
+def test_xml_error_response():
+    client = SalesforceRestClientBase('client_id', 'client_secret', 'domain',
+                                      response_format='xml')
+    response = Response()
+    response.status_code = 400
+    response.request = Request('GET', 'https://domain/').prepare()
+    response.raw = io.BytesIO(
+        u'<?xml version="1.0" encoding="UTF-8"?><Errors><Error>'
+        u'<errorCode>MALFORMED_QUERY</errorCode>'
+        u'<message>Unexpected token: \u00e9</message>'
+        u'</Error></Errors>'.encode('utf-8'))
+    with pytest.raises(InvalidCallException) as excinfo:
+        client._extract_response(response)
+    assert excinfo.value.error_code == 'MALFORMED_QUERY'
+    assert excinfo.value.args == (u'Unexpected token: \u00e9',)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import anyjson as json
+import pytest
+
+from salesforce.rest.exceptions import InvalidCallException, NotFoundException
+from salesforce.rest.v29 import SalesforceRestClient
+
+
+class RecordingClient(SalesforceRestClient):
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingClient, self).__init__(*args, **kwargs)
+        self.requests = []
+
+    def _call(self, url, method='get', body=None, headers=None):
+        self.requests.append((method, url, body and json.loads(body)))
+        if url.endswith('composite/batch'):
+            return {'hasErrors': True, 'results': [
+                {'statusCode': 201, 'result': {'id': 'u1', 'success': True}},
+                {'statusCode': 404, 'result': [
+                    {'errorCode': 'NOT_FOUND', 'message': 'Not found'},
+                ]},
+            ]}
+        if method == 'post':
+            records = body and json.loads(body)['records']
+            return [{'id': 'new{0}'.format(i), 'success': True, 'errors': []}
+                    for i in range(len(records))]
+        return [{'id': None, 'success': False, 'errors': [
+            {'statusCode': 'ENTITY_IS_DELETED', 'message': 'Deleted',
+             'fields': []},
+        ]}]
+
+
+@pytest.fixture
+def client():
+    return RecordingClient('client_id', 'client_secret', 'domain',
+                           access_token='access_token')
+
+
+def test_batch_chunks_collections(client):
+    with client.batch() as batch:
+        for i in range(450):
+            batch.create('Account', {'Name': 'Account {0}'.format(i)})
+
+    assert [len(r[2]['records']) for r in client.requests] == [200, 200, 50]
+    assert client.requests[0][2]['records'][0]['attributes'] == {
+        'type': 'Account',
+    }
+    assert len(batch.results) == 450
+    assert batch.results[0]['id'] == 'new0'
+
+
+def test_batch_maps_results_in_order(client):
+    batch = client.batch()
+    batch.create('Account', {'Name': 'Created'})
+    batch.upsert_external('Account', 'Ext__c', 'a', {'Name': 'Upserted'})
+    batch.upsert_external('Account', 'Ext__c', 'b', {'Name': 'Missing'})
+    batch.delete('Account', '001000000000001')
+    results = batch.execute()
+
+    assert [r[0] for r in client.requests] == ['post', 'post', 'delete']
+    assert client.requests[1][2]['batchRequests'][0]['url'] == \
+        'v42.0/sobjects/Account/Ext__c/a'
+    assert results[0]['id'] == 'new0'
+    assert results[1]['id'] == 'u1'
+    assert isinstance(results[2], NotFoundException)
+    assert isinstance(results[3], InvalidCallException)
+    assert results[3].error_code == 'ENTITY_IS_DELETED'
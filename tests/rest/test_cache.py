@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+from requests.models import Request, Response
+
+from salesforce.rest.cache import DescribeCache, FileDescribeCache
+from salesforce.rest.v29 import SalesforceRestClient
+
+
+def json_response(status_code, body=b'', headers=None):
+    response = Response()
+    response.status_code = status_code
+    response._content = body
+    response.request = Request('GET', 'https://domain/').prepare()
+    response.headers.update(headers or {})
+    return response
+
+
+class DescribeClient(SalesforceRestClient):
+
+    def __init__(self, responses, *args, **kwargs):
+        super(DescribeClient, self).__init__(*args, **kwargs)
+        self.responses = responses
+        self.requests = []
+
+    def _request(self, url, method='get', body=None, headers=None, **kwargs):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def describe():
+    return json_response(200, b'{"objectDescribe": {"name": "Account"}}',
+                         {'Last-Modified': 'Tue, 01 Jul 2014 00:00:00 GMT'})
+
+
+def test_lru_eviction():
+    cache = DescribeCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a').content == 1
+    assert cache.get('c').content == 3
+
+
+def test_ttl():
+    cache = DescribeCache(ttl=0)
+    entry = cache.set('a', 1)
+    assert not cache.is_fresh(entry)
+    assert cache.get('a') is entry
+
+
+ACCESS_TOKEN = '00D000000000001!access_token'
+
+
+def test_file_cache_persists(tmpdir):
+    key = ('na1.salesforce.com', '29.0', '00D000000000001', None,
+           'sobjects/Account')
+    FileDescribeCache(str(tmpdir)).set(key, {'name': 'Account'}, 'date')
+
+    entry = FileDescribeCache(str(tmpdir)).get(key)
+    assert entry.content == {'name': 'Account'}
+    assert entry.last_modified == 'date'
+    assert tmpdir.join('na1.salesforce.com', '29.0', '00D000000000001',
+                       '_').check(dir=True)
+
+
+def test_client_uses_fresh_entry(describe):
+    client = DescribeClient([describe], 'client_id', 'client_secret',
+                            'domain', access_token=ACCESS_TOKEN,
+                            describe_cache=DescribeCache())
+    assert client.object('Account') == {'name': 'Account'}
+    assert client.object('Account') == {'name': 'Account'}
+    assert len(client.requests) == 1
+
+
+def test_client_revalidates_stale_entry(describe):
+    client = DescribeClient([describe, json_response(304)], 'client_id',
+                            'client_secret', 'domain',
+                            access_token=ACCESS_TOKEN,
+                            describe_cache=DescribeCache(ttl=0))
+    client.object('Account')
+    assert client.object('Account') == {'name': 'Account'}
+    assert client.requests[1] == {
+        'If-Modified-Since': 'Tue, 01 Jul 2014 00:00:00 GMT',
+    }
+
+
+def test_client_entries_are_per_org_and_user(describe, tmpdir):
+    cache = FileDescribeCache(str(tmpdir))
+    clients = [
+        DescribeClient([describe], 'client_id', 'client_secret', 'domain',
+                       access_token=access_token, user_id=user_id,
+                       describe_cache=cache)
+        for access_token, user_id in [
+            (ACCESS_TOKEN, '005000000000001'),
+            ('00D000000000002!access_token', '005000000000001'),
+            (ACCESS_TOKEN, '005000000000002'),
+        ]
+    ]
+    for client in clients:
+        client.object('Account')
+        assert len(client.requests) == 1
+    assert len(tmpdir.listdir()[0].listdir()[0].listdir()) == 2
+
+    # The identity URL of an OAuth token names both
+    client = DescribeClient([], 'client_id', 'client_secret', 'domain',
+                            access_token='access_token', describe_cache=cache)
+    client.session.token['id'] = ('https://login.salesforce.com/id/'
+                                  '00D000000000001/005000000000002')
+    client.object('Account')
+    assert client.requests == []
+
+
+def test_client_without_org_skips_cache(describe):
+    cache = DescribeCache()
+    client = DescribeClient([describe], 'client_id', 'client_secret',
+                            'domain', access_token='access_token',
+                            describe_cache=cache)
+    client.object('Account')
+    assert not cache._entries
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import datetime
+
+import pytest
+
+from salesforce.rest.columnar import (BOOLEAN, DATE, FLOAT, STRING, TIMESTAMP,
+                                      FeatherWriter, ParquetWriter, Schema,
+                                      export)
+from salesforce.rest.v29 import SalesforceRestClient
+
+SOQL = ('SELECT Id, Amount, IsWon, CloseDate, CreatedDate, Owner.Name, '
+        'Owner.IsActive FROM Opportunity')
+
+DESCRIPTIONS = {
+    'Opportunity': {'fields': [
+        {'name': 'Id', 'type': 'id', 'relationshipName': None},
+        {'name': 'Amount', 'type': 'currency', 'relationshipName': None},
+        {'name': 'IsWon', 'type': 'boolean', 'relationshipName': None},
+        {'name': 'CloseDate', 'type': 'date', 'relationshipName': None},
+        {'name': 'CreatedDate', 'type': 'datetime', 'relationshipName': None},
+        {'name': 'OwnerId', 'type': 'reference', 'relationshipName': 'Owner',
+         'referenceTo': ['User']},
+    ]},
+    'User': {'fields': [
+        {'name': 'Name', 'type': 'string'},
+        {'name': 'IsActive', 'type': 'boolean'},
+        {'name': 'ManagerId', 'type': 'reference',
+         'relationshipName': 'Manager', 'referenceTo': ['User']},
+        {'name': 'CreatedDate', 'type': 'datetime'},
+    ]},
+}
+
+
+def opportunity(n):
+    return {
+        'attributes': {'type': 'Opportunity'},
+        'Id': '006D000000{0:05d}AAA'.format(n),
+        'Amount': n * 10.5 if n % 3 else None,
+        'IsWon': n % 2 == 0,
+        'CloseDate': '2014-06-{0:02d}'.format(n % 28 + 1),
+        'CreatedDate': '2014-06-04T23:54:00.000+0000',
+        'Owner': {'attributes': {'type': 'User'},
+                  'Name': 'Owner {0}'.format(n),
+                  'IsActive': True,
+                  'Manager': {'attributes': {'type': 'User'},
+                              'CreatedDate': '2014-01-01T00:00:00.000+0000'}}
+        if n % 4 else None,
+    }
+
+
+class ColumnarClient(SalesforceRestClient):
+
+    def __init__(self, records):
+        super(ColumnarClient, self).__init__('client_id', 'client_secret',
+                                             'domain', access_token='token')
+        self.records = records
+
+    def object(self, object_name, full_description=False):
+        return DESCRIPTIONS[object_name]
+
+    def query_iter(self, soql, include_all=False, prefetch=False):
+        return iter(self.records)
+
+
+@pytest.fixture
+def client():
+    return ColumnarClient([opportunity(n) for n in range(25)])
+
+
+def test_schema_from_query(client):
+    schema = Schema.from_query(client, SOQL)
+    assert [(c.name, c.type) for c in schema.columns] == [
+        ('Id', STRING), ('Amount', FLOAT), ('IsWon', BOOLEAN),
+        ('CloseDate', DATE), ('CreatedDate', TIMESTAMP),
+        ('Owner.Name', STRING), ('Owner.IsActive', BOOLEAN)]
+
+    with pytest.raises(ValueError):
+        Schema.from_query(client, 'SELECT COUNT(Id) FROM Opportunity')
+
+
+def test_schema_uses_canonical_names(client):
+    schema = Schema.from_query(client, 'SELECT id, amount, owner.name, '
+                                       'owner.manager.createddate '
+                                       'FROM Opportunity')
+    assert [(c.name, c.path, c.type) for c in schema.columns] == [
+        ('id', ('Id',), STRING),
+        ('amount', ('Amount',), FLOAT),
+        ('owner.name', ('Owner', 'Name'), STRING),
+        ('owner.manager.createddate', ('Owner', 'Manager', 'CreatedDate'),
+         TIMESTAMP)]
+
+    columns = next(schema.batches(client.records))
+    assert columns[1][1] == 10.5
+    assert columns[2][1] == 'Owner 1'
+    assert columns[3][:2] == [None, datetime.datetime(2014, 1, 1)]
+
+
+def test_batches(client):
+    schema = Schema.from_query(client, SOQL)
+    batches = list(schema.batches(client.records, batch_size=10))
+
+    assert [len(batch[0]) for batch in batches] == [10, 10, 5]
+    first = batches[0]
+    assert first[1][:4] == [None, 10.5, 21.0, None]
+    assert first[3][0] == datetime.date(2014, 6, 1)
+    assert first[4][0] == datetime.datetime(2014, 6, 4, 23, 54)
+    # Null relationships leave their columns empty
+    assert first[5][:2] == [None, 'Owner 1']
+
+
+def test_numpy(client):
+    pytest.importorskip('numpy')
+    schema = Schema.from_query(client, SOQL)
+    array = schema.to_numpy(next(schema.batches(client.records)))
+
+    assert len(array) == 25
+    assert array.mask['Amount'][0]
+    assert array['Amount'][1] == 10.5
+    assert str(array['CloseDate'][0]) == '2014-06-01'
+    assert array.mask['Owner.Name'][0]
+    assert array['Owner.Name'][1] == 'Owner 1'
+
+
+def test_parquet_export(client, tmpdir):
+    pyarrow = pytest.importorskip('pyarrow')
+    parquet = pytest.importorskip('pyarrow.parquet')
+    schema = Schema.from_query(client, SOQL)
+    path = str(tmpdir.join('opportunities.parquet'))
+
+    with ParquetWriter(path, schema) as writer:
+        assert export(client, SOQL, schema, writer, batch_size=10) == 25
+
+    parquet_file = parquet.ParquetFile(path)
+    assert parquet_file.num_row_groups == 3
+    table = parquet_file.read()
+    assert table.schema[4].type == pyarrow.timestamp('ms', tz='UTC')
+    created = table.column('CreatedDate').to_pylist()[0]
+    assert created.utcoffset() == datetime.timedelta(0)
+    assert created.replace(tzinfo=None) == datetime.datetime(2014, 6, 4,
+                                                             23, 54)
+    assert table.column('Amount').to_pylist()[:3] == [None, 10.5, 21.0]
+    assert table.column('Owner.IsActive').to_pylist()[:2] == [None, True]
+
+
+def test_feather_export(client, tmpdir):
+    pyarrow = pytest.importorskip('pyarrow')
+    schema = Schema.from_query(client, SOQL)
+    path = str(tmpdir.join('opportunities.feather'))
+
+    with FeatherWriter(path, schema) as writer:
+        export(client, SOQL, schema, writer, batch_size=10)
+
+    reader = pyarrow.ipc.open_file(pyarrow.OSFile(path))
+    assert reader.num_record_batches == 3
+    assert reader.read_all().num_rows == 25
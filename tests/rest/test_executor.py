@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import threading
+import time
+
+from concurrent.futures import Future
+
+from salesforce.rest.executor import ConcurrentSalesforceRestClient
+from salesforce.rest.v29 import SalesforceRestClient
+
+
+class SlowClient(SalesforceRestClient):
+
+    def __init__(self, *args, **kwargs):
+        super(SlowClient, self).__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _call(self, url, method='get', body=None, headers=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        return {'Id': url.rsplit('/', 1)[-1]}
+
+
+def test_concurrent_client():
+    client = SlowClient('client_id', 'client_secret', 'domain',
+                        access_token='access_token')
+    with ConcurrentSalesforceRestClient(client, max_workers=4) as concurrent:
+        futures = [concurrent.get('Account', str(i)) for i in range(20)]
+        assert [f.result()['Id'] for f in futures] == \
+            [str(i) for i in range(20)]
+
+        results = concurrent.map('get', [('Account', str(i))
+                                         for i in range(8)])
+        assert [r['Id'] for r in results] == [str(i) for i in range(8)]
+
+    assert 1 < client.max_in_flight <= 4
+    assert concurrent.version == client.version
+
+
+def test_concurrent_client_leaves_pool_alone():
+    client = SlowClient('client_id', 'client_secret', 'domain',
+                        access_token='access_token', pool_maxsize=4)
+    adapter = client.session.get_adapter('https://domain/')
+    with ConcurrentSalesforceRestClient(client, max_workers=16) as concurrent:
+        assert client.session.get_adapter('https://domain/') is adapter
+        assert concurrent.client.session.get_adapter(
+            'https://domain/')._pool_maxsize == 16
+        # Refreshed tokens are seen by both
+        concurrent.client.session.token = {'access_token': 'refreshed',
+                                           'token_type': 'Bearer'}
+        assert client._access_token() == 'refreshed'
+
+
+def test_iterators_are_not_submitted():
+    client = SlowClient('client_id', 'client_secret', 'domain',
+                        access_token='access_token')
+    with ConcurrentSalesforceRestClient(client, max_workers=4) as concurrent:
+        records = concurrent.query_iter('SELECT Id FROM Account')
+        assert not isinstance(records, Future)
+        assert concurrent.get('Account', '1').result() == {'Id': '1'}
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import datetime
+import re
+import threading
+import traceback
+
+import pytest
+import pytz
+
+from salesforce.rest.exceptions import InvalidCallException
+from salesforce.rest.extract import (PartitionedQuery, date_boundaries,
+                                     id_boundaries, split_soql)
+from salesforce.rest.v29 import SalesforceRestClient
+
+RANGE_RE = re.compile(r"Id >= '(\w+)' AND Id < '(\w+)'")
+
+
+def record_id(n):
+    return '001D000000{0:05d}AAA'.format(n)
+
+
+class RangeClient(SalesforceRestClient):
+
+    "Serves queries over ranges of IDs from a list of records."
+
+    def __init__(self, records, fail=False):
+        super(RangeClient, self).__init__('client_id', 'client_secret',
+                                          'domain', access_token='token')
+        self.records = records
+        self.fail = fail
+        self.lock = threading.Lock()
+        self.queries = []
+
+    def query(self, soql, include_all=False):
+        ids = sorted(r['Id'] for r in self.records)
+        if 'DESC' in soql:
+            ids.reverse()
+        return {'records': [{'Id': ids[0]}] if ids else []}
+
+    def query_iter(self, soql, include_all=False, prefetch=False):
+        with self.lock:
+            self.queries.append(soql)
+        low, high = RANGE_RE.search(soql).groups()
+        for record in self.records:
+            if low <= record['Id'][:15] < high:
+                if self.fail:
+                    raise InvalidCallException(400, 'QUERY_TIMEOUT',
+                                               'Timed out')
+                yield record
+
+
+def test_split_soql():
+    assert split_soql('SELECT Id, (SELECT Id FROM Contacts WHERE Name = '
+                      "'from') FROM Account where Name LIKE 'A%'") == \
+        ("SELECT Id, (SELECT Id FROM Contacts WHERE Name = 'from')",
+         'Account', "Name LIKE 'A%'")
+    assert split_soql('SELECT Id FROM Account') == \
+        ('SELECT Id', 'Account', None)
+    with pytest.raises(ValueError):
+        split_soql('SELECT Id FROM Account ORDER BY Name')
+    with pytest.raises(ValueError):
+        split_soql('SELECT Id FROM Account LIMIT 10')
+
+
+def test_boundaries():
+    boundaries = id_boundaries('001D00000000000AAA', '001D00000000009AAA', 5)
+    assert boundaries == ['001D00000000000', '001D00000000002',
+                          '001D00000000004', '001D00000000006',
+                          '001D00000000008', '001D0000000000A']
+    # Ranges are never empty
+    assert id_boundaries('001D00000000000', '001D00000000001', 8) == \
+        ['001D00000000000', '001D00000000001', '001D00000000002']
+
+    first = datetime.datetime(2014, 1, 1, tzinfo=pytz.utc)
+    boundaries = date_boundaries(first, first + datetime.timedelta(days=2), 2)
+    assert boundaries[0] == first
+    assert boundaries[-1] == first + datetime.timedelta(days=2, seconds=1)
+    assert len(boundaries) == 3
+
+
+class BoundsClient(SalesforceRestClient):
+
+    "Returns the given smallest and largest values of any field."
+
+    def __init__(self, first, last):
+        super(BoundsClient, self).__init__('client_id', 'client_secret',
+                                           'domain', access_token='token')
+        self.first = first
+        self.last = last
+
+    def query(self, soql, include_all=False):
+        field = soql.split()[1]
+        value = self.last if 'DESC' in soql else self.first
+        return {'records': [{field: value}]}
+
+
+def test_partition_by_date():
+    extract = PartitionedQuery(BoundsClient('2014-06-04T23:54:00.000+0000',
+                                            '2014-06-05T23:54:00.000+0000'))
+    queries = extract.partition_by_date('SELECT Id FROM Account WHERE '
+                                        "Name = 'A'", 2)
+    assert queries == [
+        'SELECT Id FROM Account WHERE CreatedDate >= 2014-06-04T23:54:00Z '
+        "AND CreatedDate < 2014-06-05T11:54:00Z AND (Name = 'A')",
+        'SELECT Id FROM Account WHERE CreatedDate >= 2014-06-05T11:54:00Z '
+        "AND CreatedDate < 2014-06-05T23:54:01Z AND (Name = 'A')",
+        # Records without a date are in a partition of their own
+        "SELECT Id FROM Account WHERE CreatedDate = null AND (Name = 'A')"]
+
+    extract = PartitionedQuery(BoundsClient('2014-06-01', '2014-06-04'))
+    assert extract.partition_by_date('SELECT Id FROM Opportunity', 2,
+                                     'CloseDate') == [
+        'SELECT Id FROM Opportunity WHERE CloseDate >= 2014-06-01 '
+        'AND CloseDate < 2014-06-03',
+        'SELECT Id FROM Opportunity WHERE CloseDate >= 2014-06-03 '
+        'AND CloseDate < 2014-06-05',
+        'SELECT Id FROM Opportunity WHERE CloseDate = null']
+
+    extract = PartitionedQuery(BoundsClient(None, None))
+    assert extract.partition_by_date('SELECT Id FROM Opportunity', 2,
+                                     'CloseDate') == \
+        ['SELECT Id FROM Opportunity WHERE CloseDate = null']
+
+
+def test_records_are_merged():
+    records = [{'Id': record_id(n)} for n in range(100)]
+    client = RangeClient(records)
+    extract = PartitionedQuery(client, max_workers=3, buffer_size=5)
+
+    results = list(extract.by_id("SELECT Id FROM Account WHERE Name != 'A' "
+                                 "OR Name = null", 7))
+
+    assert sorted(r['Id'] for r in results) == [r['Id'] for r in records]
+    assert len(client.queries) == 7
+    assert all(q.endswith("AND (Name != 'A' OR Name = null)")
+               for q in client.queries)
+
+
+def test_empty_results():
+    extract = PartitionedQuery(RangeClient([]))
+    assert list(extract.by_id('SELECT Id FROM Account', 4)) == []
+
+
+def test_partition_errors_are_raised():
+    client = RangeClient([{'Id': record_id(n)} for n in range(10)], fail=True)
+    with pytest.raises(InvalidCallException) as excinfo:
+        list(PartitionedQuery(client, max_workers=2).by_id(
+            'SELECT Id FROM Account', 4))
+    # The traceback leads to where the partition failed
+    assert traceback.extract_tb(excinfo.tb)[-1][2] == 'query_iter'
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+from requests.models import Response
+
+from salesforce.rest.exceptions import (
+    RequestLimitExceededException,
+    get_exception,
+)
+from salesforce.rest.limits import RequestLimiter
+
+
+def test_update_from_response():
+    limiter = RequestLimiter()
+    response = Response()
+    response.headers['Sforce-Limit-Info'] = 'api-usage=18/5000'
+    limiter.update_from_response(response)
+    assert (limiter.used, limiter.max, limiter.remaining) == (18, 5000, 4982)
+
+
+def test_update_from_limits():
+    limiter = RequestLimiter()
+    limiter.update_from_limits({
+        'DailyApiRequests': {'Max': 15000, 'Remaining': 14000},
+    })
+    assert limiter.remaining == 14000
+
+
+def test_reserve():
+    limiter = RequestLimiter(reserve=100)
+    limiter.update(4900, 5000)
+    with pytest.raises(RequestLimitExceededException):
+        limiter.acquire()
+
+
+def test_token_bucket(monkeypatch):
+    now = [1000.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    monkeypatch.setattr('time.time', lambda: now[0])
+    monkeypatch.setattr('time.sleep', sleep)
+
+    limiter = RequestLimiter(daily_budget=86400, burst=2)
+    for _ in range(3):
+        limiter.acquire()
+    assert len(sleeps) == 1
+    assert sleeps[0] == pytest.approx(1)
+
+    limiter.block = False
+    with pytest.raises(RequestLimitExceededException):
+        limiter.acquire()
+
+
+def test_should_refresh_once_per_interval():
+    limiter = RequestLimiter(refresh_interval=60)
+    assert limiter.should_refresh()
+    assert not limiter.should_refresh()
+
+
+def test_request_limit_exceeded_error():
+    e = get_exception(403, 'REQUEST_LIMIT_EXCEEDED', 'TotalRequests Limit')
+    assert isinstance(e, RequestLimitExceededException)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import re
+import threading
+
+import pytest
+
+from salesforce.rest.exceptions import NotFoundException
+from salesforce.rest.loader import RecordLoader
+from salesforce.rest.v29 import SalesforceRestClient
+
+ID_LIST_RE = re.compile(r"'(\w+)'")
+
+
+def record_id(n):
+    return '001D0000000{0:04d}AAA'.format(n)
+
+
+class QueryClient(SalesforceRestClient):
+
+    "Answers Id IN (...) queries with the records which exist."
+
+    def __init__(self, existing):
+        super(QueryClient, self).__init__('client_id', 'client_secret',
+                                          'domain', access_token='token')
+        self.existing = existing
+        self.queries = []
+        self.describes = 0
+        self.lock = threading.Lock()
+
+    def object(self, object_name, full_description=False):
+        self.describes += 1
+        return {'fields': [{'name': 'Id', 'type': 'id'},
+                           {'name': 'Name', 'type': 'string'},
+                           {'name': 'BillingAddress', 'type': 'address'}]}
+
+    def query_iter(self, soql, include_all=False, prefetch=False):
+        with self.lock:
+            self.queries.append(soql)
+        for object_id in ID_LIST_RE.findall(soql):
+            if object_id[:15] in self.existing:
+                yield {'Id': object_id[:15] + 'AAA', 'Name': 'Record'}
+
+
+def test_get_many():
+    client = QueryClient(set(record_id(n)[:15] for n in range(3)))
+    short_id = record_id(1)[:15]
+
+    records = client.get_many('Account', [record_id(0), short_id,
+                                          record_id(1), record_id(7)])
+
+    assert records == {
+        record_id(0): {'Id': record_id(0), 'Name': 'Record'},
+        short_id: {'Id': record_id(1), 'Name': 'Record'},
+        record_id(1): {'Id': record_id(1), 'Name': 'Record'},
+    }
+    assert len(client.queries) == 1
+    assert client.queries[0].startswith(
+        'SELECT Id, Name FROM Account WHERE Id IN (')
+
+    client.get_many('Account', [record_id(0)], fields=['Name'])
+    assert client.queries[-1] == \
+        "SELECT Id, Name FROM Account WHERE Id IN ('{0}')".format(record_id(0))
+
+    with pytest.raises(ValueError):
+        client.get_many('Account', ["001D0000000' OR Name != '"])
+    with pytest.raises(ValueError):
+        client.get_many('Account', [record_id(0) + '\n'])
+
+
+def test_get_many_describes_once():
+    client = QueryClient(set())
+    assert client.get_many('Account', []) == {}
+    assert client.describes == 0
+    assert client.queries == []
+
+    for n in range(3):
+        client.get_many('Account', [record_id(n)])
+    assert client.describes == 1
+
+
+def test_get_many_chunks_to_url_limit():
+    client = QueryClient(set())
+    client.MAX_URL_LENGTH = 2000
+    client.get_many('Account', [record_id(n) for n in range(200)])
+
+    assert len(client.queries) > 1
+    queried = sum(len(ID_LIST_RE.findall(soql)) for soql in client.queries)
+    assert queried == 200
+    for soql in client.queries:
+        assert len(client._url('query', params={'q': soql})) <= 2000
+
+
+def test_loader_batches_calls():
+    client = QueryClient(set(record_id(n)[:15] for n in range(10)))
+    with RecordLoader(client, delay=10) as loader:
+        futures = [loader.load('Account', record_id(n)) for n in range(10)]
+        missing = loader.load('Account', record_id(50))
+        named = loader.load('Account', record_id(0), fields=['Name'])
+
+    assert [f.result()['Id'] for f in futures] == \
+        [record_id(n) for n in range(10)]
+    assert named.result()['Id'] == record_id(0)
+    with pytest.raises(NotFoundException):
+        missing.result()
+    # One query for each list of fields
+    assert len(client.queries) == 2
+
+
+def test_loader_sends_after_delay():
+    client = QueryClient(set([record_id(1)[:15]]))
+    loader = RecordLoader(client, delay=0.1)
+    threads = [threading.Thread(target=loader.get,
+                                args=('Account', record_id(1)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(client.queries) == 1
+
+
+def test_loader_sends_full_batches():
+    client = QueryClient(set())
+    loader = RecordLoader(client, delay=10, max_batch_size=3)
+    futures = [loader.load('Account', record_id(n)) for n in range(7)]
+    assert all(f.done() for f in futures[:6])
+    loader.flush()
+    assert futures[6].done()
+    assert len(client.queries) == 3
+
+
+def test_loader_rejects_malformed_ids():
+    client = QueryClient(set([record_id(1)[:15]]))
+    with RecordLoader(client, delay=10) as loader:
+        valid = loader.load('Account', record_id(1))
+        invalid = loader.load('Account', "001' OR Name != '")
+        assert invalid.done()
+
+    with pytest.raises(ValueError):
+        invalid.result()
+    assert valid.result()['Id'] == record_id(1)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+import time
+import traceback
+
+import pytest
+
+from salesforce.rest import streams
+from salesforce.rest.v29 import SalesforceRestClient, _Prefetch
+
+
+class PagedClient(SalesforceRestClient):
+
+    def __init__(self, pages, *args, **kwargs):
+        super(PagedClient, self).__init__(*args, **kwargs)
+        self.pages = pages
+        self.urls = []
+
+    def _call(self, url, method='get', body=None, headers=None):
+        self.urls.append(url)
+        return self.pages[len(self.urls) - 1]
+
+
+@pytest.fixture
+def pages():
+    return [
+        {
+            'done': False,
+            'totalSize': 3,
+            'nextRecordsUrl': '/services/data/v29.0/query/01gD-2',
+            'records': [{'Id': '1'}, {'Id': '2'}],
+        },
+        {
+            'done': True,
+            'totalSize': 3,
+            'records': [{'Id': '3'}],
+        },
+    ]
+
+
+@pytest.fixture
+def paged_client(pages):
+    return PagedClient(pages, 'client_id', 'client_secret', 'domain',
+                       access_token='access_token')
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_query_iter(paged_client, prefetch):
+    records = paged_client.query_iter('SELECT Id FROM Account',
+                                      prefetch=prefetch)
+    assert [r['Id'] for r in records] == ['1', '2', '3']
+    assert paged_client.urls[1] == \
+        'https://domain/services/data/v29.0/query/01gD-2'
+
+
+def test_query_iter_is_lazy(paged_client):
+    records = paged_client.query_iter('SELECT Id FROM Account')
+    next(records)
+    assert len(paged_client.urls) == 1
+
+
+def test_query_all_iter(paged_client):
+    records = list(paged_client.query_all_iter('SELECT Id FROM Account'))
+    assert len(records) == 3
+    assert '/queryAll?' in paged_client.urls[0]
+
+
+class FakeStreamedResponse(object):
+
+    def __init__(self, content):
+        self.raw = io.BytesIO(content)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class XmlPagedClient(SalesforceRestClient):
+
+    def __init__(self, pages, *args, **kwargs):
+        super(XmlPagedClient, self).__init__(*args, **kwargs)
+        self.pages = pages
+        self.urls = []
+        self.responses = []
+
+    def _open(self, url):
+        self.urls.append(url)
+        response = FakeStreamedResponse(self.pages[len(self.urls) - 1])
+        self.responses.append(response)
+        return response
+
+
+@pytest.fixture
+def xml_pages():
+    return [
+        ('<?xml version="1.0" encoding="UTF-8"?><QueryResult '
+         'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+         '<done>false</done>'
+         '<nextRecordsUrl>/services/data/v29.0/query/01gD-2</nextRecordsUrl>'
+         '<records type="Account"><Id>1</Id><Name>Zoë</Name></records>'
+         '<records type="Account"><Id>2</Id><Name>Ærø</Name></records>'
+         '<totalSize>3</totalSize></QueryResult>').encode('utf-8'),
+        ('<?xml version="1.0" encoding="UTF-8"?><QueryResult>'
+         '<done>true</done>'
+         '<records type="Account"><Id>3</Id><Name>東京</Name></records>'
+         '<totalSize>3</totalSize></QueryResult>').encode('utf-8'),
+    ]
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_query_iter_xml(xml_pages, prefetch):
+    client = XmlPagedClient(xml_pages, 'client_id', 'client_secret', 'domain',
+                            access_token='access_token',
+                            response_format='xml')
+    records = client.query_iter('SELECT Id, Name FROM Account',
+                                prefetch=prefetch)
+    assert [(r.findtext('Id'), r.findtext('Name')) for r in records] == [
+        ('1', 'Zoë'), ('2', 'Ærø'), ('3', '東京'),
+    ]
+    assert client.urls[1] == \
+        'https://domain/services/data/v29.0/query/01gD-2'
+    assert all(r.closed for r in client.responses)
+
+
+def test_dropped_xml_query_closes_prefetched_response(xml_pages):
+    client = XmlPagedClient(xml_pages, 'client_id', 'client_secret', 'domain',
+                            access_token='access_token',
+                            response_format='xml')
+    records = client.query_iter('SELECT Id, Name FROM Account',
+                                prefetch=True)
+    next(records)
+    records.close()
+    # The next page is closed by the prefetching thread once it arrives
+    deadline = time.time() + 5
+    while not (len(client.responses) == 2 and client.responses[1].closed):
+        assert time.time() < deadline
+        time.sleep(0.01)
+    assert client.responses[0].closed
+
+
+def fail():
+    raise ValueError('Failed')
+
+
+def test_prefetch_error_keeps_traceback():
+    with pytest.raises(ValueError) as excinfo:
+        _Prefetch(fail).result()
+    assert traceback.extract_tb(excinfo.tb)[-1][2] == 'fail'
+
+
+def test_iter_records_drops_parsed_elements(xml_pages):
+    page = {}
+    records = streams.iter_records(io.BytesIO(xml_pages[0]), page)
+    first = next(records)
+    assert first.get('type') == 'Account'
+    assert page == {
+        'done': 'false',
+        'nextRecordsUrl': '/services/data/v29.0/query/01gD-2',
+    }
+    rest = list(records)
+    assert len(rest) == 1
+    assert page['totalSize'] == '3'
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import copy
+import pickle
+import threading
+
+import pytest
+
+from salesforce.rest.records import Record, RecordSchema
+from salesforce.rest.v29 import SalesforceRestClient
+
+
+def contact(n, account=True):
+    return {
+        'attributes': {
+            'type': 'Contact',
+            'url': '/services/data/v29.0/sobjects/Contact/{0}'.format(n),
+        },
+        'Id': str(n),
+        'Name': 'Contact {0}'.format(n),
+        'Account': {
+            'attributes': {'type': 'Account', 'url': '/account'},
+            'Name': 'Account {0}'.format(n),
+        } if account else None,
+    }
+
+
+class PagedClient(SalesforceRestClient):
+
+    def __init__(self, pages):
+        super(PagedClient, self).__init__('client_id', 'client_secret',
+                                          'domain', access_token='token')
+        self.pages = pages
+
+    def _call(self, url, method='get', body=None, headers=None):
+        return copy.deepcopy(self.pages.pop(0))
+
+
+def test_record_mapping():
+    schema = RecordSchema()
+    record = schema.record(contact(1))
+
+    assert isinstance(record, collections.Mapping)
+    assert record['Name'] == 'Contact 1'
+    assert record['Account']['Name'] == 'Account 1'
+    assert 'attributes' not in record
+    assert 'attributes' not in record['Account']
+    assert record.get('Email') is None
+    with pytest.raises(KeyError):
+        record['Email']
+    assert sorted(record) == ['Account', 'Id', 'Name']
+    assert len(record) == 3
+    assert record == {'Id': '1', 'Name': 'Contact 1',
+                      'Account': {'Name': 'Account 1'}}
+    assert not hasattr(record, '__dict__')
+
+
+def test_schema_is_shared():
+    schema = RecordSchema()
+    first = schema.record({'attributes': {}, 'Id': '1'})
+    second = schema.record(contact(2, account=False))
+
+    # The first record doesn't have the fields added by the second
+    assert first.to_dict() == {'Id': '1'}
+    assert second['Account'] is None
+    assert sorted(schema.fields) == ['Account', 'Id', 'Name']
+
+
+def test_keep_attributes():
+    record = RecordSchema(keep_attributes=True).record(contact(1))
+    assert record['attributes']['type'] == 'Contact'
+    assert record['Account']['attributes']['type'] == 'Account'
+
+
+def test_subquery_records():
+    data = dict(contact(1), Cases={'totalSize': 1, 'done': True,
+                                   'records': [{'attributes': {},
+                                                'Subject': 'Broken'}]})
+    record = RecordSchema().record(data)
+    assert isinstance(record['Cases']['records'][0], Record)
+    assert record.to_dict()['Cases']['records'] == [{'Subject': 'Broken'}]
+
+
+def test_compact_query_iter():
+    client = PagedClient([
+        {'done': False, 'totalSize': 3, 'nextRecordsUrl': '/next',
+         'records': [contact(1), contact(2)]},
+        {'done': True, 'totalSize': 3, 'records': [contact(3)]},
+    ])
+    records = list(client.query_iter('SELECT Id, Name, Account.Name '
+                                     'FROM Contact', compact=True))
+    assert all(isinstance(r, Record) for r in records)
+    assert [r['Account']['Name'] for r in records] == \
+        ['Account 1', 'Account 2', 'Account 3']
+    # One schema for the whole query
+    assert records[0]._schema is records[2]._schema
+
+
+def test_compact_query_all_iter():
+    client = PagedClient([
+        {'done': True, 'totalSize': 1, 'records': [contact(1)]},
+    ])
+    schema = RecordSchema()
+    records = list(client.query_all_iter('SELECT Id FROM Contact',
+                                         compact=schema))
+    assert records[0]._schema is schema
+    assert records[0]['Name'] == 'Contact 1'
+
+
+def test_compact_query_and_get():
+    schema = RecordSchema(keep_attributes=True)
+    client = PagedClient([
+        {'done': True, 'totalSize': 1, 'records': [contact(1)]},
+        contact(2),
+    ])
+    result = client.query('SELECT Id FROM Contact', compact=schema)
+    assert isinstance(result['records'][0], Record)
+    record = client.get('Contact', '2', compact=schema)
+    assert record['attributes']['type'] == 'Contact'
+    assert record._schema is schema
+
+
+def test_compact_needs_json():
+    client = PagedClient([])
+    client.response_format = SalesforceRestClient.RESPONSE_FORMAT_XML
+    with pytest.raises(ValueError):
+        client.query_iter('SELECT Id FROM Contact', compact=True)
+
+
+@pytest.mark.parametrize('protocol', [0, 1, 2])
+def test_pickle(protocol):
+    schema = RecordSchema()
+    first = schema.record({'attributes': {}, 'Id': '1'})
+    second = schema.record(contact(2))
+
+    first_copy, second_copy = pickle.loads(pickle.dumps([first, second],
+                                                         protocol))
+    assert first_copy.to_dict() == {'Id': '1'}
+    assert second_copy == second
+    assert first_copy._schema is second_copy._schema
+
+
+def test_deepcopy():
+    schema = RecordSchema()
+    schema.record({'attributes': {}, 'Name': 'Other'})
+    record = schema.record({'attributes': {}, 'Id': '1'})
+    assert copy.deepcopy(record).to_dict() == {'Id': '1'}
+    assert copy.copy(record) == record
+
+
+def test_concurrent_schema():
+    schema = RecordSchema()
+    records = []
+    fields = ['Field{0}'.format(n) for n in range(200)]
+
+    def pack():
+        for name in fields:
+            records.append((name, schema.record({'attributes': {},
+                                                 name: name})))
+
+    threads = [threading.Thread(target=pack) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(schema.fields) == sorted(fields)
+    assert all(record[name] == name for name, record in records)
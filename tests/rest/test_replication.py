@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import datetime
+
+import pytest
+import pytz
+
+from salesforce.rest.exceptions import InvalidCallException
+from salesforce.rest.replication import (Delete, FileHighWaterMarks,
+                                         HighWaterMarks, Replicator,
+                                         StaleHighWaterMarkException, Upsert,
+                                         parse_datetime)
+from salesforce.rest.v29 import SalesforceRestClient
+
+NOW = datetime.datetime(2014, 6, 5, 12, 0, tzinfo=pytz.utc)
+ID1, ID2, ID3, ID4 = ['001D00000000{0:03d}AAA'.format(n) for n in range(1, 5)]
+
+
+def salesforce_datetime(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000+0000')
+
+
+class ChangesClient(SalesforceRestClient):
+
+    """
+    Serves updated and deleted records from lists of (date, ID) pairs. Windows
+    with more than id_limit changes fail like Salesforce does.
+    """
+
+    def __init__(self, updated, deleted, id_limit=None, covered=None):
+        super(ChangesClient, self).__init__('client_id', 'client_secret',
+                                            'domain', access_token='token')
+        self.updated = updated
+        self.deleted = deleted
+        self.id_limit = id_limit
+        self.covered = covered or NOW
+        self.windows = []
+        self.queries = []
+
+    def _window(self, changes, start, end):
+        self.windows.append((start, end))
+        matching = [(date, record_id) for date, record_id in changes
+                    if start <= date < end]
+        if self.id_limit is not None and len(matching) > self.id_limit:
+            raise InvalidCallException(400, 'EXCEEDED_ID_LIMIT',
+                                       'Too many IDs')
+        return matching, salesforce_datetime(min(end, self.covered))
+
+    def get_updated(self, object_name, start, end):
+        matching, covered = self._window(self.updated, start, end)
+        return {'ids': [record_id for date, record_id in matching],
+                'latestDateCovered': covered}
+
+    def get_deleted(self, object_name, start, end):
+        matching, covered = self._window(self.deleted, start, end)
+        return {'deletedRecords': [
+            {'id': record_id, 'deletedDate': salesforce_datetime(date)}
+            for date, record_id in matching],
+            'earliestDateAvailable': '2014-05-01T00:00:00.000+0000',
+            'latestDateCovered': covered}
+
+    def object(self, object_name, full_description=False):
+        return {'fields': [{'name': 'Id', 'type': 'id'},
+                           {'name': 'Name', 'type': 'string'},
+                           {'name': 'BillingAddress', 'type': 'address'}]}
+
+    def query_iter(self, soql, include_all=False, prefetch=False):
+        self.queries.append(soql)
+        ids = soql.split('IN (', 1)[1].rstrip(')').split(', ')
+        for record_id in ids:
+            yield {'Id': record_id.strip("'"), 'Name': 'Record'}
+
+
+class FixedReplicator(Replicator):
+
+    def _now(self):
+        return NOW
+
+
+def hours_ago(hours):
+    return NOW - datetime.timedelta(hours=hours)
+
+
+def test_parse_datetime():
+    assert parse_datetime('2014-06-04T23:54:00.000+0000') == \
+        datetime.datetime(2014, 6, 4, 23, 54, tzinfo=pytz.utc)
+    assert parse_datetime('2014-06-04T23:54:00.000-0200') == \
+        datetime.datetime(2014, 6, 5, 1, 54, tzinfo=pytz.utc)
+    assert parse_datetime('2014-06-04T23:54:00Z') == \
+        datetime.datetime(2014, 6, 4, 23, 54, tzinfo=pytz.utc)
+
+
+def test_changes_are_fetched_in_batches():
+    client = ChangesClient(
+        updated=[(hours_ago(30), ID1), (hours_ago(5), ID2),
+                 (hours_ago(4), ID3), (hours_ago(3), ID2)],
+        deleted=[(hours_ago(2), ID4)])
+    marks = HighWaterMarks({'Account': hours_ago(48)})
+    replicator = FixedReplicator(client, marks, chunk_size=2)
+
+    events = list(replicator.changes('Account'))
+
+    assert events == [
+        Upsert('Account', ID1, {'Id': ID1, 'Name': 'Record'}),
+        Upsert('Account', ID2, {'Id': ID2, 'Name': 'Record'}),
+        Upsert('Account', ID3, {'Id': ID3, 'Name': 'Record'}),
+        Delete('Account', ID4, hours_ago(2)),
+    ]
+    # One window per day, with one query per chunk of IDs
+    assert client.queries == [
+        "SELECT Id, Name FROM Account WHERE Id IN ('{0}')".format(ID1),
+        "SELECT Id, Name FROM Account WHERE Id IN ('{0}', '{1}')".format(
+            ID2, ID3),
+    ]
+    assert marks.get('Account') == NOW
+
+
+def test_mark_stops_at_latest_date_covered():
+    covered = hours_ago(30)
+    client = ChangesClient(updated=[(hours_ago(40), ID1)], deleted=[],
+                           covered=covered)
+    marks = HighWaterMarks({'Account': hours_ago(48)})
+
+    events = list(FixedReplicator(client, marks).changes('Account'))
+
+    assert [event.id for event in events] == [ID1]
+    assert marks.get('Account') == covered
+    # Later windows aren't asked for until Salesforce catches up
+    assert all(start < covered for start, end in client.windows)
+
+
+def test_mark_moves_once_window_is_consumed():
+    client = ChangesClient(updated=[(hours_ago(40), ID1),
+                                    (hours_ago(10), ID2)], deleted=[])
+    marks = HighWaterMarks({'Account': hours_ago(48)})
+
+    events = FixedReplicator(client, marks).changes('Account')
+    assert next(events).id == ID1
+    assert marks.get('Account') == hours_ago(48)
+    assert next(events).id == ID2
+    assert marks.get('Account') == hours_ago(24)
+
+
+def test_windows_are_split_over_id_limit():
+    client = ChangesClient(
+        updated=[(hours_ago(20 - n), record_id)
+                 for n, record_id in enumerate([ID1, ID2, ID3, ID4])],
+        deleted=[], id_limit=2)
+    marks = HighWaterMarks({'Account': hours_ago(24)})
+
+    events = list(FixedReplicator(client, marks).changes('Account'))
+
+    assert sorted(event.id for event in events) == [ID1, ID2, ID3, ID4]
+    assert marks.get('Account') == NOW
+
+
+def test_stale_mark():
+    marks = HighWaterMarks({'Account': NOW - datetime.timedelta(days=31)})
+    replicator = FixedReplicator(ChangesClient([], []), marks)
+    with pytest.raises(StaleHighWaterMarkException):
+        list(replicator.changes('Account'))
+
+
+def test_file_marks_persist(tmpdir):
+    path = str(tmpdir.join('marks.json'))
+    FileHighWaterMarks(path).set('Account', hours_ago(1))
+    assert FileHighWaterMarks(path).get('Account') == hours_ago(1)
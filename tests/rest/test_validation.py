@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import itertools
+
+import pytest
+
+from salesforce.rest.base import SalesforceRestClientBase
+from salesforce.rest.validation import compile_validator
+
+
+def field(name, type='string', createable=True, updateable=True,
+          nillable=True, defaulted=False, picklist=None):
+    return {
+        'name': name,
+        'type': type,
+        'createable': createable,
+        'updateable': updateable,
+        'nillable': nillable,
+        'defaultedOnCreate': defaulted,
+        'restrictedPicklist': picklist is not None,
+        'picklistValues': [{'value': v, 'active': v != 'Inactive'}
+                           for v in picklist or []],
+    }
+
+
+@pytest.fixture
+def description():
+    return {'fields': [
+        field('Id', type='id', createable=False, updateable=False,
+              defaulted=True),
+        field('Name', nillable=False),
+        field('CreatedById', createable=False, updateable=False,
+              nillable=False),
+        field('IsActive__c', type='boolean', nillable=False),
+        field('Status__c', picklist=['Open', 'Closed', 'Inactive']),
+        field('Owner', updateable=False, nillable=False, defaulted=True),
+    ]}
+
+
+def reference_validate(data, description, new_record):
+    "The field-by-field validation that compile_validator must agree with."
+    errors = {}
+    field_map = {f['name']: f for f in description['fields']}
+    for name, f in field_map.items():
+        field_errors = SalesforceRestClientBase.validate_field(
+            data.get(name), f, new_record=new_record)
+        if field_errors:
+            errors[name] = field_errors
+    for name in set(data) - set(field_map):
+        errors[name] = ['Field name not found']
+    return not errors, errors
+
+
+def test_matches_validate_field(description):
+    validator = compile_validator(description)
+    values = {
+        'Id': [None, '001'],
+        'Name': [None, 'Name'],
+        'CreatedById': [None, '005'],
+        'Status__c': [None, 'Open', 'Inactive', 'Bogus', ['Open']],
+        'Owner': [None, '005'],
+        'Unknown__c': [None, 'value'],
+    }
+    names = sorted(values)
+    for combination in itertools.product(*[values[n] for n in names]):
+        data = {n: v for n, v in zip(names, combination)
+                if v is not None or n == 'Unknown__c'}
+        for new_record in (True, False):
+            assert validator.validate(data, new_record=new_record) == \
+                reference_validate(data, description, new_record)
+
+
+def test_validate_many(description):
+    validator = SalesforceRestClientBase.compile_validator(description)
+    results = validator.validate_many([
+        {'Name': 'Valid', 'CreatedById': '005'},
+        {'Name': 'Invalid', 'CreatedById': '005', 'Status__c': 'Bogus'},
+    ], new_record=False)
+    assert results == [
+        (False, {'CreatedById': ['Cannot update this field']}),
+        (False, {'CreatedById': ['Cannot update this field'],
+                 'Status__c': ['Bad value for restricted picklist field']}),
+    ]
+
+
+def test_validate_object(description):
+    is_valid, errors = SalesforceRestClientBase.validate_object(
+        {'Name': 'Name', 'Status__c': 'Open'}, description)
+    assert not is_valid
+    assert errors == {'CreatedById': ['This field is required']}
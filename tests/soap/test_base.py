@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+from salesforce.metadata import SalesforceMetadataClient
+
+
+def envelope(client, function_name, *args):
+    return client._prepare(function_name, args=list(args))[0].message
+
+
+def test_clients_share_wsdl():
+    clients = [
+        SalesforceMetadataClient('client_id', 'client_secret', 'domain',
+                                 '00D{0}!token{0}'.format(i))
+        for i in range(2)
+    ]
+    assert clients[0].client.wsdl is clients[1].client.wsdl
+    assert clients[0].client.options is not clients[1].client.options
+
+    for i, client in enumerate(clients):
+        assert client.client.options.location == \
+            'https://domain/services/Soap/m/30.0/00D{0}'.format(i)
+        message = envelope(client, 'readMetadata', 'CustomObject',
+                           ['Account'])
+        session_id = '<tns:sessionId>00D{0}!token{0}</tns:sessionId>'.format(i)
+        assert session_id.encode('utf-8') \
+            in message
+
+
+def test_set_session_header():
+    client = SalesforceMetadataClient('client_id', 'client_secret', 'domain',
+                                      '00D!old')
+    client._set_session_header('00D!new')
+    assert b'00D!new' in envelope(client, 'listMetadata', [], '30.0')
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import os
+import pickle
+
+from salesforce.soap import SalesforceSoapClient
+from salesforce.soap.cache import WsdlCache, create_client
+
+
+def test_cache_location_is_versioned(tmpdir):
+    cache = WsdlCache(SalesforceSoapClient.wsdl_path, location=str(tmpdir))
+    suds_version, digest = os.path.relpath(cache.location,
+                                           str(tmpdir)).split(os.sep)
+    assert len(digest) == 40
+
+
+def test_create_client_uses_cache(tmpdir):
+    wsdl_path = SalesforceSoapClient.wsdl_path
+    create_client(wsdl_path, location=str(tmpdir))
+    cache = WsdlCache(wsdl_path, location=str(tmpdir))
+    assert [f for f in os.listdir(cache.location) if f.endswith('.px')]
+
+    client = create_client(wsdl_path, location=str(tmpdir))
+    session_header = client.factory.create('SessionHeader')
+    assert hasattr(session_header, 'sessionId')
+    assert client.wsdl.services[0].name == 'SforceService'
+
+
+loaded = []
+
+
+def load(name):
+    loaded.append(name)
+
+
+class Planted(object):
+
+    "Records being unpickled, as a malicious pickle could run any code."
+
+    def __reduce__(self):
+        return load, ('planted',)
+
+
+def plant(cache):
+    cache.mktmp()
+    path = cache._FileCache__fn('planted')
+    with open(path, 'wb') as f:
+        pickle.dump(Planted(), f, 2)
+    os.chmod(path, 0o600)
+    return path
+
+
+def test_private_cache_is_loaded(tmpdir):
+    cache = WsdlCache(SalesforceSoapClient.wsdl_path,
+                      location=str(tmpdir.join('cache')))
+    plant(cache)
+    assert oct(os.stat(cache.location).st_mode & 0o777) == oct(0o700)
+    del loaded[:]
+    cache.get('planted')
+    assert loaded == ['planted']
+
+
+def test_shared_cache_is_not_loaded(tmpdir, monkeypatch):
+    cache = WsdlCache(SalesforceSoapClient.wsdl_path,
+                      location=str(tmpdir.join('cache')))
+    path = plant(cache)
+    del loaded[:]
+
+    os.chmod(path, 0o666)
+    assert cache.get('planted') is None
+    os.chmod(path, 0o600)
+    os.chmod(cache.location, 0o777)
+    assert cache.get('planted') is None
+    os.chmod(cache.location, 0o700)
+
+    # Files owned by another user
+    uid = os.getuid()
+    monkeypatch.setattr(os, 'getuid', lambda: uid + 1)
+    assert cache.get('planted') is None
+    assert loaded == []
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import base64
+import io
+import os
+import xml.sax
+
+import pytest
+from suds import WebFault
+from suds.sax.parser import Parser
+
+from salesforce.metadata import SalesforceMetadataClient
+from salesforce.soap.streams import (Base64Body, Base64ElementFilter,
+                                     build_reply, iter_reply)
+
+
+def test_base64_body(monkeypatch):
+    monkeypatch.setattr(Base64Body, 'CHUNK_SIZE', 3 * 4)
+    data = os.urandom(100)
+    body = Base64Body(io.BytesIO(data), b'<a>', b'</a>')
+    expected = b'<a>' + base64.b64encode(data) + b'</a>'
+    assert len(body) == len(expected)
+
+    parts = []
+    while True:
+        part = body.read(7)
+        if not part:
+            break
+        parts.append(part)
+    assert b''.join(parts) == expected
+    assert body.tell() == len(expected)
+
+    body.seek(0)
+    assert body.read() == expected
+
+
+def test_base64_element_filter():
+    data = os.urandom(1000)
+    encoded = base64.b64encode(data)
+    document = (b'<?xml version="1.0" encoding="UTF-8"?>'
+                b'<r xmlns="urn:x"><id>1</id><zipFile>' +
+                b'\n'.join(encoded[i:i + 76]
+                           for i in range(0, len(encoded), 76)) +
+                b'</zipFile></r>')
+    out = io.BytesIO()
+    sink = io.BytesIO()
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(Base64ElementFilter(out, 'zipFile', sink))
+    for i in range(0, len(document), 50):
+        parser.feed(document[i:i + 50])
+    parser.close()
+
+    assert sink.getvalue() == data
+    assert out.getvalue().endswith(
+        b'<r xmlns="urn:x"><id>1</id><zipFile></zipFile></r>')
+
+
+def reply(body):
+    return ('<?xml version="1.0" encoding="UTF-8"?><soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns="http://soap.sforce.com/2006/04/metadata" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            '<soapenv:Body>{0}</soapenv:Body></soapenv:Envelope>'
+            ).format(body).encode('utf-8')
+
+
+@pytest.fixture(scope='module')
+def client():
+    return SalesforceMetadataClient('client_id', 'client_secret', 'domain',
+                                    '00D!access_token')
+
+
+@pytest.mark.parametrize('function_name,body', [
+    ('readMetadata',
+     '<readMetadataResponse><result>'
+     '<records xsi:type="CustomObject"><fullName>Account</fullName>'
+     '<fields><fullName>Foo__c</fullName><label>Foo</label></fields>'
+     '</records>'
+     '<records xsi:type="CustomObject"><fullName>Invoice__c</fullName>'
+     '</records>'
+     '</result></readMetadataResponse>'),
+    ('readMetadata', '<readMetadataResponse><result/></readMetadataResponse>'),
+    ('listMetadata',
+     '<listMetadataResponse>'
+     '<result><fullName>Account</fullName><type>CustomObject</type></result>'
+     '<result><fullName>Invoice__c</fullName><type>CustomObject</type>'
+     '</result></listMetadataResponse>'),
+    ('listMetadata', '<listMetadataResponse/>'),
+    ('checkDeployStatus',
+     '<checkDeployStatusResponse><result><done>true</done><id>0Af</id>'
+     '<details><componentFailures><fullName>Account</fullName>'
+     '<success>false</success></componentFailures></details>'
+     '<numberComponentsDeployed>3</numberComponentsDeployed>'
+     '<success>false</success></result></checkDeployStatusResponse>'),
+])
+def test_build_reply_matches_suds(client, function_name, body):
+    method = getattr(client.client.service, function_name).method
+    document = reply(body)
+    chunks = [document[i:i + 16] for i in range(0, len(document), 16)]
+    expected = method.binding.output.get_reply(
+        method, Parser().parse(string=document))
+    assert str(build_reply(iter_reply(chunks, method), method)) == \
+        str(expected)
+
+
+def test_iter_reply_fault(client):
+    method = client.client.service.listMetadata.method
+    document = reply('<soapenv:Fault><faultcode>sf:INVALID_SESSION_ID'
+                     '</faultcode><faultstring>INVALID_SESSION_ID</faultstring>'
+                     '</soapenv:Fault>')
+    with pytest.raises(WebFault) as excinfo:
+        list(iter_reply([document], method))
+    assert excinfo.value.fault.faultcode == 'sf:INVALID_SESSION_ID'
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import pytest
+
+from salesforce import codec
+
+
+@pytest.fixture(params=codec.PREFERENCE)
+def json_codec(request):
+    pytest.importorskip(request.param)
+    return codec.get_codec(request.param)
+
+
+def test_round_trip(json_codec):
+    data = {'Name': 'Café', 'Amount': 0.1 + 0.2, 'Url': '/a/b',
+            'Tags': [None, True, 3]}
+    body = json_codec.dumps(data)
+    assert isinstance(body, bytes)
+    assert json_codec.loads(body) == data
+    assert json_codec.loads('{"Name": "Café"}'.encode('utf-8')) == \
+        {'Name': 'Café'}
+
+
+def test_get_codec():
+    json_codec = codec.get_codec('json')
+    assert codec.get_codec('json') is json_codec
+    assert codec.get_codec(json_codec) is json_codec
+    with pytest.raises(ValueError):
+        codec.get_codec('yaml')
+
+
+def test_default_codec_from_environment(monkeypatch):
+    monkeypatch.setattr(codec, '_default', None)
+    monkeypatch.setenv(str('SALESFORCE_JSON_CODEC'), str('notinstalled,json'))
+    monkeypatch.setitem(codec.FACTORIES, 'notinstalled',
+                        lambda: __import__('notinstalled'))
+    assert codec.get_default_codec().name == 'json'
+
+
+def test_unknown_default_codec(monkeypatch):
+    monkeypatch.setattr(codec, '_default', None)
+    monkeypatch.setenv(str('SALESFORCE_JSON_CODEC'), str('orjson'))
+    assert codec.get_default_codec().name == 'json'
+
+
+def test_default_codec_matches_json():
+    body = '{"Name": "Caf\u00e9", "Id": "001", "Tags": ["a"]}'.encode('utf-8')
+    parsed = codec.get_default_codec().loads(body)
+    expected = json.loads(body.decode('utf-8'))
+    assert parsed == expected
+    for key, value in parsed.items():
+        assert type(key) is type(u'')
+    assert type(parsed['Id']) is type(u'')
+    assert type(parsed['Tags'][0]) is type(u'')
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+
+import pytest
+from requests.models import Response
+
+from salesforce.instrumentation import (ByteCounter, ErrorCounter, Hook,
+                                        Instrumentation, LatencyHistogram,
+                                        SpanHook, rest_endpoint,
+                                        soap_operation)
+from salesforce.metadata import SalesforceMetadataClient
+from salesforce.rest.exceptions import InvalidCallException
+from salesforce.rest.v29 import SalesforceRestClient
+from salesforce.retry import RetryPolicy
+
+
+class RecordingHook(Hook):
+
+    def __init__(self):
+        self.events = []
+
+    def before_request(self, call):
+        self.events.append(('before', call.endpoint))
+
+    def after_request(self, call):
+        self.events.append(('after', call.endpoint, call.status_code,
+                            call.error_code, call.attempts))
+
+    def on_retry(self, call, error):
+        self.events.append(('retry', call.endpoint))
+
+    def on_refresh(self, call):
+        self.events.append(('refresh', call.endpoint))
+
+
+class FakeSpan(object):
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.events = []
+        self.ended = False
+
+    def set_attribute(self, name, value):
+        self.attributes[name] = value
+
+    def add_event(self, name, attributes=None):
+        self.events.append(name)
+
+    def end(self):
+        self.ended = True
+
+
+class FakeTracer(object):
+
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None):
+        span = FakeSpan(name, attributes)
+        self.spans.append(span)
+        return span
+
+
+class ScriptedClient(SalesforceRestClient):
+
+    """
+    Answers requests with the given (status code, content) responses, in
+    order.
+    """
+
+    def __init__(self, responses, *args, **kwargs):
+        super(ScriptedClient, self).__init__(*args, **kwargs)
+        self.responses = list(responses)
+        self.session.refresh_token = self.fake_refresh
+
+    def fake_refresh(self, url):
+        self.session.token = dict(self.session.token, access_token='token2')
+        return self.session.token
+
+    def _send(self, url, method='get', body=None, headers=None, **kwargs):
+        status_code, content = self.responses.pop(0)
+        response = Response()
+        response.status_code = status_code
+        response.raw = io.BytesIO(content)
+        response.request = type(str('Request'), (), {'method': 'GET'})()
+        return response
+
+
+@pytest.fixture
+def hooks():
+    return [RecordingHook(), LatencyHistogram(), ByteCounter(),
+            ErrorCounter(), SpanHook(FakeTracer())]
+
+
+def test_endpoint_names():
+    assert rest_endpoint('https://domain/services/data/v29.0/sobjects/'
+                         'Account/001D000000IqhSLIAZ?fields=Name') == \
+        '/services/data/v29.0/sobjects/Account/{id}'
+    assert rest_endpoint('https://domain/services/data/v29.0/query/'
+                         '01gD0000002HU6KIAW-2000') == \
+        '/services/data/v29.0/query/{id}'
+    assert rest_endpoint('https://domain/services/data/v29.0/sobjects/'
+                         'OpportunityLine/describe') == \
+        '/services/data/v29.0/sobjects/OpportunityLine/describe'
+    assert soap_operation(
+        b'<SOAP-ENV:Envelope><SOAP-ENV:Header/><ns1:Body>'
+        b'<ns0:readMetadata><ns0:type>CustomObject</ns0:type>') == \
+        'readMetadata'
+
+
+def test_rest_call_events(monkeypatch, hooks):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    recording, histogram, byte_counter, error_counter, span_hook = hooks
+    client = ScriptedClient(
+        [(401, b'[]'), (503, b'{}'), (200, b'{"Id": "1"}'),
+         (404, b'[{"errorCode": "NOT_FOUND", "message": "Not found"}]')],
+        'client_id', 'client_secret', 'domain', access_token='token1',
+        refresh_token='refresh_token', retry_policy=RetryPolicy(),
+        instrumentation=Instrumentation(hooks))
+
+    assert client.get('Account', '001D000000IqhSLIAZ') == {'Id': '1'}
+    with pytest.raises(InvalidCallException):
+        client.get('Account', '001D000000IqhSLIAZ')
+
+    endpoint = '/services/data/v29.0/sobjects/Account/{id}'
+    assert recording.events == [
+        ('before', endpoint),
+        ('refresh', endpoint),
+        ('retry', endpoint),
+        ('after', endpoint, 200, None, 2),
+        ('before', endpoint),
+        ('after', endpoint, 404, 'NOT_FOUND', 1),
+    ]
+
+    key = ('rest', 'GET', endpoint)
+    assert histogram.count(key) == 2
+    assert histogram.percentile(key, 99) == \
+        LatencyHistogram.DEFAULT_BUCKETS[0]
+    assert byte_counter.calls[key] == 2
+    # The response of the expired session is discarded unread
+    assert byte_counter.bytes_in[key] == len(b'{}') + len(b'{"Id": "1"}') + \
+        len(b'[{"errorCode": "NOT_FOUND", "message": "Not found"}]')
+    assert error_counter.errors == {'NOT_FOUND': 1}
+    assert error_counter.retries[key] == 1
+    assert error_counter.refreshes[key] == 1
+
+    span = span_hook.tracer.spans[1]
+    assert span.name == 'GET ' + endpoint
+    assert span.ended
+    assert span.attributes['salesforce.error_code'] == 'NOT_FOUND'
+    assert span_hook.tracer.spans[0].events == ['token_refresh', 'retry']
+
+
+class FakeStreamedResponse(object):
+
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+        self.reason = 'OK'
+        self.headers = {'Content-Length': str(len(content))}
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+    def close(self):
+        pass
+
+
+def test_soap_call_events(hooks):
+    recording, histogram, byte_counter, error_counter, span_hook = hooks
+    client = SalesforceMetadataClient('client_id', 'client_secret', 'domain',
+                                      '00D!access_token',
+                                      instrumentation=Instrumentation(hooks))
+    reply = (b'<?xml version="1.0" encoding="UTF-8"?><soapenv:Envelope '
+             b'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+             b'xmlns="http://soap.sforce.com/2006/04/metadata"><soapenv:Body>'
+             b'<listMetadataResponse/></soapenv:Body></soapenv:Envelope>')
+    transport = client.client.options.transport
+    transport._call = lambda request, method, data=None: \
+        FakeStreamedResponse(reply)
+
+    assert client.list('CustomObject') == []
+    assert recording.events == [
+        ('before', 'listMetadata'),
+        ('after', 'listMetadata', 200, None, 1),
+    ]
+    key = ('soap', 'POST', 'listMetadata')
+    assert byte_counter.bytes_in[key] == len(reply)
+    assert byte_counter.bytes_out[key] > 0
+
+
+def test_failing_hooks_are_ignored():
+    class BrokenHook(Hook):
+        def before_request(self, call):
+            raise ValueError('broken')
+
+    recording = RecordingHook()
+    instrumentation = Instrumentation([BrokenHook(), recording])
+    with instrumentation.request('rest', 'get', '/limits') as call:
+        with instrumentation.request('rest', 'get', '/other') as inner:
+            assert inner is call
+    assert recording.events == [('before', '/limits'),
+                                ('after', '/limits', None, None, 1)]
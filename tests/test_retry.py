@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+from requests.exceptions import ConnectionError, ConnectTimeout
+from requests.models import Response
+
+from salesforce.bulk.v47 import SalesforceBulkClient
+from salesforce.rest.exceptions import InvalidCallException
+from salesforce.rest.v29 import SalesforceRestClient
+from salesforce.retry import RetryPolicy
+
+
+@pytest.fixture
+def policy():
+    return RetryPolicy(max_attempts=3, backoff=0.1, max_backoff=0.4)
+
+
+@pytest.mark.parametrize('method,kwargs,retryable', [
+    ('get', {'status_code': 503}, True),
+    ('get', {'status_code': 500}, True),
+    ('get', {'status_code': 400, 'error_code': 'INVALID_FIELD'}, False),
+    ('get', {'exception': ConnectionError()}, True),
+    ('post', {'status_code': 500}, False),
+    ('post', {'status_code': 503}, True),
+    ('post', {'status_code': 400, 'error_code': 'UNABLE_TO_LOCK_ROW'}, True),
+    ('post', {'exception': ConnectionError()}, False),
+    ('post', {'exception': ConnectTimeout()}, True),
+    ('patch', {'status_code': 400, 'error_code': 'UNABLE_TO_LOCK_ROW'}, True),
+])
+def test_is_retryable(policy, method, kwargs, retryable):
+    assert policy.is_retryable(method, **kwargs) == retryable
+
+
+def test_unprocessed_status_codes():
+    policy = RetryPolicy(unprocessed_status_codes=[502, 503])
+    assert policy.is_retryable('post', status_code=502)
+    assert not policy.is_retryable('post', status_code=504)
+
+
+def test_should_retry_stops_after_max_attempts(policy):
+    assert policy.should_retry(2, 'get', status_code=503)
+    assert not policy.should_retry(3, 'get', status_code=503)
+
+
+def test_delay_is_capped(policy):
+    for attempt in range(1, 10):
+        assert 0 <= policy.delay(attempt) <= 0.4
+
+
+class FlakyClient(SalesforceRestClient):
+
+    def __init__(self, errors, *args, **kwargs):
+        super(FlakyClient, self).__init__(*args, **kwargs)
+        self.errors = errors
+        self.attempts = 0
+
+    def _request(self, url, method='get', body=None, headers=None, **kwargs):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return None
+
+    def _extract_response(self, response):
+        return {'success': True}
+
+
+def test_rest_call_retries(monkeypatch, policy):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    lock_error = InvalidCallException(400, 'UNABLE_TO_LOCK_ROW', 'Locked')
+    client = FlakyClient([lock_error, ConnectionError()], 'client_id',
+                         'client_secret', 'domain',
+                         access_token='access_token', retry_policy=policy)
+    assert client.update('Account', '001', {'Name': 'Name'}) == \
+        {'success': True}
+    assert client.attempts == 3
+
+
+def test_rest_create_is_not_retried_blindly(monkeypatch, policy):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    client = FlakyClient([ConnectionError()], 'client_id', 'client_secret',
+                         'domain', access_token='access_token',
+                         retry_policy=policy)
+    with pytest.raises(ConnectionError):
+        client.create('Account', {'Name': 'Name'})
+    assert client.attempts == 1
+
+
+class FlakyBulkClient(SalesforceBulkClient):
+
+    def __init__(self, errors, *args, **kwargs):
+        super(FlakyBulkClient, self).__init__(*args, **kwargs)
+        self.errors = errors
+        self.attempts = 0
+
+    def _request(self, url, method='get', body=None, headers=None, **kwargs):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        response = Response()
+        response.status_code = 200
+        return response
+
+
+def test_bulk_results_are_retried(monkeypatch, policy):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    client = FlakyBulkClient([ConnectionError()], 'client_id',
+                             'client_secret', 'domain',
+                             access_token='access_token', retry_policy=policy)
+    client._stream('https://domain/services/data/v47.0/jobs/query/750')
+    assert client.attempts == 2